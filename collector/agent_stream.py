@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+OptiLab Agent Streams
+Keeps metrics_collector.sh running on each target and consumes its newline-delimited JSON
+"""
+
+import json
+import os
+import selectors
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
+
+STALL_INTERVALS = 3  # Restart an agent that stays silent this many intervals
+STARTUP_GRACE = 30  # Extra seconds allowed for connecting and the first sample
+MAX_RESTART_BACKOFF = 300
+
+
+class AgentStream:
+    """One long-lived agent process on a target"""
+
+    def __init__(self, system):
+        self.system = system
+        self.ip = system['ip_address']
+        self.proc = None
+        self.session = None
+        self.buffer = b""
+        self.started = None
+        self.last_record = None
+        self.failures = 0
+        self.retry_at = 0.0
+        self.starting = False
+
+
+class AgentStreamManager:
+    """Starts, watches and reads agents; every fd is served by a single reader thread"""
+
+    def __init__(self, pool, delivery, interval, on_record, start_workers=10):
+        self.pool = pool
+        self.delivery = delivery
+        self.interval = interval
+        self.on_record = on_record
+        self.hosts = {}
+        self.lock = Lock()
+        self.selector = selectors.DefaultSelector()
+        # Only the reader thread touches the selector; other threads queue (fileobj, agent)
+        # to watch, or (fileobj, None) to unregister and close, then wake it through the pipe.
+        # An fd is closed only after it left the selector, so a reused fd number can't be
+        # read under the old host.
+        self.selector_ops = []
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ, None)
+        self.starter = ThreadPoolExecutor(max_workers=start_workers, thread_name_prefix="agent-start")
+        self.stop_event = Event()
+        self.reader = Thread(target=self._read_loop, name="agent-reader", daemon=True)
+        self.records = 0
+        self.restarts = 0
+
+    def start(self):
+        self.reader.start()
+
+    def _track(self, system):
+        """Called with the lock held; returns True for a new host"""
+        agent = self.hosts.get(system['ip_address'])
+        if agent is not None:
+            agent.system = system
+            return False
+        self.hosts[system['ip_address']] = AgentStream(system)
+        return True
+
+    def add(self, system):
+        """Track a host and start its agent"""
+        with self.lock:
+            added = self._track(system)
+        if added:
+            self.maintain()
+        return added
+
+    def sync(self, systems):
+        """Match running agents to the active set; returns (added, removed)"""
+        active = {system['ip_address']: system for system in systems}
+        with self.lock:
+            gone = [ip for ip in self.hosts if ip not in active]
+            for ip in gone:
+                self._kill(self.hosts.pop(ip))
+            added = sum(1 for system in active.values() if self._track(system))
+        self.maintain()
+        return added, len(gone)
+
+    def maintain(self):
+        """Start missing agents and restart dead or stalled ones (with backoff)"""
+        now = time.monotonic()
+        to_start = []
+        with self.lock:
+            for agent in self.hosts.values():
+                if agent.starting:
+                    continue
+                if agent.proc is not None:
+                    if agent.proc.poll() is None and not self._stalled(agent, now):
+                        continue
+                    self._fail(agent, now)
+                if now >= agent.retry_at:
+                    agent.starting = True
+                    to_start.append(agent)
+        for agent in to_start:
+            self.starter.submit(self._start_agent, agent)
+
+    def _stalled(self, agent, now):
+        if agent.last_record is None:
+            return now - agent.started > STALL_INTERVALS * self.interval + STARTUP_GRACE
+        return now - agent.last_record > STALL_INTERVALS * self.interval
+
+    def _fail(self, agent, now):
+        """Called with the lock held: drop the agent and schedule a restart"""
+        self._kill(agent)
+        agent.failures += 1
+        self.restarts += 1
+        delay = min(self.interval * 2 ** agent.failures, MAX_RESTART_BACKOFF)
+        agent.retry_at = now + delay
+        print(f"  [!] Agent on {agent.ip} stopped, restarting in {delay:.0f}s")
+
+    def _start_agent(self, agent):
+        try:
+            # Held until _kill() so the session counts as in use and evict_idle() leaves it alone
+            session = self.pool.checkout(agent.ip)
+            with self.lock:
+                agent.session = session
+            session.connect()
+            if not self.delivery.ensure_deployed(session, timeout=self.pool.connect_timeout):
+                raise RuntimeError("script deployment failed")
+
+            remote_cmd = self.delivery.command("--agent", str(self.interval))
+            stdin = self.delivery.stdin
+            proc = subprocess.Popen(
+                session.command_args(remote_cmd),
+                stdin=subprocess.PIPE if stdin is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+            if stdin is not None:
+                proc.stdin.write(stdin.encode())
+                proc.stdin.close()
+            os.set_blocking(proc.stdout.fileno(), False)
+
+            with self.lock:
+                if self.hosts.get(agent.ip) is not agent or self.stop_event.is_set():
+                    proc.kill()
+                    proc.wait()
+                    self._release(agent)
+                    return
+                agent.proc = proc
+                agent.buffer = b""
+                agent.started = time.monotonic()
+                agent.last_record = None
+                self._queue_op(proc.stdout, agent)
+        except Exception as e:
+            print(f"  [!] Could not start agent on {agent.ip}: {e}")
+            with self.lock:
+                self._release(agent)
+                agent.failures += 1
+                agent.retry_at = time.monotonic() + min(
+                    self.interval * 2 ** agent.failures, MAX_RESTART_BACKOFF
+                )
+        finally:
+            agent.starting = False
+
+    def _queue_op(self, fileobj, agent):
+        """Called with the lock held: hand a selector change to the reader thread"""
+        self.selector_ops.append((fileobj, agent))
+        try:
+            os.write(self.wake_w, b"\0")
+        except BlockingIOError:
+            pass  # Already has a wake-up pending
+
+    def _apply_ops(self):
+        with self.lock:
+            ops, self.selector_ops = self.selector_ops, []
+        for fileobj, agent in ops:
+            if agent is not None:
+                self.selector.register(fileobj, selectors.EVENT_READ, agent)
+            else:
+                self._unregister(fileobj)
+                fileobj.close()
+
+    def _read_loop(self):
+        while not self.stop_event.is_set():
+            self._apply_ops()
+            for key, _ in self.selector.select(timeout=1):
+                agent = key.data
+                if agent is None:
+                    try:
+                        while os.read(self.wake_r, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                try:
+                    chunk = os.read(key.fd, 65536)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    chunk = b""
+                if not chunk:
+                    # EOF: maintain() sees the exited process and restarts it
+                    self._unregister(key.fileobj)
+                    continue
+                agent.buffer += chunk
+                *lines, agent.buffer = agent.buffer.split(b"\n")
+                for line in lines:
+                    self._handle_line(agent, line)
+
+    def _handle_line(self, agent, line):
+        if not line.strip():
+            return
+        try:
+            metrics = json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"  [!] Bad agent record from {agent.ip}: {e}")
+            return
+        with self.lock:
+            agent.last_record = time.monotonic()
+            agent.failures = 0
+            self.records += 1
+        self.on_record(agent.system, metrics)
+
+    def _unregister(self, fileobj):
+        try:
+            self.selector.unregister(fileobj)
+        except (KeyError, ValueError):
+            pass
+
+    def _release(self, agent):
+        session, agent.session = agent.session, None
+        if session is not None:
+            self.pool.release(session)
+
+    def _kill(self, agent):
+        """Called with the lock held"""
+        self._release(agent)
+        proc, agent.proc = agent.proc, None
+        if proc is None:
+            return
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        self._queue_op(proc.stdout, None)
+
+    def report(self):
+        """Records received and agent restarts since the previous report"""
+        with self.lock:
+            records, restarts = self.records, self.restarts
+            self.records = self.restarts = 0
+        return {"completed": records, "failed": restarts, "started": 0}
+
+    def close(self):
+        self.stop_event.set()
+        self.starter.shutdown(wait=True, cancel_futures=True)
+        with self.lock:
+            for agent in self.hosts.values():
+                self._kill(agent)
+            self.hosts.clear()
+        self.reader.join(timeout=2)
+        # The reader has stopped, so finishing its queued work here is safe
+        self._apply_ops()
+        self.selector.close()
+        os.close(self.wake_r)
+        os.close(self.wake_w)
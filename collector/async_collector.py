@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+OptiLab Asyncio Collection Engine
+Drives metric collection for many hosts from one event loop instead of one thread per host
+"""
+
+import asyncio
+import json
+import os
+import sys
+from threading import Thread
+
+from script_cache import SCRIPT_NOT_FOUND_EXIT
+from ssh_pool import SSH_ERROR_EXIT
+
+DEFAULT_CONCURRENCY = 256  # Each in-flight host holds an ssh client and three pipes
+
+
+def install_child_watcher():
+    """Use pidfd child watching on 3.8-3.11 so subprocesses don't each get a waiter thread"""
+    if sys.version_info >= (3, 12) or not hasattr(os, "pidfd_open"):
+        return
+    try:
+        watcher = asyncio.PidfdChildWatcher()
+        asyncio.set_child_watcher(watcher)
+        watcher.attach_loop(asyncio.get_running_loop())
+    except (AttributeError, NotImplementedError):
+        pass
+
+
+async def run_process(args, input=None, capture=True):
+    """Run a command, killing it if the awaiting task is cancelled (e.g. on timeout)"""
+    output = asyncio.subprocess.PIPE if capture else asyncio.subprocess.DEVNULL
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+        stdout=output,
+        stderr=output,
+    )
+    try:
+        stdout, stderr = await proc.communicate(input.encode() if input is not None else None)
+    except asyncio.CancelledError:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    if not capture:
+        return proc.returncode, "", ""
+    return proc.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+
+class AsyncCollectionEngine:
+    """Collects metrics from every host concurrently under a global semaphore"""
+
+    def __init__(self, pool, deploy_cache, concurrency=DEFAULT_CONCURRENCY, host_timeout=10):
+        self.pool = pool
+        self.deploy_cache = deploy_cache
+        self.concurrency = concurrency
+        self.host_timeout = host_timeout
+        # Same budget SSHSession.connect() gives a master to come up
+        self.connect_timeout = pool.connect_timeout + 5
+        self.master_locks = {}
+        self.host_channels = {}
+        self.loop = None
+        self.thread = None
+        self.semaphore = None
+        self.channels = None
+
+    @classmethod
+    def from_config(cls, cfg, pool, deploy_cache, host_timeout=10):
+        return cls(
+            pool, deploy_cache,
+            concurrency=cfg.get("async_concurrency", DEFAULT_CONCURRENCY),
+            host_timeout=cfg.get("async_host_timeout", host_timeout),
+        )
+
+    async def connect(self, session):
+        """Async counterpart of SSHSession.connect, serialized per host"""
+        lock = self.master_locks.setdefault(session.ip, asyncio.Lock())
+        async with lock:
+            if session.master_alive():
+                return True
+            session.remove_socket()
+            # The detached master must not inherit our pipes
+            try:
+                returncode, _, _ = await asyncio.wait_for(
+                    run_process(session.master_args(), capture=False), self.connect_timeout
+                )
+            except asyncio.TimeoutError:
+                returncode = None
+            session.connected = returncode == 0
+            return session.connected
+
+    async def master_responding(self, session):
+        try:
+            returncode, _, _ = await asyncio.wait_for(run_process(session.check_args()), 5)
+        except asyncio.TimeoutError:
+            return False
+        return returncode == 0
+
+    async def run(self, session, remote_cmd, input=None):
+        args = session.command_args(remote_cmd)
+        result = await asyncio.wait_for(run_process(args, input=input), self.host_timeout)
+        # A remote command may exit 255 itself; rerun only if the master is gone
+        if result[0] == SSH_ERROR_EXIT and not await self.master_responding(session):
+            session.connected = False
+            if await self.connect(session):
+                result = await asyncio.wait_for(run_process(args, input=input), self.host_timeout)
+        return result
+
+    async def ensure_deployed(self, session):
+        """Async counterpart of ScriptDeployCache.ensure_deployed"""
+        cache = self.deploy_cache
+        cache.refresh()
+        if cache.is_current(session.ip):
+            return True
+
+        returncode, stdout, _ = await self.run(session, cache.digest_command())
+        if cache.parse_digest(returncode, stdout) == cache.digest:
+            cache.mark(session.ip, cache.digest)
+            return True
+
+        returncode, _, stderr = await self.run(session, cache.prepare_command())
+        if returncode != 0:
+            print(f"  [!] Could not create {cache.remote_dir} on {session.ip}: {stderr}")
+            return False
+
+        returncode, _, stderr = await asyncio.wait_for(
+            run_process(session.copy_args(cache.script_path, cache.remote_path)), self.host_timeout
+        )
+        if returncode != 0:
+            print(f"  [!] SCP failed for {session.ip}: {stderr}")
+            cache.invalidate(session.ip)
+            return False
+
+        cache.mark(session.ip, cache.digest)
+        return True
+
+    async def collect_metrics(self, ip):
+        """Collect one host's metrics over its pooled session, within the pool's channel limits
+
+        Connecting, deploying and sampling each get their own timeout (as in threaded mode),
+        so a cold host that needs a master and a redeploy is not cut off on its first cycle.
+        """
+        session = self.pool.checkout(ip)
+        host_channels = self.host_channels.setdefault(
+            ip, asyncio.Semaphore(self.pool.max_channels_per_host)
+        )
+        try:
+            async with self.channels, host_channels:
+                return await self._collect(session)
+        finally:
+            self.pool.release(session)
+
+    async def _collect(self, session):
+        ip = session.ip
+        await self.connect(session)
+        if not await self.ensure_deployed(session):
+            return None
+
+        remote_cmd = self.deploy_cache.remote_command
+        returncode, stdout, _ = await self.run(session, remote_cmd, self.deploy_cache.stdin)
+        if returncode == SCRIPT_NOT_FOUND_EXIT:
+            self.deploy_cache.invalidate(ip)
+            if not await self.ensure_deployed(session):
+                return None
+            returncode, stdout, _ = await self.run(session, remote_cmd, self.deploy_cache.stdin)
+
+        if returncode != 0:
+            print(f"  [!] SSH metrics collection failed for {ip}")
+            return None
+
+        try:
+            return json.loads(stdout)
+        except json.JSONDecodeError as e:
+            print(f"  [!] JSON parse failed for {ip}: {e}")
+            return None
+
+    async def collect_host(self, semaphore, system, on_start=None):
+        ip = system['ip_address']
+        async with semaphore:
+            if on_start is not None:
+                on_start(ip)
+            try:
+                return system, await self.collect_metrics(ip)
+            except asyncio.TimeoutError:
+                print(f"  [!] SSH timeout for {ip}")
+            except Exception as e:
+                print(f"  [!] Error collecting metrics from {ip}: {e}")
+        return system, None
+
+    def start(self):
+        """Run a long-lived event loop in a background thread for submit()"""
+        self.loop = asyncio.new_event_loop()
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        # The pool's fleet-wide channel cap, as threaded mode enforces through pool.session()
+        self.channels = asyncio.Semaphore(self.pool.max_channels)
+        self.thread = Thread(target=self._run_loop, name="async-collector", daemon=True)
+        self.thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._prepare_loop())
+        self.loop.run_forever()
+
+    async def _prepare_loop(self):
+        install_child_watcher()
+
+    def submit(self, system, on_start=None):
+        """Schedule one host on the background loop; returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(
+            self.collect_host(self.semaphore, system, on_start), self.loop
+        )
+
+    def stop(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=self.host_timeout)
+            self.loop = None
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+OptiLab Bulk Loader
+Streams rows into a table with COPY FROM STDIN, resolving conflicts through a staging table
+"""
+
+import io
+import zlib
+from datetime import date, datetime
+from itertools import islice
+
+CHUNK_ROWS = 50000  # Rows encoded into one in-memory COPY buffer
+
+
+def copy_value(value):
+    """One field in COPY text format"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    text = str(value)
+    if any(ch in text for ch in "\\\t\n\r"):
+        text = text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return text
+
+
+def copy_buffer(rows):
+    """Encode row tuples as a COPY text stream"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+class CopyDirect:
+    """COPY straight into the table; a conflicting row fails the whole load"""
+
+    def conflict_clause(self, columns):
+        return ""
+
+    def load(self, cur, table, columns, buffer):
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+        return cur.rowcount
+
+
+class StagedInsert:
+    """COPY into a temporary staging table, then INSERT ... SELECT with an ON CONFLICT clause"""
+
+    def __init__(self, on_conflict="ON CONFLICT DO NOTHING"):
+        self.on_conflict = on_conflict
+
+    def conflict_clause(self, columns):
+        return self.on_conflict
+
+    def select(self, staging, column_list):
+        return f"SELECT {column_list} FROM {staging}"
+
+    def load(self, cur, table, columns, buffer):
+        column_list = ", ".join(columns)
+        # Only the loaded columns, so the target's own defaults (e.g. timestamp NOW()) still apply
+        staging = f"{table}_staging_{zlib.crc32(column_list.encode()):08x}"
+        cur.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {staging} ON COMMIT DELETE ROWS "
+            f"AS SELECT {column_list} FROM {table} WITH NO DATA"
+        )
+        cur.copy_expert(f"COPY {staging} ({column_list}) FROM STDIN", buffer)
+        cur.execute(
+            f"INSERT INTO {table} ({column_list}) {self.select(staging, column_list)} "
+            f"{self.conflict_clause(columns)}"
+        )
+        inserted = cur.rowcount
+        # Later chunks in the same transaction must not see these rows again
+        cur.execute(f"TRUNCATE {staging}")
+        return inserted
+
+
+class StagedUpsert(StagedInsert):
+    """Staged load where incoming rows overwrite existing ones with the same key (backfill)"""
+
+    def __init__(self, key):
+        super().__init__()
+        self.key = tuple(key)
+
+    def conflict_clause(self, columns):
+        updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns if column not in self.key)
+        return f"ON CONFLICT ({', '.join(self.key)}) DO UPDATE SET {updates}"
+
+    def select(self, staging, column_list):
+        # DO UPDATE can't touch one row twice, so keep one staged row per (loaded) key
+        key = [column for column in self.key if column in column_list.split(", ")]
+        return f"SELECT DISTINCT ON ({', '.join(key)}) {column_list} FROM {staging}"
+
+
+def conflict_strategy(name, key=None):
+    """'error' (plain COPY), 'ignore' (skip existing keys) or 'update' (overwrite on `key`)"""
+    if name == "error":
+        return CopyDirect()
+    if name == "ignore":
+        return StagedInsert()
+    if name == "update":
+        if not key:
+            raise ValueError("The 'update' conflict strategy needs the table's key columns")
+        return StagedUpsert(key)
+    raise ValueError(f"Unknown conflict strategy: {name}")
+
+
+class BulkLoader:
+    """Loads row tuples (in `columns` order) into `table` in one transaction"""
+
+    def __init__(self, table, columns, strategy=None, chunk_rows=CHUNK_ROWS):
+        self.table = table
+        self.columns = tuple(columns)
+        self.strategy = strategy or StagedInsert()
+        self.chunk_rows = chunk_rows
+
+    def insert_sql(self):
+        """INSERT ... VALUES %s (for execute_values) resolving conflicts the way the strategy does,
+        for batches too small for COPY and for row-by-row retries"""
+        return (
+            f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES %s "
+            f"{self.strategy.conflict_clause(self.columns)}"
+        )
+
+    def load(self, conn, rows):
+        """COPY every row (any iterable, read chunk by chunk) and commit; returns rows written"""
+        rows = iter(rows)
+        written = 0
+        cur = conn.cursor()
+        try:
+            while True:
+                chunk = list(islice(rows, self.chunk_rows))
+                if not chunk:
+                    break
+                written += self.strategy.load(cur, self.table, self.columns, copy_buffer(chunk))
+            conn.commit()
+            return written
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
@@ -12,15 +12,27 @@ import os
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Event
+from threading import Event, Thread
 import signal
-import ipaddress
 from datetime import datetime
 
+from agent_stream import AgentStreamManager
+from async_collector import AsyncCollectionEngine
+from db_pool import DatabasePool
+from metrics_writer import MetricsBatchWriter, sample_time
+from scheduler import CollectionScheduler, PeriodicLane, MAX_BACKOFF
+from ssh_pool import SSHConnectionPool
+from script_cache import script_delivery_from_config, SCRIPT_NOT_FOUND_EXIT
+
+# The scanner's compact address ranges
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scanner"))
+from ip_ranges import IPRangeSet
+
 # Configuration
 CONFIG_FILE = os.path.join(os.path.dirname(__file__), "config.json")
 COLLECTION_INTERVAL = 10  # Collect metrics every 10 seconds
 SCAN_INTERVAL = 300  # Scan subnets every 5 minutes
+HOST_REFRESH_INTERVAL = 60  # Re-read the active system list every minute
 SSH_TIMEOUT = 10
 
 # Global flag for graceful shutdown
@@ -137,6 +149,7 @@ def ssh_identify(ip, ssh_cfg):
         return None
 
 def upsert_system(conn, ip, data, lab_id, dept_id):
+    """Insert or refresh a discovered system; returns its system_id"""
     print(f"    [DB] Inserting system {ip} into dept {dept_id}" + (f", lab {lab_id}" if lab_id else ""))
 
     cur = conn.cursor()
@@ -167,6 +180,7 @@ def upsert_system(conn, ip, data, lab_id, dept_id):
             None
         ))
 
+        system_id = None
         result = cur.fetchone()
         if result:
             system_id = result['system_id'] if isinstance(result, dict) else result[0]
@@ -176,6 +190,7 @@ def upsert_system(conn, ip, data, lab_id, dept_id):
 
         conn.commit()
         print(f"    [DB] ✓ Transaction committed for {ip}")
+        return system_id
 
     except Exception as e:
         conn.rollback()
@@ -184,7 +199,7 @@ def upsert_system(conn, ip, data, lab_id, dept_id):
     finally:
         cur.close()
 
-def discover_department(dept, ssh_cfg, conn):
+def discover_department(dept, ssh_cfg, conn, publish=None):
     # Validate department configuration
     validate_dept_config(conn, dept)
 
@@ -196,9 +211,8 @@ def discover_department(dept, ssh_cfg, conn):
     
     lab_id = labs[0]['lab_id'] if labs else None  # Assign to first lab if exists
 
-    # Get all IPs in the subnet
-    network = ipaddress.ip_network(dept["subnet_cidr"])
-    ips = [str(ip) for ip in network.hosts()]
+    # All host addresses in the subnet as one interval; membership is a bisect, not a list scan
+    ips = IPRangeSet.from_network(dept["subnet_cidr"])
     
     responsive_hosts = []
     print(f"[+] Scanning department {dept['dept_id']} ({dept['dept_name']}) - {dept['subnet_cidr']} ({len(ips)} IPs)")
@@ -225,10 +239,12 @@ def discover_department(dept, ssh_cfg, conn):
             info = future.result()
             if not info:
                 continue
-            upsert_system(conn, ip, info, lab_id, dept["dept_id"])
+            system_id = upsert_system(conn, ip, info, lab_id, dept["dept_id"])
             print(f"    [+] {ip} → {info['hostname']} (verified)")
+            if publish and system_id is not None:
+                publish({"system_id": system_id, "ip_address": ip, "hostname": info.get("hostname")})
 
-def scan_departments(conn, cfg):
+def scan_departments(conn, cfg, publish=None):
     """Run one complete department scan cycle"""
     try:
         print(f"[SCAN] Starting department scan at {datetime.now()}")
@@ -239,11 +255,46 @@ def scan_departments(conn, cfg):
         cur.close()
         
         for dept in departments:
-            discover_department(dict(dept), cfg["ssh"], conn)
+            discover_department(dict(dept), cfg["ssh"], conn, publish)
         print(f"[SCAN] Department scan completed at {datetime.now()}")
     except Exception as e:
         print(f"[SCAN] Error in scan cycle: {e}")
 
+class DiscoveryWorker(Thread):
+    """Runs department scans in the background on a dedicated DB connection"""
+    
+    def __init__(self, cfg, interval, publish, stop_event):
+        super().__init__(name="discovery", daemon=True)
+        self.cfg = cfg
+        self.lane = PeriodicLane(interval)
+        self.publish = publish
+        self.stop_event = stop_event
+        self.conn = None
+    
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                if self.lane.is_due():
+                    self.scan_once()
+                    self.lane.advance()
+                self.stop_event.wait(self.lane.time_until_next())
+        finally:
+            if self.conn is not None:
+                self.conn.close()
+    
+    def scan_once(self):
+        try:
+            if self.conn is None or self.conn.closed:
+                self.conn = db_connect(self.cfg)
+            scan_departments(self.conn, self.cfg, self.publish)
+            # Leave no transaction open (or aborted) between scans
+            self.conn.rollback()
+        except Exception as e:
+            print(f"[SCAN] Discovery worker error: {e}")
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
 # Metrics collection functions
 def get_active_systems(conn):
     """Get all active systems from database"""
@@ -258,51 +309,27 @@ def get_active_systems(conn):
     cur.close()
     return systems
 
-def collect_metrics_ssh(ip, ssh_cfg):
-    """Collect metrics from remote system via SSH"""
-    script_path = os.path.join(os.path.dirname(__file__), "metrics_collector.sh")
-    remote_script = "/tmp/metrics_collector.sh"
-    
+def collect_metrics_ssh(ip, pool, deploy_cache):
+    """Collect metrics from remote system over its pooled SSH session"""
     try:
-        # Transfer script
-        scp_cmd = (
-            f"scp -oBatchMode=yes "
-            f"-oConnectTimeout={SSH_TIMEOUT} "
-            f"-oStrictHostKeyChecking=no "
-            f"-i {ssh_cfg['private_key']} "
-            f"{script_path} {ssh_cfg['user']}@{ip}:{remote_script}"
-        )
-        result = subprocess.run(scp_cmd, shell=True, capture_output=True, text=True, timeout=SSH_TIMEOUT)
-        
-        if result.returncode != 0:
-            print(f"  [!] SCP failed for {ip}: {result.stderr}")
-            return None
-        
-        # Run metrics collection script
-        ssh_cmd = (
-            f"ssh -oBatchMode=yes "
-            f"-oConnectTimeout={SSH_TIMEOUT} "
-            f"-oStrictHostKeyChecking=no "
-            f"-i {ssh_cfg['private_key']} "
-            f"{ssh_cfg['user']}@{ip} "
-            f"'bash {remote_script} --json'"
-        )
-        result = subprocess.run(ssh_cmd, shell=True, capture_output=True, text=True, timeout=SSH_TIMEOUT)
-        
-        if result.returncode != 0:
-            print(f"  [!] SSH metrics collection failed for {ip}")
-            return None
-        
-        # Cleanup
-        cleanup_cmd = (
-            f"ssh -oBatchMode=yes "
-            f"-oConnectTimeout={SSH_TIMEOUT} "
-            f"-oStrictHostKeyChecking=no "
-            f"-i {ssh_cfg['private_key']} "
-            f"{ssh_cfg['user']}@{ip} "
-            f"'rm -f {remote_script}'"
-        )
-        subprocess.run(cleanup_cmd, shell=True, capture_output=True, timeout=SSH_TIMEOUT)
+        with pool.session(ip) as session:
+            # Transfer script only if the target's copy is missing or stale
+            if not deploy_cache.ensure_deployed(session, timeout=SSH_TIMEOUT):
+                return None
+            
+            # Run metrics collection script (from the cached copy or piped over stdin)
+            result = session.run(deploy_cache.remote_command, timeout=SSH_TIMEOUT, input=deploy_cache.stdin)
+            
+            if result.returncode == SCRIPT_NOT_FOUND_EXIT:
+                # Cached copy vanished (e.g. deleted on the target); redeploy once
+                deploy_cache.invalidate(ip)
+                if not deploy_cache.ensure_deployed(session, timeout=SSH_TIMEOUT):
+                    return None
+                result = session.run(deploy_cache.remote_command, timeout=SSH_TIMEOUT, input=deploy_cache.stdin)
+            
+            if result.returncode != 0:
+                print(f"  [!] SSH metrics collection failed for {ip}")
+                return None
         
         # Parse JSON response
         try:
@@ -319,109 +346,68 @@ def collect_metrics_ssh(ip, ssh_cfg):
         print(f"  [!] Error collecting metrics from {ip}: {e}")
         return None
 
-def insert_metrics(conn, system_id, metrics):
-    """Insert metrics into database"""
-    try:
-        cur = conn.cursor()
-        
-        cur.execute("""
-            INSERT INTO metrics (
-                system_id, timestamp,
-                cpu_percent, cpu_temperature,
-                ram_percent,
-                disk_percent, disk_read_mbps, disk_write_mbps,
-                network_sent_mbps, network_recv_mbps,
-                gpu_percent, gpu_memory_used_gb, gpu_temperature,
-                uptime_seconds, logged_in_users
-            )
-            VALUES (
-                %s, NOW(),
-                %s, %s,
-                %s,
-                %s, %s, %s,
-                %s, %s,
-                %s, %s, %s,
-                %s, %s
-            )
-            ON CONFLICT DO NOTHING
-        """, (
-            system_id,
-            metrics.get("cpu_percent"), metrics.get("cpu_temperature"),
-            metrics.get("ram_percent"),
-            metrics.get("disk_percent"), metrics.get("disk_read_mbps"), metrics.get("disk_write_mbps"),
-            metrics.get("network_sent_mbps"), metrics.get("network_recv_mbps"),
-            metrics.get("gpu_percent"), metrics.get("gpu_memory_used_gb"), metrics.get("gpu_temperature"),
-            metrics.get("uptime_seconds"), metrics.get("logged_in_users")
-        ))
-        
-        conn.commit()
-        cur.close()
-        return True
-        
-    except Exception as e:
-        print(f"  [!] Database insert error for system {system_id}: {e}")
-        conn.rollback()
-        return False
-
-def collect_system_metrics(conn, system, ssh_cfg):
-    """Collect and insert metrics for a single system"""
-    system_id = system['system_id']
+def collect_system(system, pool, deploy_cache, on_start=None):
+    """Collect metrics for a single system (thread pool worker)"""
+    if on_start is not None:
+        on_start(system['ip_address'])
+    return system, collect_metrics_ssh(system['ip_address'], pool, deploy_cache)
+
+def record_result(future, writer, scheduler):
+    """Queue a finished host's metrics and put the host back on the schedule"""
+    if future.cancelled():
+        return
+    # Stamped on completion, not at flush time
+    collected_at = datetime.now().astimezone()
+    system, metrics = future.result()
     ip = system['ip_address']
-    hostname = system['hostname']
-    
-    print(f"  → Collecting metrics from {hostname} ({ip})...", end=" ", flush=True)
-    
-    metrics = collect_metrics_ssh(ip, ssh_cfg)
+    lateness = scheduler.last_lateness(ip) or 0.0
+    label = f"{system['hostname']} ({ip}), started {lateness * 1000:.0f} ms late"
     
     if metrics:
-        if insert_metrics(conn, system_id, metrics):
-            print("✓")
-            return True
-        else:
-            print("✗ (insert failed)")
-            return False
+        writer.add(system['system_id'], metrics, collected_at)
+        print(f"  → {label} ✓")
     else:
-        print("✗ (collection failed)")
-        return False
+        print(f"  → {label} ✗ (collection failed)")
+    scheduler.complete(ip, bool(metrics))
 
-def run_collection_cycle(cfg, conn):
-    """Run one complete metrics collection cycle"""
+def refresh_schedule(db, scheduler):
+    """Sync the scheduler (or agent manager) with the active systems in the database"""
     try:
-        # Reconnect if needed
-        try:
-            conn.isolation_level
-        except:
-            print("[!] Database connection lost, reconnecting...")
-            conn = db_connect(cfg)
-        
-        systems = get_active_systems(conn)
-        
-        if not systems:
-            print("[*] No active systems found")
-            return conn
-        
-        print(f"[+] Collecting metrics from {len(systems)} systems...")
-        
-        ssh_cfg = cfg["ssh"]
-        successful = 0
-        
-        # Collect metrics in parallel
-        with ThreadPoolExecutor(max_workers=cfg.get("max_workers", 5)) as executor:
-            futures = {
-                executor.submit(collect_system_metrics, conn, system, ssh_cfg): system['system_id']
-                for system in systems
-            }
-            
-            for future in as_completed(futures):
-                if future.result():
-                    successful += 1
-        
-        print(f"[✓] Metrics collection cycle complete: {successful}/{len(systems)} successful")
-        
+        with db.connection() as conn:
+            systems = get_active_systems(conn)
+    except Exception as e:
+        print(f"[!] Could not refresh active systems: {e}")
+        return
+    
+    added, removed = scheduler.sync(systems)
+    if added or removed:
+        print(f"[*] Schedule updated: +{added}/-{removed} hosts, {len(systems)} active")
+
+def flush_cycle(db, writer, stats, cycle):
+    """Write the interval's metrics in one transaction and report schedule health"""
+    pending = len(writer)
+    failed = []
+    try:
+        # One transaction per interval, on a connection no worker shares
+        with db.connection() as conn:
+            failed = writer.flush(conn)
     except Exception as e:
-        print(f"[!] Error in collection cycle: {e}")
+        print(f"[!] Error flushing metrics: {e}")
+        failed = [None] * pending
     
-    return conn
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    print(
+        f"[{timestamp}] Collection cycle {cycle}: "
+        f"{pending - len(failed)}/{pending} rows stored, "
+        f"{stats['completed']} hosts ok, {stats['failed']} failed"
+    )
+    if stats['started']:
+        print(
+            f"    Schedule lateness over {stats['started']} probes: "
+            f"mean {stats['lateness_mean'] * 1000:.0f} ms, "
+            f"p95 {stats['lateness_p95'] * 1000:.0f} ms, "
+            f"max {stats['lateness_max'] * 1000:.0f} ms"
+        )
 
 def main():
     """Main loop"""
@@ -433,44 +419,117 @@ def main():
     cfg = load_config()
     
     print(f"[*] Connecting to database: {cfg['db']['dsn']}")
-    conn = db_connect(cfg)
+    db = DatabasePool.from_config(cfg)
     print("[✓] Connected to database")
     
+    pool = SSHConnectionPool.from_config(cfg, connect_timeout=SSH_TIMEOUT)
+    deploy_cache = script_delivery_from_config(
+        cfg, os.path.join(os.path.dirname(__file__), "metrics_collector.sh")
+    )
+    writer = MetricsBatchWriter.from_config(cfg)
+    agent_mode = cfg.get("collection_mode", "poll") == "agent"
+    
+    if agent_mode:
+        # Each host streams samples over one long-lived channel; nothing to poll
+        scheduler = AgentStreamManager(
+            pool, deploy_cache, cfg.get("agent_interval_seconds", COLLECTION_INTERVAL),
+            # Each record is dated by the agent's own sample time
+            on_record=lambda system, metrics: writer.add(
+                system['system_id'], metrics, sample_time(metrics)
+            ),
+            start_workers=cfg.get("max_workers", 5),
+        )
+    else:
+        scheduler = CollectionScheduler(
+            COLLECTION_INTERVAL, max_backoff=cfg.get("max_backoff_seconds", MAX_BACKOFF)
+        )
+    
+    if agent_mode:
+        scheduler.start()
+        submit = None
+        stop_workers = scheduler.close
+    elif cfg.get("collection_engine", "threads") == "asyncio":
+        # Probe hosts from one event loop
+        engine = AsyncCollectionEngine.from_config(cfg, pool, deploy_cache, host_timeout=SSH_TIMEOUT)
+        engine.start()
+        submit = lambda system: engine.submit(system, on_start=scheduler.start)
+        stop_workers = engine.stop
+    else:
+        executor = ThreadPoolExecutor(max_workers=cfg.get("max_workers", 5))
+        submit = lambda system: executor.submit(
+            collect_system, system, pool, deploy_cache, on_start=scheduler.start
+        )
+        stop_workers = lambda: executor.shutdown(wait=True, cancel_futures=True)
+    
+    def publish_system(system):
+        # Newly discovered hosts join the schedule without waiting for a refresh
+        if scheduler.add(system):
+            print(f"[*] Scheduling newly discovered {system['hostname']} ({system['ip_address']})")
+    
+    discovery = DiscoveryWorker(cfg, SCAN_INTERVAL, publish_system, shutdown_event)
+    
     print(f"[*] Scan interval: {SCAN_INTERVAL} seconds")
-    print(f"[*] Collection interval: {COLLECTION_INTERVAL} seconds")
+    if agent_mode:
+        print(f"[*] Collection mode: streaming agents, one sample every {scheduler.interval} seconds")
+    else:
+        print(f"[*] Collection interval: {COLLECTION_INTERVAL} seconds (spread per host)")
     print("[*] Press Ctrl+C to stop\n")
     
-    last_scan = 0
-    last_collection = 0
+    next_refresh = time.monotonic()
+    next_flush = next_refresh + COLLECTION_INTERVAL
     cycle = 0
     
+    # Discovery runs concurrently and never holds up the collection cadence
+    discovery.start()
+    
     try:
         while not shutdown_event.is_set():
-            current_time = time.time()
+            if time.monotonic() >= next_refresh:
+                refresh_schedule(db, scheduler)
+                next_refresh = time.monotonic() + HOST_REFRESH_INTERVAL
             
-            # Check if it's time to scan
-            if current_time - last_scan >= SCAN_INTERVAL:
-                scan_departments(conn, cfg)
-                last_scan = current_time
+            if agent_mode:
+                # Start new agents and restart ones that exited or went silent
+                scheduler.maintain()
+            else:
+                # Hand every host whose deadline has passed to the workers
+                for system in scheduler.pop_due():
+                    future = submit(system)
+                    future.add_done_callback(lambda f: record_result(f, writer, scheduler))
             
-            # Check if it's time to collect metrics
-            if current_time - last_collection >= COLLECTION_INTERVAL:
+            now = time.monotonic()
+            if now >= next_flush:
                 cycle += 1
-                timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-                print(f"\n[{timestamp}] Collection cycle {cycle}")
+                flush_cycle(db, writer, scheduler.report(), cycle)
+                deploy_cache.save()
                 
-                conn = run_collection_cycle(cfg, conn)
-                last_collection = current_time
+                # Drop sessions for hosts that went idle or left the active set
+                evicted = pool.evict_idle(keep=set(scheduler.hosts))
+                if evicted:
+                    print(f"[*] Closed {evicted} idle SSH sessions")
+                next_flush = max(next_flush + COLLECTION_INTERVAL, now)
             
-            # Sleep briefly to avoid high CPU usage
-            time.sleep(1)
+            # Sleep until the next host is due or another lane needs attention
+            shutdown_event.wait(max(0.0, min(
+                COLLECTION_INTERVAL if agent_mode else scheduler.time_until_next(),
+                next_flush - now,
+                next_refresh - now,
+            )))
     
     except KeyboardInterrupt:
         pass
     finally:
-        print("\n[*] Closing database connection...")
-        conn.close()
+        shutdown_event.set()
+        print("\n[*] Waiting for in-flight collections...")
+        stop_workers()
+        discovery.join(timeout=SSH_TIMEOUT)
+        flush_cycle(db, writer, scheduler.report(), cycle + 1)
+        deploy_cache.save()
+        print("[*] Closing SSH sessions...")
+        pool.close_all()
+        print("[*] Closing database connections...")
+        db.close()
         print("[✓] Combined monitor stopped")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
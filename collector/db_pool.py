@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+OptiLab Database Pool
+Thread-safe PostgreSQL connections for the collector with health checks and reconnects
+"""
+
+import time
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+
+POOL_MIN = 1
+POOL_MAX = 10
+HEALTH_CHECK_IDLE = 30  # Ping connections that sat idle longer than this (seconds)
+CONNECT_RETRIES = 3
+CONNECT_BACKOFF = 2  # Seconds, doubled after each failed attempt
+
+
+class DatabasePool:
+    """Hands each caller its own connection; broken connections are replaced"""
+
+    def __init__(self, dsn, minconn=POOL_MIN, maxconn=POOL_MAX):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        # ThreadedConnectionPool raises when exhausted; make callers wait instead
+        self.slots = BoundedSemaphore(maxconn)
+        self.lock = Lock()
+        self.last_used = {}
+        # Which underlying pool each checked-out connection came from (it may be reopened)
+        self.owners = {}
+        self.pool = None
+        self._open()
+
+    @classmethod
+    def from_config(cls, cfg):
+        db_cfg = cfg["db"]
+        return cls(
+            db_cfg["dsn"],
+            minconn=db_cfg.get("pool_min", POOL_MIN),
+            maxconn=db_cfg.get("pool_max", POOL_MAX),
+        )
+
+    def _open(self):
+        """Create the underlying pool, retrying while the server is unreachable"""
+        delay = CONNECT_BACKOFF
+        for attempt in range(1, CONNECT_RETRIES + 1):
+            try:
+                self.pool = ThreadedConnectionPool(
+                    self.minconn, self.maxconn, self.dsn, cursor_factory=RealDictCursor
+                )
+                return
+            except psycopg2.OperationalError as e:
+                if attempt == CONNECT_RETRIES:
+                    raise
+                print(f"[!] Database connection failed ({e}), retrying in {delay}s...")
+                time.sleep(delay)
+                delay *= 2
+
+    def _healthy(self, conn):
+        """Cheap liveness check, only for connections that sat idle"""
+        if conn.closed:
+            return False
+        if time.time() - self.last_used.get(id(conn), 0) < HEALTH_CHECK_IDLE:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self):
+        with self.lock:
+            if self.pool is None or self.pool.closed:
+                self._open()
+            pool = self.pool
+        conn = pool.getconn()
+        if not self._healthy(conn):
+            print("[!] Database connection lost, reconnecting...")
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        return pool, conn
+
+    def get(self):
+        """Check out a connection until put(); waits while the pool is exhausted"""
+        self.slots.acquire()
+        try:
+            pool, conn = self._checkout()
+        except Exception:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.owners[id(conn)] = pool
+        return conn
+
+    def put(self, conn, broken=False):
+        """Return a get() connection; a closed or broken one is dropped"""
+        with self.lock:
+            pool = self.owners.pop(id(conn))
+        broken = broken or bool(conn.closed)
+        self.last_used.pop(id(conn), None)
+        if not broken:
+            self.last_used[id(conn)] = time.time()
+        try:
+            pool.putconn(conn, close=broken)
+        finally:
+            self.slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the block; rolled back and dropped if it breaks"""
+        conn = self.get()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.put(conn, broken)
+
+    def close(self):
+        """Close every pooled connection"""
+        with self.lock:
+            if self.pool is not None and not self.pool.closed:
+                self.pool.closeall()
@@ -3,7 +3,11 @@
 ################################################################################
 # OptiLab Metrics Collector
 # Purpose: Collects system metrics (CPU, RAM, Disk, Network, GPU) on target systems
-# Usage: ./metrics_collector.sh
+# Usage: ./metrics_collector.sh [--json] [--agent [INTERVAL_SECONDS]]
+#   --agent  Keep running and print one JSON record per line every INTERVAL
+#            seconds (default 10) for the collector to consume as a stream
+# On Linux every rate comes from one pair of /proc snapshots taken
+# SAMPLE_WINDOW seconds apart (default 1), so a sample takes about that long
 # Note: This script runs ON the target system being monitored
 ################################################################################
 
@@ -180,23 +184,29 @@ get_disk_percent() {
     df -h / | awk 'NR==2 {print $5}' | sed 's/%//'
 }
 
+# Find the main disk device
+get_disk_device() {
+    local disk_device=$(lsblk -d -o name 2>/dev/null | grep -E "^(sda|vda|nvme0n1)" | head -1)
+    
+    # Default to common disk names if lsblk doesn't work
+    if [[ -z "$disk_device" ]]; then
+        for dev in sda vda nvme0n1; do
+            if grep -q "^.*$dev " /proc/diskstats 2>/dev/null; then
+                disk_device="$dev"
+                break
+            fi
+        done
+    fi
+    
+    echo "$disk_device"
+}
+
 get_disk_io() {
     # Returns disk read/write in MB/s
     
     if [[ -f /proc/diskstats ]]; then
         # Fallback: sample /proc/diskstats (most reliable)
-        # Find the main disk device
-        local disk_device=$(lsblk -d -o name | grep -E "^(sda|vda|nvme0n1)" | head -1)
-        
-        # Default to common disk names if lsblk doesn't work
-        if [[ -z "$disk_device" ]]; then
-            for dev in sda vda nvme0n1; do
-                if grep -q "^.*$dev " /proc/diskstats 2>/dev/null; then
-                    disk_device="$dev"
-                    break
-                fi
-            done
-        fi
+        local disk_device=$(get_disk_device)
         
         if [[ -z "$disk_device" ]]; then
             echo "0.00 0.00"
@@ -241,10 +251,8 @@ get_disk_io() {
 # Network Metrics
 ################################################################################
 
-get_network_io() {
-    # Returns network sent/received in Mbps
-    
-    # Find primary network interface
+# Find primary network interface
+get_network_interface() {
     local interface=""
     
     if command_exists ip; then
@@ -259,6 +267,13 @@ get_network_io() {
     [[ -z "$interface" ]] && interface="eth0"
     [[ ! -d "/sys/class/net/$interface" ]] && interface="en0"
     
+    echo "$interface"
+}
+
+get_network_io() {
+    # Returns network sent/received in Mbps
+    local interface=$(get_network_interface)
+    
     if [[ -f "/sys/class/net/$interface/statistics/tx_bytes" ]]; then
         # Linux
         local tx1=$(cat /sys/class/net/$interface/statistics/tx_bytes)
@@ -289,7 +304,95 @@ get_network_io() {
 }
 
 ################################################################################
-# GPU Metrics
+# Shared Sampling Window (Linux)
+################################################################################
+
+# Length of the window every Linux rate is measured over (seconds)
+SAMPLE_WINDOW="${SAMPLE_WINDOW:-1}"
+
+# Print the raw counters behind every rate, read from /proc in one pass:
+# cpu_total cpu_idle cpu_iowait ctxt sectors_read sectors_written
+# tx_bytes rx_bytes pgfault pgmajfault pswpin pswpout
+read_counters() {
+    local disk_device=$1
+    local interface=$2
+    local files=(/proc/stat)
+    local file
+    
+    for file in /proc/diskstats /proc/net/dev /proc/vmstat; do
+        [[ -r "$file" ]] && files+=("$file")
+    done
+    
+    awk -v disk="$disk_device" -v iface="$interface" '
+        FILENAME == "/proc/stat" && $1 == "cpu" {
+            for (i = 2; i <= NF; i++) cpu_total += $i
+            cpu_idle = $5; cpu_iowait = $6
+        }
+        FILENAME == "/proc/stat" && $1 == "ctxt" { ctxt = $2 }
+        FILENAME == "/proc/diskstats" && $3 == disk && !seen_disk++ {
+            sectors_read = $6; sectors_written = $10
+        }
+        FILENAME == "/proc/net/dev" && index($0, ":") {
+            name = substr($0, 1, index($0, ":") - 1)
+            gsub(/ /, "", name)
+            if (name == iface) {
+                split(substr($0, index($0, ":") + 1), f, " ")
+                rx_bytes = f[1]; tx_bytes = f[9]
+            }
+        }
+        FILENAME == "/proc/vmstat" && $1 in vm { vm[$1] = $2 }
+        BEGIN { vm["pgfault"] = vm["pgmajfault"] = vm["pswpin"] = vm["pswpout"] = "" }
+        END {
+            printf "%.0f %.0f %.0f %.0f %.0f %.0f %.0f %.0f %s %s %s %s\n",
+                cpu_total, cpu_idle, cpu_iowait, ctxt, sectors_read, sectors_written,
+                tx_bytes, rx_bytes,
+                (vm["pgfault"] == "" ? "null" : vm["pgfault"]),
+                (vm["pgmajfault"] == "" ? "null" : vm["pgmajfault"]),
+                (vm["pswpin"] == "" ? "null" : vm["pswpin"]),
+                (vm["pswpout"] == "" ? "null" : vm["pswpout"])
+        }
+    ' "${files[@]}" 2>/dev/null
+}
+
+# Take one snapshot, wait once, take a second and derive every rate from the pair:
+# cpu_percent cpu_iowait disk_read_mbps disk_write_mbps network_sent_mbps
+# network_recv_mbps context_switch_rate swap_in_rate swap_out_rate
+# page_fault_rate major_page_fault_rate
+sample_rates() {
+    local disk_device=$(get_disk_device)
+    local interface=$(get_network_interface)
+    
+    local before=$(read_counters "$disk_device" "$interface")
+    sleep "$SAMPLE_WINDOW"
+    local after=$(read_counters "$disk_device" "$interface")
+    
+    echo "$before $after" | awk -v window="$SAMPLE_WINDOW" '
+        # Per-second delta of counter i, scaled; counters that went backwards read as 0
+        function rate(i, scale, fmt,    d) {
+            if ($i == "null" || $(i + 12) == "null") return "null"
+            d = $(i + 12) - $i
+            if (d < 0) d = 0
+            return sprintf(fmt, d * scale / window)
+        }
+        {
+            total = $13 - $1
+            cpu = total > 0 ? sprintf("%.2f", 100 * (total - ($14 - $2)) / total) : "0.00"
+            iowait = total > 0 ? sprintf("%.2f", 100 * ($15 - $3) / total) : "0.00"
+            
+            # Sectors are 512 bytes; network rates are in Mbps like get_network_io
+            printf "%s %s %s %s %s %s %s %s %s %s %s\n",
+                cpu, iowait,
+                rate(5, 512 / 1048576, "%.2f"), rate(6, 512 / 1048576, "%.2f"),
+                rate(7, 8 / 1000000, "%.2f"), rate(8, 8 / 1000000, "%.2f"),
+                rate(4, 1, "%d"),
+                rate(11, 1, "%.2f"), rate(12, 1, "%.2f"),
+                rate(9, 1, "%.2f"), rate(10, 1, "%.2f")
+        }
+    '
+}
+
+################################################################################
+# Fallback Rate Samplers (no /proc)
 ################################################################################
 
 get_context_switch_rate() {
@@ -413,29 +516,22 @@ get_gpu_metrics() {
 ################################################################################
 
 collect_metrics() {
+    local rates=()
+    
+    # Start the shared sampling window first so the one-off reads below run inside it
+    if [[ -f /proc/stat ]]; then
+        exec 3< <(sample_rates)
+    fi
+    
     local timestamp=$(get_timestamp)
     local hostname=$(get_hostname)
     local uptime=$(get_uptime)
     local logged_users=$(get_logged_in_users)
     
-    # CPU metrics
-    local cpu_percent=$(get_cpu_percent)
+    # Point-in-time metrics
     local cpu_temp=$(get_cpu_temperature)
-    local cpu_iowait=$(get_cpu_iowait)
-    
-    # Memory metrics
     local ram_percent=$(get_ram_percent)
-    
-    # Disk metrics
     local disk_percent=$(get_disk_percent)
-    local disk_io=($(get_disk_io))
-    local disk_read_mbps=${disk_io[0]:-0.00}
-    local disk_write_mbps=${disk_io[1]:-0.00}
-    
-    # Network metrics
-    local network_io=($(get_network_io))
-    local network_sent_mbps=${network_io[0]:-0.00}
-    local network_recv_mbps=${network_io[1]:-0.00}
     
     # GPU metrics
     local gpu_metrics=($(get_gpu_metrics))
@@ -443,14 +539,45 @@ collect_metrics() {
     local gpu_memory_gb=${gpu_metrics[1]:-null}
     local gpu_temp=${gpu_metrics[2]:-null}
     
-    # CFRS-relevant advanced metrics
-    local context_switches=$(get_context_switch_rate)
-    local swap_rates=($(get_swap_rates))
-    local swap_in=${swap_rates[0]:-null}
-    local swap_out=${swap_rates[1]:-null}
-    local page_faults=($(get_page_fault_rates))
-    local page_fault_rate=${page_faults[0]:-null}
-    local major_page_fault_rate=${page_faults[1]:-null}
+    if [[ -f /proc/stat ]]; then
+        read -r -a rates <&3 || true
+        exec 3<&-
+    fi
+    
+    if [[ ${#rates[@]} -eq 11 ]]; then
+        local cpu_percent=${rates[0]}
+        local cpu_iowait=${rates[1]}
+        local disk_read_mbps=${rates[2]}
+        local disk_write_mbps=${rates[3]}
+        local network_sent_mbps=${rates[4]}
+        local network_recv_mbps=${rates[5]}
+        local context_switches=${rates[6]}
+        local swap_in=${rates[7]}
+        local swap_out=${rates[8]}
+        local page_fault_rate=${rates[9]}
+        local major_page_fault_rate=${rates[10]}
+    else
+        # No /proc: sample each metric with the platform tools
+        local cpu_percent=$(get_cpu_percent)
+        local cpu_iowait=$(get_cpu_iowait)
+        
+        local disk_io=($(get_disk_io))
+        local disk_read_mbps=${disk_io[0]:-0.00}
+        local disk_write_mbps=${disk_io[1]:-0.00}
+        
+        local network_io=($(get_network_io))
+        local network_sent_mbps=${network_io[0]:-0.00}
+        local network_recv_mbps=${network_io[1]:-0.00}
+        
+        # CFRS-relevant advanced metrics
+        local context_switches=$(get_context_switch_rate)
+        local swap_rates=($(get_swap_rates))
+        local swap_in=${swap_rates[0]:-null}
+        local swap_out=${swap_rates[1]:-null}
+        local page_faults=($(get_page_fault_rates))
+        local page_fault_rate=${page_faults[0]:-null}
+        local major_page_fault_rate=${page_faults[1]:-null}
+    fi
     
     # Output in JSON format
     cat << EOF
@@ -484,15 +611,54 @@ EOF
 # Main Execution
 ################################################################################
 
+# Stream newline-delimited JSON records until the channel closes
+run_agent() {
+    local interval=$1
+    
+    while true; do
+        local started=$(date +%s)
+        
+        collect_metrics | tr -d '\n'
+        printf '\n'
+        
+        local elapsed=$(( $(date +%s) - started ))
+        if [[ $elapsed -lt $interval ]]; then
+            sleep $(( interval - elapsed ))
+        fi
+    done
+}
+
 main() {
+    local agent_interval=""
+    
+    while [[ $# -gt 0 ]]; do
+        case "$1" in
+            --agent)
+                agent_interval=10
+                if [[ "${2:-}" =~ ^[0-9]+$ ]]; then
+                    agent_interval=$2
+                    shift
+                fi
+                ;;
+            --json)
+                OUTPUT_FORMAT=json
+                ;;
+        esac
+        shift
+    done
+    
     # Check if running with sufficient privileges (warn if not root for some metrics)
     if [[ $EUID -ne 0 ]] && [[ ! -f /proc/stat ]]; then
         >&2 echo "Warning: Some metrics may require root privileges for accuracy"
     fi
     
-    # Collect and output metrics
-    collect_metrics
+    if [[ -n "$agent_interval" ]]; then
+        run_agent "$agent_interval"
+    else
+        # Collect and output metrics
+        collect_metrics
+    fi
 }
 
 # Run main
-main
+main "$@"
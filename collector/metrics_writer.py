@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+OptiLab Metrics Batch Writer
+Buffers one collection cycle of metrics and writes them in a single transaction
+"""
+
+from datetime import datetime
+from threading import Lock
+
+from psycopg2.extras import execute_values
+
+from bulk_loader import BulkLoader, conflict_strategy
+
+# Columns filled from the metrics_collector.sh JSON, in insert order
+METRIC_FIELDS = (
+    "cpu_percent", "cpu_temperature",
+    "ram_percent",
+    "disk_percent", "disk_read_mbps", "disk_write_mbps",
+    "network_sent_mbps", "network_recv_mbps",
+    "gpu_percent", "gpu_memory_used_gb", "gpu_temperature",
+    "uptime_seconds", "logged_in_users",
+)
+
+ROW_TEMPLATE = "(%s, %s, " + ", ".join(["%s"] * len(METRIC_FIELDS)) + ")"
+METRICS_KEY = ("system_id", "timestamp")
+COPY_THRESHOLD = 200  # Smaller batches are cheaper as one multi-row INSERT than a staged COPY
+
+
+def metrics_loader(with_timestamp=True, conflict="ignore"):
+    """COPY loader for metrics rows; without a timestamp column the row gets the table's NOW()"""
+    columns = ("system_id", "timestamp", *METRIC_FIELDS) if with_timestamp else ("system_id", *METRIC_FIELDS)
+    return BulkLoader("metrics", columns, conflict_strategy(conflict, METRICS_KEY))
+
+
+def metrics_row(system_id, metrics, collected_at):
+    """Row tuple for one system's metrics, matching ROW_TEMPLATE"""
+    return (system_id, collected_at, *(metrics.get(field) for field in METRIC_FIELDS))
+
+
+def sample_time(metrics):
+    """The collector script's own "timestamp" (UTC, whole seconds), or None if absent or bad"""
+    value = metrics.get("timestamp")
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+class MetricsBatchWriter:
+    """Collects rows from worker threads and flushes them with one commit"""
+
+    def __init__(self, conflict="ignore", copy_threshold=COPY_THRESHOLD):
+        self.rows = []
+        self.lock = Lock()
+        self.loader = metrics_loader(conflict=conflict)
+        # Same conflict handling on the INSERT paths as on COPY
+        self.insert_sql = self.loader.insert_sql()
+        self.copy_threshold = copy_threshold
+
+    @classmethod
+    def from_config(cls, cfg):
+        writer_cfg = cfg.get("metrics_writer", {})
+        return cls(
+            conflict=writer_cfg.get("conflict", "ignore"),
+            copy_threshold=writer_cfg.get("copy_threshold", COPY_THRESHOLD),
+        )
+
+    def add(self, system_id, metrics, collected_at=None):
+        """Queue a system's metrics for the next flush (thread-safe)
+
+        Rows carry their collection time rather than the flush's NOW(), so two samples
+        of one host that land in the same flush keep distinct (system_id, timestamp) keys.
+        """
+        row = metrics_row(system_id, metrics, collected_at or datetime.now().astimezone())
+        with self.lock:
+            self.rows.append(row)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.rows)
+
+    def flush(self, conn):
+        """Write all queued rows; returns the system_ids whose row failed"""
+        with self.lock:
+            rows, self.rows = self.rows, []
+        if not rows:
+            return []
+
+        cur = conn.cursor()
+        try:
+            # Fast path: one COPY (large batches) or multi-row INSERT, one commit
+            if len(rows) >= self.copy_threshold:
+                self.loader.load(conn, rows)
+            else:
+                execute_values(cur, self.insert_sql, rows, template=ROW_TEMPLATE, page_size=len(rows))
+                conn.commit()
+            return []
+        except Exception as e:
+            conn.rollback()
+            print(f"  [!] Batch insert of {len(rows)} rows failed ({e}), retrying row by row")
+        finally:
+            cur.close()
+
+        return self._flush_isolated(conn, rows)
+
+    def _flush_isolated(self, conn, rows):
+        """Insert rows under individual savepoints so one bad row can't drop the rest"""
+        failed = []
+        cur = conn.cursor()
+        try:
+            for row in rows:
+                cur.execute("SAVEPOINT metrics_row")
+                try:
+                    execute_values(cur, self.insert_sql, [row], template=ROW_TEMPLATE)
+                    cur.execute("RELEASE SAVEPOINT metrics_row")
+                except Exception as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT metrics_row")
+                    print(f"  [!] Database insert error for system {row[0]}: {e}")
+                    failed.append(row[0])
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"  [!] Database insert error for metrics batch: {e}")
+            return [row[0] for row in rows]
+        finally:
+            cur.close()
+        return failed
@@ -9,17 +9,25 @@ import sys
 import json
 import time
 import logging
+import multiprocessing
+import queue
 import signal
+import socket
+import threading
 from datetime import datetime
-from typing import Dict, Any, Optional
+from functools import partial
+from typing import Dict, Any, List, Optional, Tuple
 
 try:
     import psycopg2
-    from psycopg2.extras import RealDictCursor
+    from psycopg2.extras import RealDictCursor, execute_values
 except ImportError:
     print("Error: psycopg2 not installed. Install with: pip install psycopg2-binary")
     sys.exit(1)
 
+from bulk_loader import BulkLoader
+from metrics_writer import COPY_THRESHOLD, METRIC_FIELDS, metrics_loader
+
 # Try to import queue libraries (optional)
 try:
     import pika  # RabbitMQ
@@ -43,7 +51,7 @@ DB_CONFIG = {
 }
 
 QUEUE_CONFIG = {
-    'type': os.getenv('QUEUE_TYPE', 'rabbitmq'),  # rabbitmq, redis
+    'type': os.getenv('QUEUE_TYPE', 'rabbitmq'),  # rabbitmq, redis, redis-streams
     'host': os.getenv('QUEUE_HOST', 'localhost'),
     'port': int(os.getenv('QUEUE_PORT', '5672')),
     'user': os.getenv('QUEUE_USER', 'guest'),
@@ -56,6 +64,60 @@ QUEUE_NAMES = {
     'alerts': os.getenv('ALERT_QUEUE', 'alert_queue'),
 }
 
+# Redis Streams: one stream per queue name, read through a consumer group
+STREAM_CONFIG = {
+    'group': os.getenv('REDIS_GROUP', 'optilab'),
+    'consumer': os.getenv('REDIS_CONSUMER', ''),  # Empty = hostname-pid
+    'field': os.getenv('REDIS_FIELD', 'data'),  # Entry field holding the JSON message
+    'block_ms': int(os.getenv('REDIS_BLOCK_MS', '1000')),
+    'claim_idle_ms': int(os.getenv('REDIS_CLAIM_IDLE_MS', '60000')),  # Pending this long = consumer died
+    'max_deliveries': int(os.getenv('REDIS_MAX_DELIVERIES', '5')),  # Then moved to <stream>:dead
+}
+
+# Micro-batching: messages are written (and acked) together, BATCH_SIZE=1 means one at a time
+BATCH_CONFIG = {
+    'size': int(os.getenv('BATCH_SIZE', '500')),  # Messages per transaction
+    'wait_ms': int(os.getenv('BATCH_WAIT_MS', '200')),  # Longest a message waits for its batch
+    'prefetch': int(os.getenv('PREFETCH_COUNT', '0')),  # Unacked deliveries (0 = twice the batch size)
+    'copy_threshold': int(os.getenv('COPY_THRESHOLD', str(COPY_THRESHOLD))),  # Metrics batches this big use COPY
+    'conflict': os.getenv('METRICS_CONFLICT', 'ignore'),  # error, ignore or update (see bulk_loader)
+}
+
+# Worker pool: CONSUMER_WORKERS > 1 runs that many consumer processes under a supervisor
+POOL_CONFIG = {
+    'workers': int(os.getenv('CONSUMER_WORKERS', '1')),
+    'stats_interval': int(os.getenv('STATS_INTERVAL', '30')),  # Seconds between throughput/lag reports
+    'restart_backoff': int(os.getenv('RESTART_BACKOFF', '5')),  # Seconds before restarting a crashed worker
+    'stop_timeout': int(os.getenv('STOP_TIMEOUT', '60')),  # Seconds a worker gets to drain on shutdown
+}
+
+
+def batch_policy(kind: str) -> Dict[str, int]:
+    """Batching for one queue: METRICS_BATCH_SIZE etc. override the BATCH_* defaults"""
+    prefix = kind.upper()
+    size = max(1, int(os.getenv(f'{prefix}_BATCH_SIZE', str(BATCH_CONFIG['size']))))
+    prefetch = int(os.getenv(f'{prefix}_PREFETCH_COUNT', str(BATCH_CONFIG['prefetch'])))
+    return {
+        'size': size,
+        'wait_ms': int(os.getenv(f'{prefix}_BATCH_WAIT_MS', str(BATCH_CONFIG['wait_ms']))),
+        'prefetch': prefetch or 2 * size,
+    }
+
+DISCOVERY_UPSERT_SQL = """
+    INSERT INTO systems (hostname, ip_address, mac_address, dept_id, status, created_at)
+    VALUES %s
+    ON CONFLICT (ip_address)
+    DO UPDATE SET
+        hostname = EXCLUDED.hostname,
+        mac_address = EXCLUDED.mac_address,
+        dept_id = EXCLUDED.dept_id,
+        status = 'discovered',
+        updated_at = NOW()
+"""
+DISCOVERY_ROW_TEMPLATE = "(%s, %s, %s, %s, 'discovered', NOW())"
+
+METRICS_ROW_TEMPLATE = "(%s, %s, " + ", ".join(["%s"] * len(METRIC_FIELDS)) + ")"
+
 # Logging setup
 logging.basicConfig(
     level=logging.INFO,
@@ -78,12 +140,73 @@ signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 
 
+class ConsumerStats:
+    """Running totals for this process; a pool worker reports them to the supervisor"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.requeued = 0
+        self.lag_sum = 0.0
+        self.lag_count = 0
+        self.lag_max = 0.0  # Since the last snapshot
+
+    def record(self, processed: int, requeued: int, lag: Optional[float] = None):
+        with self.lock:
+            self.processed += processed
+            self.requeued += requeued
+            if lag is not None:
+                self.lag_sum += lag
+                self.lag_count += 1
+                self.lag_max = max(self.lag_max, lag)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Cumulative counters plus the worst lag since the previous snapshot"""
+        with self.lock:
+            snapshot = {
+                'processed': self.processed, 'requeued': self.requeued,
+                'lag_sum': self.lag_sum, 'lag_count': self.lag_count, 'lag_max': self.lag_max,
+            }
+            self.lag_max = 0.0
+            return snapshot
+
+
+STATS = ConsumerStats()
+
+
+def produced_at(data: Any) -> Optional[datetime]:
+    """When a message was produced: the script's sample timestamp, else collected_at (set by
+    the producer, or from the transport's send time); None if it carries neither"""
+    if not isinstance(data, dict):
+        return None
+    metrics = data.get('metrics')
+    value = (metrics.get('timestamp') if isinstance(metrics, dict) else None) or data.get('collected_at')
+    if not value:
+        return None
+    try:
+        produced = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return produced if produced.tzinfo is not None else produced.astimezone()
+
+
+def batch_lag(items: List[Tuple[Any, Optional[Dict[str, Any]]]]) -> Optional[float]:
+    """Seconds since the oldest message in a batch was produced; None when no message says,
+    since the consumer's own arrival time would only measure time spent in the batch buffer"""
+    now = datetime.now().astimezone()
+    times = [produced for produced in (produced_at(data) for _, data in items) if produced is not None]
+    return (now - min(times)).total_seconds() if times else None
+
+
 class DatabaseHandler:
     """Handle database operations"""
     
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.conn = None
+        self.metrics_loader = metrics_loader(with_timestamp=True, conflict=BATCH_CONFIG['conflict'])
+        # Small batches and the row-by-row fallback resolve conflicts like the COPY path
+        self.metrics_insert_sql = self.metrics_loader.insert_sql()
         self.connect()
     
     def connect(self):
@@ -107,92 +230,117 @@ class DatabaseHandler:
     
     def insert_discovered_system(self, data: Dict[str, Any]) -> bool:
         """Insert or update discovered system"""
+        return self.insert_discovered_systems([data])[0]
+
+    def insert_metrics(self, data: Dict[str, Any]) -> bool:
+        """Insert metrics data"""
+        return self.insert_metrics_batch([data])[0]
+
+    def insert_discovered_systems(self, records: List[Dict[str, Any]]) -> List[bool]:
+        """Upsert many discovered systems in one transaction; returns success per record"""
+        # One statement can't update the same address twice, so the last message wins
+        latest = {}
+        for index, data in enumerate(records):
+            if 'ip_address' not in data:
+                logger.error(f"Discarding discovery message without ip_address: {data}")
+                continue
+            latest[data['ip_address']] = index
+        rows = [
+            (records[index].get('hostname', 'unknown'), ip, records[index].get('mac_address'),
+             records[index].get('dept_id'))
+            for ip, index in latest.items()
+        ]
+        written = self._write_rows("systems", DISCOVERY_UPSERT_SQL, DISCOVERY_ROW_TEMPLATE, rows)
+
+        results = [True] * len(records)
+        for index, ok in zip(latest.values(), written):
+            results[index] = ok
+        logger.info(f"Inserted/updated {sum(written)} of {len(rows)} systems")
+        return results
+
+    def insert_metrics_batch(self, records: List[Dict[str, Any]]) -> List[bool]:
+        """Insert many metrics messages in one transaction; returns success per record"""
+        received_at = datetime.now().astimezone()
+        rows, positions = [], []
+        for index, data in enumerate(records):
+            if 'system_id' not in data:
+                logger.error(f"Discarding metrics message without system_id: {data}")
+                continue
+            metrics = data.get('metrics', {})
+            # The script's own sample time: right under any backlog, and it keeps
+            # (system_id, timestamp) unique; arrival time only when the sample has none
+            timestamp = metrics.get('timestamp') or data.get('collected_at') or received_at
+            rows.append((data['system_id'], timestamp, *(metrics.get(field) for field in METRIC_FIELDS)))
+            positions.append(index)
+        written = self._write_rows(
+            "metrics", self.metrics_insert_sql, METRICS_ROW_TEMPLATE, rows,
+            loader=self.metrics_loader if len(rows) >= BATCH_CONFIG['copy_threshold'] else None,
+        )
+
+        results = [True] * len(records)
+        for index, ok in zip(positions, written):
+            results[index] = ok
+        logger.info(f"Inserted metrics for {sum(written)} of {len(rows)} samples")
+        return results
+
+    def write_batch(self, kind: str, records: List[Dict[str, Any]]) -> List[bool]:
+        """Route a batch from one queue ('discovery', 'metrics' or 'alerts')"""
+        if kind == 'discovery':
+            return self.insert_discovered_systems(records)
+        if kind == 'metrics':
+            return self.insert_metrics_batch(records)
+        # Handle alerts (could send notifications, etc.)
+        for data in records:
+            logger.info(f"Alert received: {data}")
+        return [True] * len(records)
+
+    def _write_rows(self, table: str, query: str, template: str, rows: List[Tuple],
+                    loader: Optional[BulkLoader] = None) -> List[bool]:
+        """One multi-row statement (or COPY through `loader`) and one commit; on failure,
+        retry each row under a savepoint so a single bad row can't hold back the rest"""
+        if not rows:
+            return []
+        if self.conn is None or self.conn.closed:
+            self.reconnect()
+
         try:
-            with self.conn.cursor() as cur:
-                query = """
-                INSERT INTO systems (hostname, ip_address, mac_address, dept_id, status, created_at)
-                VALUES (%(hostname)s, %(ip_address)s, %(mac_address)s, %(dept_id)s, 'discovered', NOW())
-                ON CONFLICT (ip_address) 
-                DO UPDATE SET 
-                    hostname = EXCLUDED.hostname,
-                    mac_address = EXCLUDED.mac_address,
-                    dept_id = EXCLUDED.dept_id,
-                    status = 'discovered',
-                    updated_at = NOW()
-                RETURNING system_id;
-                """
-                
-                cur.execute(query, {
-                    'hostname': data.get('hostname', 'unknown'),
-                    'ip_address': data['ip_address'],
-                    'mac_address': data.get('mac_address'),
-                    'dept_id': data.get('dept_id'),
-                })
-                
-                result = cur.fetchone()
+            if loader is not None:
+                loader.load(self.conn, rows)
+            else:
+                with self.conn.cursor() as cur:
+                    execute_values(cur, query, rows, template=template, page_size=len(rows))
                 self.conn.commit()
-                
-                system_id = result[0] if result else None
-                logger.info(f"Inserted/updated system: {data['ip_address']} (ID: {system_id})")
-                return True
-                
+            return [True] * len(rows)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            logger.error(f"Database connection lost writing {table}: {e}")
+            self.reconnect()
+            return [False] * len(rows)
         except Exception as e:
-            logger.error(f"Failed to insert system: {e}")
             self.conn.rollback()
-            return False
-    
-    def insert_metrics(self, data: Dict[str, Any]) -> bool:
-        """Insert metrics data"""
+            if len(rows) > 1:
+                logger.warning(f"Batch insert of {len(rows)} {table} rows failed ({e}), retrying row by row")
+
+        results = []
         try:
             with self.conn.cursor() as cur:
-                metrics = data.get('metrics', {})
-                
-                query = """
-                INSERT INTO metrics (
-                    system_id, timestamp,
-                    cpu_percent, cpu_temperature,
-                    ram_percent,
-                    disk_percent, disk_read_mbps, disk_write_mbps,
-                    network_sent_mbps, network_recv_mbps,
-                    gpu_percent, gpu_memory_used_gb, gpu_temperature,
-                    uptime_seconds, logged_in_users
-                ) VALUES (
-                    %(system_id)s, NOW(),
-                    %(cpu_percent)s, %(cpu_temperature)s,
-                    %(ram_percent)s,
-                    %(disk_percent)s, %(disk_read_mbps)s, %(disk_write_mbps)s,
-                    %(network_sent_mbps)s, %(network_recv_mbps)s,
-                    %(gpu_percent)s, %(gpu_memory_used_gb)s, %(gpu_temperature)s,
-                    %(uptime_seconds)s, %(logged_in_users)s
-                );
-                """
-                
-                cur.execute(query, {
-                    'system_id': data['system_id'],
-                    'cpu_percent': metrics.get('cpu_percent'),
-                    'cpu_temperature': metrics.get('cpu_temperature'),
-                    'ram_percent': metrics.get('ram_percent'),
-                    'disk_percent': metrics.get('disk_percent'),
-                    'disk_read_mbps': metrics.get('disk_read_mbps'),
-                    'disk_write_mbps': metrics.get('disk_write_mbps'),
-                    'network_sent_mbps': metrics.get('network_sent_mbps'),
-                    'network_recv_mbps': metrics.get('network_recv_mbps'),
-                    'gpu_percent': metrics.get('gpu_percent'),
-                    'gpu_memory_used_gb': metrics.get('gpu_memory_used_gb'),
-                    'gpu_temperature': metrics.get('gpu_temperature'),
-                    'uptime_seconds': metrics.get('uptime_seconds'),
-                    'logged_in_users': metrics.get('logged_in_users'),
-                })
-                
-                self.conn.commit()
-                logger.info(f"Inserted metrics for system_id: {data['system_id']}")
-                return True
-                
+                for row in rows:
+                    cur.execute("SAVEPOINT batch_row")
+                    try:
+                        execute_values(cur, query, [row], template=template)
+                        cur.execute("RELEASE SAVEPOINT batch_row")
+                        results.append(True)
+                    except psycopg2.Error as e:
+                        cur.execute("ROLLBACK TO SAVEPOINT batch_row")
+                        logger.error(f"Failed to insert into {table}: {e}")
+                        results.append(False)
+            self.conn.commit()
+            return results
         except Exception as e:
-            logger.error(f"Failed to insert metrics: {e}")
-            self.conn.rollback()
-            return False
-    
+            logger.error(f"Failed to insert into {table}: {e}")
+            if not self.conn.closed:
+                self.conn.rollback()
+            return [False] * len(rows)
+
     def close(self):
         """Close database connection"""
         if self.conn:
@@ -200,6 +348,112 @@ class DatabaseHandler:
             logger.info("Database connection closed")
 
 
+def queue_kind(queue_name: str) -> Optional[str]:
+    """'discovery', 'metrics' or 'alerts' for a full queue name"""
+    for kind, name in QUEUE_NAMES.items():
+        if name == queue_name:
+            return kind
+    return None
+
+
+class MessageBatch:
+    """Deliveries waiting to be written together: full at `size`, due `wait_ms` after the first"""
+
+    def __init__(self, size: int, wait_ms: int):
+        self.size = max(1, size)
+        self.wait = wait_ms / 1000
+        self.items: List[Tuple[Any, Optional[Dict[str, Any]]]] = []
+        self.started = 0.0
+
+    def add(self, ref: Any, data: Optional[Dict[str, Any]]):
+        """Buffer one delivery; data is None for a message that could not be parsed"""
+        if not self.items:
+            self.started = time.monotonic()
+        self.items.append((ref, data))
+
+    def full(self) -> bool:
+        return len(self.items) >= self.size
+
+    def due(self) -> bool:
+        return self.full() or (bool(self.items) and time.monotonic() - self.started >= self.wait)
+
+    def time_left(self, idle: float) -> float:
+        """Seconds until the batch is due, or `idle` when it is empty"""
+        if not self.items:
+            return idle
+        return max(0.0, self.started + self.wait - time.monotonic())
+
+    def drain(self) -> List[Tuple[Any, Optional[Dict[str, Any]]]]:
+        items, self.items = self.items, []
+        return items
+
+
+def parse_message(kind: Optional[str], body: Any, sent_at: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Decode a message body; None for one that can't be parsed (it is discarded)
+
+    sent_at is the transport's own send time (epoch seconds), when it has one: the AMQP
+    timestamp property or a stream entry ID. It stands in for a missing collected_at.
+    """
+    try:
+        data = json.loads(body)
+    except (json.JSONDecodeError, TypeError) as e:
+        logger.error(f"Invalid JSON message: {e}")
+        return None
+    if sent_at and isinstance(data, dict):
+        data.setdefault('collected_at', datetime.fromtimestamp(sent_at).astimezone().isoformat())
+    return data
+
+
+def settle_deliveries(channel, items: List[Tuple[Any, Optional[Dict[str, Any]]]], written: List[bool]) -> int:
+    """Nack (requeue) the deliveries whose write failed, then ack the rest at once; returns failures
+
+    One ack with multiple=True covers every delivery up to the last tag that went through;
+    already-nacked tags are no longer outstanding. Bad JSON (data None) is acked, i.e. dropped.
+    """
+    valid = [tag for tag, data in items if data is not None]
+    failed = {tag for tag, ok in zip(valid, written) if not ok}
+    for tag in sorted(failed):
+        channel.basic_nack(delivery_tag=tag, requeue=True)
+    settled = [tag for tag, _ in items if tag not in failed]
+    if settled:
+        channel.basic_ack(delivery_tag=settled[-1], multiple=True)
+    return len(failed)
+
+
+def write_items(db_handler: 'DatabaseHandler', kind: Optional[str],
+                items: List[Tuple[Any, Optional[Dict[str, Any]]]]) -> List[bool]:
+    """Write the parsed messages of a batch; success per message that could be parsed"""
+    records = [data for _, data in items if data is not None]
+    try:
+        return db_handler.write_batch(kind, records)
+    except Exception as e:
+        logger.error(f"Error processing batch: {e}")
+        return [False] * len(records)
+
+
+def rabbitmq_connection(config: Dict[str, Any]):
+    """Blocking RabbitMQ connection with every queue declared"""
+    credentials = pika.PlainCredentials(
+        config['user'],
+        config['password']
+    )
+    
+    parameters = pika.ConnectionParameters(
+        host=config['host'],
+        port=config['port'],
+        credentials=credentials,
+        heartbeat=600,
+        blocked_connection_timeout=300,
+    )
+    
+    connection = pika.BlockingConnection(parameters)
+    channel = connection.channel()
+    for queue_name in QUEUE_NAMES.values():
+        channel.queue_declare(queue=queue_name, durable=True)
+    channel.close()
+    return connection
+
+
 class RabbitMQConsumer:
     """RabbitMQ consumer"""
     
@@ -211,31 +465,15 @@ class RabbitMQConsumer:
         self.db_handler = db_handler
         self.connection = None
         self.channel = None
+        self.queue_name = None
+        self.batch = MessageBatch(BATCH_CONFIG['size'], BATCH_CONFIG['wait_ms'])
         self.connect()
     
     def connect(self):
         """Connect to RabbitMQ"""
         try:
-            credentials = pika.PlainCredentials(
-                self.config['user'],
-                self.config['password']
-            )
-            
-            parameters = pika.ConnectionParameters(
-                host=self.config['host'],
-                port=self.config['port'],
-                credentials=credentials,
-                heartbeat=600,
-                blocked_connection_timeout=300,
-            )
-            
-            self.connection = pika.BlockingConnection(parameters)
+            self.connection = rabbitmq_connection(self.config)
             self.channel = self.connection.channel()
-            
-            # Declare queues
-            for queue_name in QUEUE_NAMES.values():
-                self.channel.queue_declare(queue=queue_name, durable=True)
-            
             logger.info("Connected to RabbitMQ")
             
         except Exception as e:
@@ -243,54 +481,51 @@ class RabbitMQConsumer:
             raise
     
     def process_message(self, ch, method, properties, body):
-        """Process incoming message"""
-        try:
-            data = json.loads(body)
-            queue_name = method.routing_key
-            
-            logger.info(f"Processing message from {queue_name}")
-            
-            success = False
-            
-            # Route to appropriate handler
-            if queue_name == QUEUE_NAMES['discovery']:
-                success = self.db_handler.insert_discovered_system(data)
-            elif queue_name == QUEUE_NAMES['metrics']:
-                success = self.db_handler.insert_metrics(data)
-            elif queue_name == QUEUE_NAMES['alerts']:
-                # Handle alerts (could send notifications, etc.)
-                logger.info(f"Alert received: {data}")
-                success = True
-            
-            if success:
-                ch.basic_ack(delivery_tag=method.delivery_tag)
-            else:
-                # Reject and requeue if processing failed
-                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-                
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON message: {e}")
-            ch.basic_ack(delivery_tag=method.delivery_tag)  # Discard bad message
-        except Exception as e:
-            logger.error(f"Error processing message: {e}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-    
+        """Buffer incoming message; the batch is written once full or due"""
+        self.batch.add(
+            method.delivery_tag, parse_message(queue_kind(self.queue_name), body, properties.timestamp)
+        )
+        if self.batch.full():
+            self.flush()
+
+    def flush(self):
+        """Write the buffered messages in one transaction, then settle their deliveries"""
+        items = self.batch.drain()
+        if not items:
+            return
+        written = write_items(self.db_handler, queue_kind(self.queue_name), items)
+        failed = settle_deliveries(self.channel, items, written)
+        STATS.record(len(items), failed, batch_lag(items))
+        logger.info(f"Processed {len(items)} messages from {self.queue_name} ({failed} requeued)")
+
     def start_consuming(self, queue_name: str):
         """Start consuming from queue"""
-        self.channel.basic_qos(prefetch_count=1)
+        self.queue_name = queue_name
+        policy = batch_policy(queue_kind(queue_name))
+        self.batch = MessageBatch(policy['size'], policy['wait_ms'])
+        self.channel.basic_qos(prefetch_count=policy['prefetch'])
         self.channel.basic_consume(
             queue=queue_name,
             on_message_callback=self.process_message
         )
         
-        logger.info(f"Started consuming from {queue_name}")
+        logger.info(
+            f"Started consuming from {queue_name} "
+            f"(batches of {policy['size']} or {policy['wait_ms']}ms, prefetch {policy['prefetch']})"
+        )
         
         try:
             while not shutdown_flag:
-                self.connection.process_data_events(time_limit=1)
+                self.connection.process_data_events(time_limit=self.batch.time_left(1))
+                if self.batch.due():
+                    self.flush()
         except KeyboardInterrupt:
             pass
         finally:
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Could not flush final batch: {e}")
             self.stop()
     
     def stop(self):
@@ -302,6 +537,112 @@ class RabbitMQConsumer:
         logger.info("RabbitMQ consumer stopped")
 
 
+class QueueWorker(threading.Thread):
+    """Batches and writes one queue's deliveries on its own database connection
+
+    The broker connection is only touched from the thread that owns it, so
+    deliveries arrive through an inbox and acks go back as thread-safe callbacks.
+    """
+
+    def __init__(self, kind: str, connection, db_config: Dict[str, Any]):
+        super().__init__(name=f"consumer-{kind}", daemon=True)
+        self.kind = kind
+        self.queue_name = QUEUE_NAMES[kind]
+        self.policy = batch_policy(kind)
+        self.connection = connection
+        self.channel = connection.channel()
+        self.db_handler = DatabaseHandler(db_config)
+        self.batch = MessageBatch(self.policy['size'], self.policy['wait_ms'])
+        self.inbox: queue.Queue = queue.Queue()
+        self.stopping = threading.Event()
+        self.consumer_tag = None
+
+    def subscribe(self):
+        """Per-queue prefetch on this queue's own channel (connection thread)"""
+        self.channel.basic_qos(prefetch_count=self.policy['prefetch'])
+        self.consumer_tag = self.channel.basic_consume(
+            queue=self.queue_name, on_message_callback=self.on_message
+        )
+        logger.info(
+            f"Subscribed to {self.queue_name} "
+            f"(batches of {self.policy['size']} or {self.policy['wait_ms']}ms, prefetch {self.policy['prefetch']})"
+        )
+
+    def unsubscribe(self):
+        """Stop new deliveries; unacked ones still buffered are written first (connection thread)"""
+        if self.consumer_tag is not None:
+            self.channel.basic_cancel(self.consumer_tag)
+            self.consumer_tag = None
+        self.stopping.set()
+
+    def on_message(self, ch, method, properties, body):
+        self.inbox.put((method.delivery_tag, body, properties.timestamp))
+
+    def run(self):
+        while not (self.stopping.is_set() and self.inbox.empty()):
+            try:
+                tag, body, sent_at = self.inbox.get(timeout=self.batch.time_left(0.5))
+            except queue.Empty:
+                pass
+            else:
+                self.batch.add(tag, parse_message(self.kind, body, sent_at))
+            if self.batch.due():
+                self.flush()
+        self.flush()
+        self.db_handler.close()
+
+    def flush(self):
+        items = self.batch.drain()
+        if not items:
+            return
+        written = write_items(self.db_handler, self.kind, items)
+        self.connection.add_callback_threadsafe(partial(self.settle, items, written))
+
+    def settle(self, items, written):
+        failed = settle_deliveries(self.channel, items, written)
+        STATS.record(len(items), failed, batch_lag(items))
+        logger.info(f"Processed {len(items)} messages from {self.queue_name} ({failed} requeued)")
+
+
+class MultiQueueConsumer:
+    """Every queue on one RabbitMQ connection: a channel, batching policy and worker per queue"""
+
+    def __init__(self, config: Dict[str, Any], db_config: Dict[str, Any]):
+        if not RABBITMQ_AVAILABLE:
+            raise RuntimeError("pika library not installed. Install with: pip install pika")
+
+        self.connection = rabbitmq_connection(config)
+        logger.info("Connected to RabbitMQ")
+        self.db_config = db_config
+        self.workers: List[QueueWorker] = []
+
+    def start_consuming(self, kinds: List[str]):
+        """Consume every queue in `kinds` until shutdown, then drain and ack what was buffered"""
+        self.workers = [QueueWorker(kind, self.connection, self.db_config) for kind in kinds]
+        for worker in self.workers:
+            worker.subscribe()
+            worker.start()
+
+        try:
+            while not shutdown_flag:
+                self.connection.process_data_events(time_limit=1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Cancel the subscriptions, let the workers finish, deliver their last acks, close"""
+        for worker in self.workers:
+            worker.unsubscribe()
+        # Acks come back as callbacks, which only run while events are processed
+        while any(worker.is_alive() for worker in self.workers):
+            self.connection.process_data_events(time_limit=0.2)
+        self.connection.process_data_events(time_limit=0)
+        self.connection.close()
+        logger.info("RabbitMQ multi-queue consumer stopped")
+
+
 class RedisConsumer:
     """Redis consumer (using lists as queues)"""
     
@@ -328,39 +669,53 @@ class RedisConsumer:
             logger.error(f"Redis connection failed: {e}")
             raise
     
-    def start_consuming(self, queue_name: str):
-        """Start consuming from Redis list"""
-        logger.info(f"Started consuming from {queue_name}")
+    def start_consuming(self, queue_name: str, *more_queues: str):
+        """Start consuming from Redis list(s)"""
+        queue_names = [queue_name, *more_queues]
+        logger.info(f"Started consuming from {', '.join(queue_names)}")
         
         try:
             while not shutdown_flag:
-                # Blocking pop with timeout
-                result = self.client.blpop(queue_name, timeout=1)
+                # Blocking pop with timeout, from whichever list has a message
+                result = self.client.blpop(queue_names, timeout=1)
                 
                 if result:
-                    _, message = result
+                    queue_name, message = result
+                    ok = True
                     try:
                         data = json.loads(message)
                         
                         # Route to appropriate handler
                         if queue_name == QUEUE_NAMES['discovery']:
-                            self.db_handler.insert_discovered_system(data)
+                            ok = self.db_handler.insert_discovered_system(data)
                         elif queue_name == QUEUE_NAMES['metrics']:
-                            self.db_handler.insert_metrics(data)
+                            ok = self.db_handler.insert_metrics(data)
                         elif queue_name == QUEUE_NAMES['alerts']:
                             logger.info(f"Alert received: {data}")
+                        if not ok:
+                            self.dead_letter(queue_name, message)
+                        # BLPOP already removed it, so nothing is ever requeued
+                        STATS.record(1, 0, batch_lag([(None, data)]))
                         
                     except json.JSONDecodeError as e:
                         logger.error(f"Invalid JSON message: {e}")
                     except Exception as e:
                         logger.error(f"Error processing message: {e}")
-                        # Could push to dead letter queue here
+                        self.dead_letter(queue_name, message)
                 
         except KeyboardInterrupt:
             pass
         finally:
             self.stop()
     
+    def dead_letter(self, queue_name: str, message: str):
+        """Keep a message whose write failed on <queue>:dead instead of losing it"""
+        try:
+            self.client.rpush(f"{queue_name}:dead", message)
+            logger.error(f"Moved a failed message to {queue_name}:dead")
+        except Exception as e:
+            logger.error(f"Lost a failed message from {queue_name}: {e}")
+    
     def stop(self):
         """Close Redis connection"""
         if self.client:
@@ -368,42 +723,384 @@ class RedisConsumer:
         logger.info("Redis consumer stopped")
 
 
-def main():
-    """Main entry point"""
-    logger.info("=== OptiLab Queue Consumer ===")
-    logger.info(f"Queue Type: {QUEUE_CONFIG['type']}")
-    logger.info(f"Database: {DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}")
-    
-    # Get queue to consume from
-    queue_name = sys.argv[1] if len(sys.argv) > 1 else 'metrics'
-    if queue_name not in QUEUE_NAMES:
-        logger.error(f"Invalid queue name. Choose from: {list(QUEUE_NAMES.keys())}")
-        sys.exit(1)
+class RedisStreamConsumer:
+    """Redis Streams consumer group: batched reads, ack after commit, recovery of stuck entries
+
+    Entries stay in the group's pending list until their batch is committed, so a crash
+    loses nothing: this consumer re-reads its own pending entries on start, and entries
+    left by a consumer that died are taken over with XAUTOCLAIM once they sit idle.
+    """
+
+    def __init__(self, config: Dict[str, Any], db_handler: DatabaseHandler):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("redis library not installed. Install with: pip install redis")
+
+        self.config = config
+        self.db_handler = db_handler
+        self.group = STREAM_CONFIG['group']
+        self.consumer = STREAM_CONFIG['consumer'] or f"{socket.gethostname()}-{os.getpid()}"
+        self.field = STREAM_CONFIG['field']
+        self.client = None
+        self.connect()
+
+    def connect(self):
+        """Connect to Redis"""
+        try:
+            self.client = redis.Redis(
+                host=self.config['host'],
+                port=self.config['port'],
+                decode_responses=True
+            )
+            self.client.ping()
+            logger.info(f"Connected to Redis as {self.group}/{self.consumer}")
+        except Exception as e:
+            logger.error(f"Redis connection failed: {e}")
+            raise
+
+    def ensure_group(self, stream: str):
+        """Create the consumer group (and stream) unless it exists"""
+        try:
+            self.client.xgroup_create(stream, self.group, id='0', mkstream=True)
+            logger.info(f"Created consumer group {self.group} on {stream}")
+        except redis.exceptions.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def start_consuming(self, queue_name: str, *more_queues: str):
+        """Start consuming from Redis stream(s)"""
+        streams = [queue_name, *more_queues]
+        for stream in streams:
+            self.ensure_group(stream)
+        policies = {stream: batch_policy(queue_kind(stream)) for stream in streams}
+        count = max(policy['size'] for policy in policies.values())
+        logger.info(f"Started consuming from {', '.join(streams)} (batches of up to {count})")
+
+        # An explicit id re-reads entries delivered to this consumer but never acked (e.g.
+        # before a crash), walking forward from it; '>' then reads new entries
+        offsets = {stream: '0' for stream in streams}
+        next_claim = 0.0
+        try:
+            while not shutdown_flag:
+                if time.monotonic() >= next_claim:
+                    for stream in streams:
+                        self.reclaim(stream, policies[stream]['size'])
+                    next_claim = time.monotonic() + STREAM_CONFIG['claim_idle_ms'] / 1000 / 2
+
+                # Only block once every backlog has been read
+                history = any(offset != '>' for offset in offsets.values())
+                block = None if history else STREAM_CONFIG['block_ms']
+                response = self.client.xreadgroup(self.group, self.consumer, offsets, count=count, block=block)
+                for stream, entries in response or []:
+                    if offsets[stream] != '>':
+                        # Own backlog: move past it, or switch to new entries once it is read
+                        offsets[stream] = entries[-1][0] if entries else '>'
+                    if entries:
+                        self.process(stream, entries)
+                if history and not response:
+                    offsets = {stream: '>' for stream in streams}
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def reclaim(self, stream: str, count: int):
+        """Take over entries another consumer left pending for longer than claim_idle_ms"""
+        start = '0-0'
+        while True:
+            result = self.client.xautoclaim(
+                stream, self.group, self.consumer, STREAM_CONFIG['claim_idle_ms'],
+                start_id=start, count=count,
+            )
+            start, entries = result[0], result[1]
+            if entries:
+                logger.warning(f"Reclaimed {len(entries)} stuck entries from {stream}")
+                self.process(stream, entries)
+            if start == '0-0':
+                return
+
+    def process(self, stream: str, entries: List[Tuple[str, Dict[str, str]]]):
+        """Write one batch, then XACK what was committed (and what could not be parsed)"""
+        kind = queue_kind(stream)
+        # Entries deleted from the stream while pending come back without fields
+        # An entry ID starts with the millisecond time it was added
+        items = [
+            (entry_id, parse_message(kind, (fields or {}).get(self.field), int(entry_id.split('-')[0]) / 1000))
+            for entry_id, fields in entries
+        ]
+        written = write_items(self.db_handler, kind, items)
+
+        valid = [entry_id for entry_id, data in items if data is not None]
+        failed = [entry_id for entry_id, ok in zip(valid, written) if not ok]
+        failed_ids = set(failed)
+        done = [entry_id for entry_id, _ in items if entry_id not in failed_ids]
+        if done:
+            self.client.xack(stream, self.group, *done)
+        if failed:
+            self.dead_letter(stream, failed, dict(entries))
+        STATS.record(len(items), len(failed), batch_lag(items))
+        logger.info(f"Processed {len(items)} entries from {stream} ({len(failed)} failed)")
+
+    def dead_letter(self, stream: str, entry_ids: List[str], entries: Dict[str, Dict[str, str]]):
+        """Failed entries stay pending for a retry; after max_deliveries they move to <stream>:dead"""
+        for entry_id in entry_ids:
+            pending = self.client.xpending_range(stream, self.group, min=entry_id, max=entry_id, count=1)
+            if pending and pending[0]['times_delivered'] >= STREAM_CONFIG['max_deliveries']:
+                self.client.xadd(f"{stream}:dead", entries[entry_id])
+                self.client.xack(stream, self.group, entry_id)
+                logger.error(f"Moved {stream} entry {entry_id} to {stream}:dead after "
+                             f"{pending[0]['times_delivered']} attempts")
+
+    def stop(self):
+        """Close Redis connection"""
+        if self.client:
+            self.client.close()
+        logger.info("Redis stream consumer stopped")
+
+
+def consume(kinds: List[str]) -> int:
+    """Run one consumer for the given queues until shutdown; returns an exit status"""
+    queue_full_names = [QUEUE_NAMES[kind] for kind in kinds]
     
-    queue_full_name = QUEUE_NAMES[queue_name]
-    logger.info(f"Consuming from: {queue_full_name}")
+    if QUEUE_CONFIG['type'] == 'rabbitmq' and len(kinds) > 1:
+        # Each queue's worker opens its own database connection
+        try:
+            MultiQueueConsumer(QUEUE_CONFIG, DB_CONFIG).start_consuming(kinds)
+            return 0
+        except Exception as e:
+            logger.error(f"Consumer error: {e}")
+            return 1
     
     # Initialize database handler
-    db_handler = DatabaseHandler(DB_CONFIG)
+    try:
+        db_handler = DatabaseHandler(DB_CONFIG)
+    except Exception:
+        return 1
     
     try:
         # Initialize consumer based on type
         if QUEUE_CONFIG['type'] == 'rabbitmq':
             consumer = RabbitMQConsumer(QUEUE_CONFIG, db_handler)
-            consumer.start_consuming(queue_full_name)
+            consumer.start_consuming(queue_full_names[0])
         elif QUEUE_CONFIG['type'] == 'redis':
             consumer = RedisConsumer(QUEUE_CONFIG, db_handler)
-            consumer.start_consuming(queue_full_name)
+            consumer.start_consuming(*queue_full_names)
+        elif QUEUE_CONFIG['type'] == 'redis-streams':
+            consumer = RedisStreamConsumer(QUEUE_CONFIG, db_handler)
+            consumer.start_consuming(*queue_full_names)
         else:
             logger.error(f"Unknown queue type: {QUEUE_CONFIG['type']}")
-            sys.exit(1)
+            return 1
+        return 0
             
     except Exception as e:
         logger.error(f"Consumer error: {e}")
-        sys.exit(1)
+        return 1
     finally:
         db_handler.close()
-        logger.info("Consumer shutdown complete")
+
+
+def report_stats(stats_queue, index: int, interval: int):
+    """Pool worker thread: send this process's counters to the supervisor"""
+    while True:
+        time.sleep(interval)
+        stats_queue.put((index, os.getpid(), STATS.snapshot()))
+
+
+def worker_main(index: int, kinds: List[str], stats_queue, interval: int):
+    """Entry point of one pool process: its own broker connection(s) and DB connection(s)"""
+    global logger
+    logger = logging.getLogger(f'queue_consumer.{index}')
+    # Stable per slot, so a restarted worker picks up the stream entries its predecessor left pending
+    STREAM_CONFIG['consumer'] = f"{STREAM_CONFIG['consumer'] or socket.gethostname()}-w{index}"
+    threading.Thread(target=report_stats, args=(stats_queue, index, interval), daemon=True).start()
+    status = consume(kinds)
+    stats_queue.put((index, os.getpid(), STATS.snapshot()))  # Final counts
+    sys.exit(status)
+
+
+def queue_backlog(queue_names: List[str]) -> Dict[str, int]:
+    """Messages waiting in each queue (RabbitMQ ready count or Redis list length)"""
+    if QUEUE_CONFIG['type'] == 'rabbitmq' and RABBITMQ_AVAILABLE:
+        connection = rabbitmq_connection(QUEUE_CONFIG)
+        try:
+            channel = connection.channel()
+            return {
+                name: channel.queue_declare(queue=name, passive=True).method.message_count
+                for name in queue_names
+            }
+        finally:
+            connection.close()
+    if QUEUE_CONFIG['type'] == 'redis' and REDIS_AVAILABLE:
+        client = redis.Redis(host=QUEUE_CONFIG['host'], port=QUEUE_CONFIG['port'])
+        try:
+            return {name: client.llen(name) for name in queue_names}
+        finally:
+            client.close()
+    if QUEUE_CONFIG['type'] == 'redis-streams' and REDIS_AVAILABLE:
+        client = redis.Redis(host=QUEUE_CONFIG['host'], port=QUEUE_CONFIG['port'], decode_responses=True)
+        try:
+            backlog = {}
+            for name in queue_names:
+                for group in client.xinfo_groups(name):
+                    if group['name'] == STREAM_CONFIG['group']:
+                        # Unread ('lag', Redis 7+) plus delivered but not yet acked
+                        backlog[name] = (group.get('lag') or 0) + group['pending']
+            return backlog
+        finally:
+            client.close()
+    return {}
+
+
+class ConsumerSupervisor:
+    """Keeps N consumer processes running and aggregates their throughput and lag
+
+    Competing consumers share each queue, so the broker spreads deliveries across
+    workers. On SIGTERM every worker cancels its subscription, writes and acks what it
+    buffered and exits; anything still unacked goes back to the queue for the others.
+    """
+
+    def __init__(self, kinds: List[str], workers: int, stats_interval: int,
+                 restart_backoff: int, stop_timeout: int):
+        self.kinds = kinds
+        self.workers = workers
+        self.stats_interval = stats_interval
+        self.restart_backoff = restart_backoff
+        self.stop_timeout = stop_timeout
+        self.stats_queue = multiprocessing.Queue()
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self.restart_at: Dict[int, float] = {}
+        self.latest: Dict[int, Dict[str, float]] = {}
+        self.retired: Dict[str, float] = {}  # Counters of worker processes that were replaced
+        self.reported: Dict[str, float] = {}
+
+    def spawn(self, index: int):
+        # A restarted worker counts from zero again
+        previous = self.latest.pop(index, None)
+        if previous is not None:
+            for key in ('processed', 'requeued', 'lag_sum', 'lag_count'):
+                self.retired[key] = self.retired.get(key, 0) + previous[key]
+        process = multiprocessing.Process(
+            target=worker_main, args=(index, self.kinds, self.stats_queue, self.stats_interval),
+            name=f'consumer-worker-{index}',
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info(f"Started worker {index} (pid {process.pid})")
+
+    def supervise(self):
+        """Restart workers that died, after a backoff so a crash loop can't spin"""
+        now = time.monotonic()
+        for index, process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+            if index not in self.restart_at:
+                logger.warning(f"Worker {index} exited with status {process.exitcode}, restarting")
+                self.restart_at[index] = now + (self.restart_backoff if process.exitcode else 0)
+            elif now >= self.restart_at[index]:
+                del self.restart_at[index]
+                self.spawn(index)
+
+    def collect(self):
+        while True:
+            try:
+                index, pid, snapshot = self.stats_queue.get_nowait()
+            except queue.Empty:
+                return
+            if pid != self.processes[index].pid:
+                # Last words of a worker that has already been replaced
+                for key in ('processed', 'requeued', 'lag_sum', 'lag_count'):
+                    self.retired[key] = self.retired.get(key, 0) + snapshot[key]
+                continue
+            previous = self.latest.get(index)
+            # lag_max is per report; keep the worst one not yet logged
+            if previous is not None:
+                snapshot['lag_max'] = max(snapshot['lag_max'], previous['lag_max'])
+            self.latest[index] = snapshot
+
+    def log_stats(self, elapsed: float):
+        """Throughput, requeues, lag and backlog since the previous report, across all workers"""
+        self.collect()
+        totals = {key: self.retired.get(key, 0) + sum(snapshot[key] for snapshot in self.latest.values())
+                  for key in ('processed', 'requeued', 'lag_sum', 'lag_count')}
+        lag_max = max((snapshot['lag_max'] for snapshot in self.latest.values()), default=0.0)
+        for snapshot in self.latest.values():
+            snapshot['lag_max'] = 0.0
+
+        delta = {key: totals[key] - self.reported.get(key, 0) for key in totals}
+        self.reported = totals
+        lag = f", lag avg {delta['lag_sum'] / delta['lag_count']:.1f}s max {lag_max:.1f}s" if delta['lag_count'] else ""
+        try:
+            backlog = queue_backlog([QUEUE_NAMES[kind] for kind in self.kinds])
+        except Exception as e:
+            logger.warning(f"Could not read queue backlog: {e}")
+            backlog = {}
+        waiting = ", backlog " + ", ".join(f"{name}={count}" for name, count in backlog.items()) if backlog else ""
+        alive = sum(process.is_alive() for process in self.processes.values())
+        logger.info(
+            f"Pool: {alive}/{self.workers} workers, {delta['processed'] / elapsed:.0f} msgs/s "
+            f"({int(delta['processed'])} processed, {int(delta['requeued'])} requeued){lag}{waiting}"
+        )
+
+    def run(self):
+        for index in range(self.workers):
+            self.spawn(index)
+
+        last_report = time.monotonic()
+        while True:
+            time.sleep(1)
+            if shutdown_flag:
+                break
+            self.collect()
+            self.supervise()
+            if time.monotonic() - last_report >= self.stats_interval:
+                self.log_stats(time.monotonic() - last_report)
+                last_report = time.monotonic()
+        self.stop()
+        self.log_stats(max(time.monotonic() - last_report, 1e-3))
+
+    def stop(self):
+        """SIGTERM every worker so it drains, then wait; stragglers are killed"""
+        logger.info(f"Stopping {len(self.processes)} workers...")
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.stop_timeout
+        for index, process in self.processes.items():
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker {index} did not stop within {self.stop_timeout}s, killing it")
+                process.kill()
+                process.join()
+        self.collect()
+
+
+def main():
+    """Main entry point"""
+    logger.info("=== OptiLab Queue Consumer ===")
+    logger.info(f"Queue Type: {QUEUE_CONFIG['type']}")
+    logger.info(f"Database: {DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}")
+    
+    # Get queue to consume from ('all' = every queue in this one process)
+    queue_name = sys.argv[1] if len(sys.argv) > 1 else 'metrics'
+    if queue_name != 'all' and queue_name not in QUEUE_NAMES:
+        logger.error(f"Invalid queue name. Choose from: {list(QUEUE_NAMES.keys()) + ['all']}")
+        sys.exit(1)
+    
+    kinds = list(QUEUE_NAMES) if queue_name == 'all' else [queue_name]
+    logger.info(f"Consuming from: {', '.join(QUEUE_NAMES[kind] for kind in kinds)}")
+    
+    if POOL_CONFIG['workers'] > 1:
+        supervisor = ConsumerSupervisor(
+            kinds, POOL_CONFIG['workers'], POOL_CONFIG['stats_interval'],
+            POOL_CONFIG['restart_backoff'], POOL_CONFIG['stop_timeout'],
+        )
+        supervisor.run()
+        logger.info("Consumer pool shutdown complete")
+        return
+    
+    status = consume(kinds)
+    logger.info("Consumer shutdown complete")
+    sys.exit(status)
 
 
 if __name__ == '__main__':
@@ -3,7 +3,7 @@
 ################################################################################
 # OptiLab Queue Setup Script
 # Purpose: Initialize RabbitMQ queues and exchanges for the OptiLab system
-# Usage: ./queue_setup.sh [rabbitmq|redis]
+# Usage: ./queue_setup.sh [rabbitmq|redis|redis-streams|docker]
 ################################################################################
 
 set -e
@@ -17,6 +17,7 @@ RABBITMQ_PASS="${RABBITMQ_PASS:-guest}"
 
 REDIS_HOST="${REDIS_HOST:-localhost}"
 REDIS_PORT="${REDIS_PORT:-6379}"
+REDIS_GROUP="${REDIS_GROUP:-optilab}"
 
 # Queue names
 DISCOVERY_QUEUE="discovery_queue"
@@ -162,6 +163,31 @@ setup_redis() {
     log_success "Redis setup complete!"
 }
 
+setup_redis_streams() {
+    log_info "Setting up Redis streams..."
+    
+    # Check if Redis is running
+    if ! redis-cli -h "$REDIS_HOST" -p "$REDIS_PORT" ping > /dev/null 2>&1; then
+        log_error "Redis not accessible at $REDIS_HOST:$REDIS_PORT"
+        log_info "Start Redis with: docker run -d --name redis -p 6379:6379 redis:latest"
+        exit 1
+    fi
+    
+    log_success "Redis is accessible"
+    
+    # One stream per queue, each with the consumers' group (BUSYGROUP = already there)
+    for stream in "$DISCOVERY_QUEUE" "$METRICS_QUEUE" "$ALERT_QUEUE"; do
+        if redis-cli -h "$REDIS_HOST" -p "$REDIS_PORT" XGROUP CREATE "$stream" "$REDIS_GROUP" 0 MKSTREAM 2>&1 | grep -q BUSYGROUP; then
+            log_info "  - $stream (group $REDIS_GROUP already exists)"
+        else
+            log_success "  - $stream (group $REDIS_GROUP created)"
+        fi
+    done
+    
+    log_info "Publish with: redis-cli XADD $METRICS_QUEUE '*' data '<json message>'"
+    log_success "Redis streams setup complete!"
+}
+
 ################################################################################
 # Docker Compose Setup
 ################################################################################
@@ -228,12 +254,15 @@ main() {
         redis)
             setup_redis
             ;;
+        redis-streams)
+            setup_redis_streams
+            ;;
         docker)
             generate_docker_compose
             ;;
         *)
             log_error "Unknown queue type: $QUEUE_TYPE"
-            echo "Usage: $0 [rabbitmq|redis|docker]"
+            echo "Usage: $0 [rabbitmq|redis|redis-streams|docker]"
             exit 1
             ;;
     esac
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+OptiLab Collection Scheduler
+Per-host deadlines spread across the collection interval, with backoff and lateness stats
+"""
+
+import heapq
+import itertools
+import math
+import time
+import zlib
+from threading import Lock
+
+MAX_BACKOFF = 300  # Longest a failing host is left alone (seconds)
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class HostSchedule:
+    """Scheduling state for one host"""
+
+    __slots__ = ("system", "due", "started", "failures", "in_flight", "last_lateness", "last_duration")
+
+    def __init__(self, system, due):
+        self.system = system
+        self.due = due
+        self.started = None
+        self.failures = 0
+        self.in_flight = False
+        self.last_lateness = None
+        self.last_duration = None
+
+
+class CollectionScheduler:
+    """Priority queue of per-host next-due times"""
+
+    def __init__(self, interval, max_backoff=MAX_BACKOFF, clock=time.monotonic):
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.heap = []  # (due, seq, ip); stale entries are skipped on pop
+        self.seq = itertools.count()
+        self.hosts = {}
+        self.lock = Lock()
+        self.lateness = []
+        self.completed = 0
+        self.failed = 0
+
+    def phase(self, ip):
+        """Stable offset within the interval so hosts don't all fire together"""
+        return zlib.crc32(ip.encode()) / 2 ** 32 * self.interval
+
+    def next_slot(self, anchor, after):
+        """First slot on the host's grid (anchor + k * interval) strictly after `after`"""
+        if anchor > after:
+            return anchor
+        return anchor + (math.floor((after - anchor) / self.interval) + 1) * self.interval
+
+    def _push(self, ip, state):
+        heapq.heappush(self.heap, (state.due, next(self.seq), ip))
+
+    def add(self, system):
+        """Schedule a host at its phase slot unless it is already known"""
+        ip = system['ip_address']
+        with self.lock:
+            state = self.hosts.get(ip)
+            if state is not None:
+                state.system = system
+                return False
+            now = self.clock()
+            epoch = now - now % self.interval
+            state = HostSchedule(system, self.next_slot(epoch + self.phase(ip), now))
+            self.hosts[ip] = state
+            self._push(ip, state)
+            return True
+
+    def sync(self, systems):
+        """Match the schedule to the current active set; returns (added, removed)"""
+        active = {system['ip_address']: system for system in systems}
+        with self.lock:
+            gone = [ip for ip in self.hosts if ip not in active]
+            for ip in gone:
+                del self.hosts[ip]
+        added = sum(1 for system in active.values() if self.add(system))
+        return added, len(gone)
+
+    def pop_due(self):
+        """Claim every host whose deadline has passed"""
+        claimed = []
+        with self.lock:
+            now = self.clock()
+            while self.heap and self.heap[0][0] <= now:
+                due, _, ip = heapq.heappop(self.heap)
+                state = self.hosts.get(ip)
+                if state is None or state.due != due or state.in_flight:
+                    continue
+                state.in_flight = True
+                state.started = None
+                claimed.append(state.system)
+        return claimed
+
+    def start(self, ip):
+        """Record that a claimed host's probe actually began; returns its lateness"""
+        with self.lock:
+            state = self.hosts.get(ip)
+            if state is None or not state.in_flight:
+                return None
+            state.started = self.clock()
+            state.last_lateness = state.started - state.due
+            self.lateness.append(state.last_lateness)
+            return state.last_lateness
+
+    def last_lateness(self, ip):
+        with self.lock:
+            state = self.hosts.get(ip)
+            return state.last_lateness if state is not None else None
+
+    def complete(self, ip, ok):
+        """Reschedule a finished host; slow hosts skip missed slots, failing ones back off"""
+        with self.lock:
+            state = self.hosts.get(ip)
+            if state is None or not state.in_flight:
+                return
+            now = self.clock()
+            state.in_flight = False
+            state.last_duration = now - (state.started or now)
+            if ok:
+                state.failures = 0
+                self.completed += 1
+                delay = self.interval
+            else:
+                state.failures += 1
+                self.failed += 1
+                delay = min(self.interval * 2 ** state.failures, self.max_backoff)
+            # Stay on the host's own grid so its phase (and the spread) is kept
+            state.due = self.next_slot(state.due, now + delay - self.interval)
+            self._push(ip, state)
+
+    def time_until_next(self):
+        with self.lock:
+            if not self.heap:
+                return self.interval
+            return max(0.0, self.heap[0][0] - self.clock())
+
+    def report(self):
+        """Counts and lateness (seconds) since the previous report"""
+        with self.lock:
+            samples, self.lateness = self.lateness, []
+            completed, failed = self.completed, self.failed
+            self.completed = self.failed = 0
+        stats = {"completed": completed, "failed": failed, "started": len(samples)}
+        if samples:
+            stats.update({
+                "lateness_mean": sum(samples) / len(samples),
+                "lateness_p95": percentile(samples, 95),
+                "lateness_max": max(samples),
+            })
+        return stats
+
+
+class PeriodicLane:
+    """Fixed-interval job (e.g. discovery) kept apart from the per-host queue"""
+
+    def __init__(self, interval, clock=time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        self.due = clock()
+
+    def is_due(self):
+        return self.clock() >= self.due
+
+    def advance(self):
+        """Move to the next slot; after an overrun, wait a full interval from now"""
+        self.due += self.interval
+        now = self.clock()
+        if self.due <= now:
+            self.due = now + self.interval
+
+    def time_until_next(self):
+        return max(0.0, self.due - self.clock())
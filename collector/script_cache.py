@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+OptiLab Script Deployment Cache
+Pushes the collector script to a target only when its content hash changes
+"""
+
+import hashlib
+import json
+import os
+import shlex
+from threading import Lock
+
+STATE_FILE = os.path.join(os.path.dirname(__file__), ".deploy_state.json")
+# Relative to the collector account's home (where ssh and scp start), so only it can write there;
+# a fixed path in the shared /tmp could be planted by any local user after a reboot
+REMOTE_DIR = ".cache/optilab"
+SCRIPT_NOT_FOUND_EXIT = 127  # bash exit status when the script file is missing
+
+
+def file_sha256(path):
+    """Hex SHA-256 of a local file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ScriptDeployCache:
+    """Tracks which script version each host holds, in memory and on disk"""
+
+    stdin = None  # The script runs from the deployed copy
+
+    def __init__(self, script_path, state_file=STATE_FILE, remote_dir=REMOTE_DIR):
+        self.script_path = script_path
+        self.state_file = state_file
+        self.remote_dir = remote_dir
+        self.remote_path = f"{remote_dir}/optilab_{os.path.basename(script_path)}"
+        self.remote_command = self.command("--json")
+        self.lock = Lock()
+        self.digest = None
+        self.mtime = None
+        self.hosts = {}
+        self.dirty = False
+        self.refresh()
+        self.load()
+
+    def command(self, *args):
+        """Remote command that runs the deployed copy with the given arguments"""
+        return " ".join(["bash", shlex.quote(self.remote_path), *map(shlex.quote, args)])
+
+    def refresh(self):
+        """Re-hash the local script if it changed on disk"""
+        mtime = os.path.getmtime(self.script_path)
+        if mtime != self.mtime:
+            self.digest = file_sha256(self.script_path)
+            self.mtime = mtime
+
+    def load(self):
+        """Restore per-host deployment state from the state file"""
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+            # State recorded for another location (e.g. the old /tmp copy) says nothing about this one
+            self.hosts = dict(state.get("hosts", {})) if state.get("remote_path") == self.remote_path else {}
+        except FileNotFoundError:
+            self.hosts = {}
+        except (OSError, ValueError) as e:
+            print(f"[!] Ignoring unreadable deploy state {self.state_file}: {e}")
+            self.hosts = {}
+
+    def save(self):
+        """Persist per-host deployment state if it changed"""
+        with self.lock:
+            if not self.dirty:
+                return
+            state = {"remote_path": self.remote_path, "hosts": dict(self.hosts)}
+            self.dirty = False
+        tmp_path = f"{self.state_file}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(state, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            print(f"[!] Could not write deploy state {self.state_file}: {e}")
+
+    def is_current(self, ip):
+        with self.lock:
+            return self.hosts.get(ip) == self.digest
+
+    def mark(self, ip, digest):
+        with self.lock:
+            if self.hosts.get(ip) != digest:
+                self.hosts[ip] = digest
+                self.dirty = True
+
+    def invalidate(self, ip):
+        """Forget a host's copy, e.g. after it was deleted on the target"""
+        with self.lock:
+            if self.hosts.pop(ip, None) is not None:
+                self.dirty = True
+
+    def prepare_command(self):
+        """Remote command that creates the private script directory (mode 0700)"""
+        directory = shlex.quote(self.remote_dir)
+        return f"mkdir -p {directory} && chmod 700 {directory}"
+
+    def digest_command(self):
+        """Remote command that prints the hash of the deployed script"""
+        return f"sha256sum {shlex.quote(self.remote_path)} 2>/dev/null"
+
+    @staticmethod
+    def parse_digest(returncode, stdout):
+        """Hash from sha256sum output, or None if the script is absent"""
+        if returncode != 0 or not stdout.strip():
+            return None
+        return stdout.split()[0]
+
+    def remote_digest(self, session, timeout):
+        """Hash of the script currently on the target, or None if absent"""
+        result = session.run(self.digest_command(), timeout=timeout)
+        return self.parse_digest(result.returncode, result.stdout)
+
+    def ensure_deployed(self, session, timeout):
+        """Make sure the target holds the current script; copy only on hash mismatch"""
+        self.refresh()
+        if self.is_current(session.ip):
+            return True
+
+        if self.remote_digest(session, timeout) == self.digest:
+            self.mark(session.ip, self.digest)
+            return True
+
+        result = session.run(self.prepare_command(), timeout=timeout)
+        if result.returncode != 0:
+            print(f"  [!] Could not create {self.remote_dir} on {session.ip}: {result.stderr}")
+            return False
+
+        result = session.copy(self.script_path, self.remote_path, timeout=timeout)
+        if result.returncode != 0:
+            print(f"  [!] SCP failed for {session.ip}: {result.stderr}")
+            self.invalidate(session.ip)
+            return False
+
+        self.mark(session.ip, self.digest)
+        return True
+
+
+class StdinScript:
+    """Pipes the script over the session's stdin; nothing is stored on the target"""
+
+    def __init__(self, script_path):
+        self.script_path = script_path
+        self.mtime = None
+        self.stdin = None
+        self.remote_command = self.command("--json")
+        self.refresh()
+
+    def command(self, *args):
+        """Remote command that runs the script read from stdin with the given arguments"""
+        return " ".join(["bash", "-s", "--", *map(shlex.quote, args)])
+
+    def refresh(self):
+        """Re-read the local script if it changed on disk"""
+        mtime = os.path.getmtime(self.script_path)
+        if mtime != self.mtime:
+            with open(self.script_path) as f:
+                self.stdin = f.read()
+            self.mtime = mtime
+
+    # Nothing to deploy, so every host is always current
+    def is_current(self, ip):
+        return True
+
+    def ensure_deployed(self, session, timeout):
+        self.refresh()
+        return True
+
+    def invalidate(self, ip):
+        pass
+
+    def save(self):
+        pass
+
+
+def script_delivery_from_config(cfg, script_path):
+    """Cached on-disk copy (default) or stdin streaming, per config.json collection_transport"""
+    if cfg.get("collection_transport", "cached") == "stdin":
+        return StdinScript(script_path)
+    return ScriptDeployCache(script_path, state_file=cfg.get("deploy_state_file", STATE_FILE))
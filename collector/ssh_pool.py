@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+OptiLab SSH Connection Pool
+Keeps one multiplexed OpenSSH session per target and reuses it across collection cycles
+"""
+
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+
+# Reuse the scanner's bastion (ProxyJump) handling
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scanner"))
+from network_monitor import build_ssh_transport_options, get_effective_ssh_config
+
+CONTROL_DIR = os.path.join(tempfile.gettempdir(), "optilab-ssh")
+IDLE_TIMEOUT = 300  # Close master connections unused for 5 minutes
+MAX_CHANNELS_PER_HOST = 8  # Stay below sshd's default MaxSessions (10)
+MAX_CHANNELS = 200  # Concurrent channels across all hosts
+SSH_ERROR_EXIT = 255  # Exit status ssh uses for its own (transport) failures
+
+
+class SSHSession:
+    """Multiplexed master connection to a single target host"""
+
+    def __init__(self, pool, ip):
+        self.pool = pool
+        self.ip = ip
+        self.target = f"{pool.ssh_cfg['user']}@{ip}"
+        self.control_path = os.path.join(pool.control_dir, f"{ip}.sock")
+        self.channels = BoundedSemaphore(pool.max_channels_per_host)
+        self.lock = Lock()
+        self.connected = False
+        self.last_used = time.time()
+        self.in_use = 0
+
+    def ssh_options(self):
+        """Options shared by ssh and scp so both ride the same master"""
+        return [
+            "-oBatchMode=yes",
+            f"-oConnectTimeout={self.pool.connect_timeout}",
+            "-oStrictHostKeyChecking=no",
+            f"-oControlPath={self.control_path}",
+            *self.pool.transport_options,
+            "-i", self.pool.ssh_cfg["private_key"],
+        ]
+
+    def master_args(self):
+        """Command line that starts a detached master for this host"""
+        return [
+            "ssh", *self.ssh_options(), "-M", "-N", "-f",
+            f"-oControlPersist={self.pool.idle_timeout}",
+            "-oServerAliveInterval=15",
+            "-oServerAliveCountMax=2",
+            self.target,
+        ]
+
+    def command_args(self, remote_cmd):
+        """Command line that runs remote_cmd as a channel on the master"""
+        return ["ssh", *self.ssh_options(), "-oControlMaster=no", self.target, remote_cmd]
+
+    def copy_args(self, local_path, remote_path):
+        """Command line that copies a file over the master"""
+        return ["scp", "-q", *self.ssh_options(), "-oControlMaster=no",
+                local_path, f"{self.target}:{remote_path}"]
+
+    def master_alive(self):
+        """True if a master we started still owns the control socket"""
+        # ControlPersist may have retired the master on its own
+        return self.connected and os.path.exists(self.control_path)
+
+    def connect(self):
+        """Start the background master unless one is already up"""
+        with self.lock:
+            if self.master_alive():
+                return True
+            self.remove_socket()
+            # The master is detached with -f and must not hold our pipes open
+            try:
+                result = subprocess.run(
+                    self.master_args(), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL, timeout=self.pool.connect_timeout + 5
+                )
+                self.connected = result.returncode == 0
+            except subprocess.TimeoutExpired:
+                self.connected = False
+            return self.connected
+
+    def check_args(self):
+        """Command line that asks the master whether it is still running"""
+        return ["ssh", "-O", "check", f"-oControlPath={self.control_path}", self.target]
+
+    def master_responding(self):
+        """True if the master answers a control request"""
+        try:
+            result = subprocess.run(self.check_args(), capture_output=True, timeout=5)
+        except subprocess.TimeoutExpired:
+            return False
+        return result.returncode == 0
+
+    def run(self, remote_cmd, timeout, input=None):
+        """Run a command over the shared session, reconnecting once on transport failure"""
+        args = self.command_args(remote_cmd)
+        result = subprocess.run(args, input=input, capture_output=True, text=True, timeout=timeout)
+        # 255 is also a legitimate remote exit status; only rerun when the master really broke
+        if result.returncode == SSH_ERROR_EXIT and not self.master_responding() and self.reconnect():
+            result = subprocess.run(args, input=input, capture_output=True, text=True, timeout=timeout)
+        return result
+
+    def copy(self, local_path, remote_path, timeout):
+        """Copy a file to the target over the shared session"""
+        args = self.copy_args(local_path, remote_path)
+        result = subprocess.run(args, capture_output=True, text=True, timeout=timeout)
+        # Reconnecting kills every channel on the master, so only do it when the master broke
+        # (not for e.g. permission denied or a full disk on the target)
+        if result.returncode != 0 and not self.master_responding() and self.reconnect():
+            result = subprocess.run(args, capture_output=True, text=True, timeout=timeout)
+        return result
+
+    def reconnect(self):
+        """Drop a broken master and open a new one"""
+        self.close()
+        return self.connect()
+
+    def exit_args(self):
+        """Command line that asks the master to shut down"""
+        return ["ssh", "-O", "exit", f"-oControlPath={self.control_path}", self.target]
+
+    def close(self):
+        """Stop the master process and forget the control socket"""
+        with self.lock:
+            if self.connected:
+                try:
+                    subprocess.run(self.exit_args(), capture_output=True, timeout=5)
+                except subprocess.TimeoutExpired:
+                    pass
+            self.connected = False
+            self.remove_socket()
+
+    def remove_socket(self):
+        try:
+            os.unlink(self.control_path)
+        except FileNotFoundError:
+            pass
+
+
+class SSHConnectionPool:
+    """Per-host pool of multiplexed SSH sessions with channel limits and idle eviction"""
+
+    def __init__(self, ssh_cfg, connect_timeout=10, max_channels_per_host=MAX_CHANNELS_PER_HOST,
+                 max_channels=MAX_CHANNELS, idle_timeout=IDLE_TIMEOUT, control_dir=CONTROL_DIR):
+        self.ssh_cfg = ssh_cfg
+        _, ssh_transport = build_ssh_transport_options(ssh_cfg)
+        self.transport_options = shlex.split(ssh_transport)
+        self.connect_timeout = connect_timeout
+        self.max_channels_per_host = max_channels_per_host
+        self.max_channels = max_channels
+        self.idle_timeout = idle_timeout
+        self.control_dir = control_dir
+        self.channels = BoundedSemaphore(max_channels)
+        self.sessions = {}
+        self.lock = Lock()
+        os.makedirs(self.control_dir, mode=0o700, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, cfg, connect_timeout=10):
+        """Build a pool from the collector config's optional ssh_pool section"""
+        pool_cfg = cfg.get("ssh_pool", {})
+        return cls(
+            get_effective_ssh_config(cfg),
+            connect_timeout=connect_timeout,
+            max_channels_per_host=pool_cfg.get("max_channels_per_host", MAX_CHANNELS_PER_HOST),
+            max_channels=pool_cfg.get("max_channels", MAX_CHANNELS),
+            idle_timeout=pool_cfg.get("idle_timeout_seconds", IDLE_TIMEOUT),
+        )
+
+    def _lookup(self, ip):
+        """Called with the lock held"""
+        session = self.sessions.get(ip)
+        if session is None:
+            session = SSHSession(self, ip)
+            self.sessions[ip] = session
+        return session
+
+    def get(self, ip):
+        """Return the session for a host, creating it on first use"""
+        with self.lock:
+            return self._lookup(ip)
+
+    def checkout(self, ip):
+        """get() and acquire() in one step, so evict_idle() can't close the session in between"""
+        with self.lock:
+            session = self._lookup(ip)
+            session.in_use += 1
+            return session
+
+    def acquire(self, session):
+        with self.lock:
+            session.in_use += 1
+
+    def release(self, session):
+        with self.lock:
+            session.in_use -= 1
+            session.last_used = time.time()
+
+    @contextmanager
+    def session(self, ip):
+        """Borrow a channel on the host's session for the duration of the block"""
+        session = self.checkout(ip)
+        try:
+            with self.channels, session.channels:
+                # A failed master is not fatal: ssh falls back to a direct connection
+                session.connect()
+                yield session
+        finally:
+            self.release(session)
+
+    def evict_idle(self, keep=None):
+        """Close sessions idle past the timeout, or not in `keep` when given"""
+        now = time.time()
+        with self.lock:
+            stale = [
+                ip for ip, session in self.sessions.items()
+                if session.in_use == 0 and (
+                    now - session.last_used >= self.idle_timeout
+                    or (keep is not None and ip not in keep)
+                )
+            ]
+            evicted = [self.sessions.pop(ip) for ip in stale]
+        for session in evicted:
+            session.close()
+        return len(evicted)
+
+    def close_all(self):
+        """Close every master connection (called on shutdown)"""
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for session in sessions:
+            session.close()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Collector modules import each other by bare name, as when run from collector/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,112 @@
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from bulk_loader import BulkLoader, CopyDirect, StagedInsert, StagedUpsert, conflict_strategy, copy_buffer, copy_value
+
+
+def test_copy_value_null_and_booleans():
+    assert copy_value(None) == "\\N"
+    assert copy_value(True) == "t"
+    assert copy_value(False) == "f"
+
+
+def test_copy_value_numbers_and_dates():
+    assert copy_value(42) == "42"
+    assert copy_value(12.5) == "12.5"
+    assert copy_value(Decimal("1.10")) == "1.10"
+    assert copy_value(date(2026, 1, 2)) == "2026-01-02"
+    assert copy_value(datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)) == "2026-01-02T03:04:05+00:00"
+
+
+def test_copy_value_escapes_delimiters_and_backslashes():
+    assert copy_value("a\tb") == "a\\tb"
+    assert copy_value("line1\nline2\r") == "line1\\nline2\\r"
+    assert copy_value("C:\\temp") == "C:\\\\temp"
+    # The backslash is escaped first, so an escape sequence in the data stays literal
+    assert copy_value("\\N") == "\\\\N"
+    assert copy_value("plain text") == "plain text"
+
+
+def test_copy_buffer_writes_one_tab_separated_line_per_row():
+    buffer = copy_buffer([(1, None, "x\ty"), (2, True, "")])
+    assert buffer.read() == "1\t\\N\tx\\ty\n2\tt\t\n"
+
+
+def test_copy_buffer_of_no_rows_is_empty():
+    assert copy_buffer([]).read() == ""
+
+
+def test_conflict_strategy_names():
+    assert isinstance(conflict_strategy("error"), CopyDirect)
+    assert type(conflict_strategy("ignore")) is StagedInsert
+    assert isinstance(conflict_strategy("update", ("id",)), StagedUpsert)
+    with pytest.raises(ValueError):
+        conflict_strategy("update")
+    with pytest.raises(ValueError):
+        conflict_strategy("replace")
+
+
+def test_insert_sql_follows_the_strategy():
+    columns = ("system_id", "timestamp", "cpu_percent")
+    ignore = BulkLoader("metrics", columns, conflict_strategy("ignore")).insert_sql()
+    update = BulkLoader("metrics", columns, conflict_strategy("update", ("system_id", "timestamp"))).insert_sql()
+    error = BulkLoader("metrics", columns, conflict_strategy("error")).insert_sql()
+
+    assert ignore.endswith("VALUES %s ON CONFLICT DO NOTHING")
+    assert update.endswith(
+        "ON CONFLICT (system_id, timestamp) DO UPDATE SET cpu_percent = EXCLUDED.cpu_percent"
+    )
+    assert "ON CONFLICT" not in error
+
+
+def test_upsert_keeps_one_staged_row_per_loaded_key():
+    strategy = StagedUpsert(("system_id", "timestamp"))
+    assert strategy.select("staging", "system_id, timestamp, cpu_percent") == (
+        "SELECT DISTINCT ON (system_id, timestamp) system_id, timestamp, cpu_percent FROM staging"
+    )
+    # Without the timestamp column only the loaded part of the key applies
+    assert strategy.select("staging", "system_id, cpu_percent") == (
+        "SELECT DISTINCT ON (system_id) system_id, cpu_percent FROM staging"
+    )
+
+
+class FakeCursor:
+    def __init__(self, log):
+        self.log = log
+        self.rowcount = 0
+
+    def execute(self, sql):
+        self.log.append(("execute", sql))
+
+    def copy_expert(self, sql, buffer):
+        data = buffer.read()
+        self.log.append(("copy", sql, data))
+        self.rowcount = data.count("\n")
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.log = []
+
+    def cursor(self):
+        return FakeCursor(self.log)
+
+    def commit(self):
+        self.log.append(("commit",))
+
+    def rollback(self):
+        self.log.append(("rollback",))
+
+
+def test_load_copies_in_chunks_and_commits_once():
+    conn = FakeConnection()
+    loader = BulkLoader("metrics", ("system_id", "cpu_percent"), CopyDirect(), chunk_rows=2)
+    assert loader.load(conn, iter([(1, 1.0), (2, 2.0), (3, None)])) == 3
+    copies = [entry for entry in conn.log if entry[0] == "copy"]
+    assert [entry[2] for entry in copies] == ["1\t1.0\n2\t2.0\n", "3\t\\N\n"]
+    assert conn.log[-1] == ("commit",)
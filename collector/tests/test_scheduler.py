@@ -0,0 +1,128 @@
+import pytest
+
+from scheduler import CollectionScheduler, PeriodicLane, percentile
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def system(ip):
+    return {"ip_address": ip, "system_id": 1, "hostname": ip}
+
+
+def test_next_slot_is_strictly_after():
+    scheduler = CollectionScheduler(10)
+    assert scheduler.next_slot(5.0, 0.0) == 5.0     # Anchor still ahead
+    assert scheduler.next_slot(5.0, 5.0) == 15.0    # Exactly on a slot: the next one
+    assert scheduler.next_slot(5.0, 14.9) == 15.0
+    assert scheduler.next_slot(5.0, 37.0) == 45.0   # Missed slots are skipped
+
+
+def test_phase_is_stable_and_within_the_interval():
+    scheduler = CollectionScheduler(10)
+    phases = [scheduler.phase(f"10.0.0.{i}") for i in range(1, 50)]
+    assert all(0 <= phase < 10 for phase in phases)
+    assert scheduler.phase("10.0.0.1") == CollectionScheduler(10).phase("10.0.0.1")
+    assert len(set(phases)) > 1  # Hosts are spread, not all at one offset
+
+
+def test_host_is_due_at_its_phase_slot():
+    clock = FakeClock(1000.0)
+    scheduler = CollectionScheduler(10, clock=clock)
+    assert scheduler.add(system("10.0.0.1"))
+    assert not scheduler.add(system("10.0.0.1"))  # Already known
+    due = scheduler.hosts["10.0.0.1"].due
+    assert 1000.0 < due <= 1010.0
+    assert scheduler.pop_due() == []
+    clock.now = due
+    assert [s["ip_address"] for s in scheduler.pop_due()] == ["10.0.0.1"]
+    assert scheduler.pop_due() == []  # In flight until completed
+
+
+def claim(scheduler, clock, ip):
+    clock.now = scheduler.hosts[ip].due
+    assert scheduler.pop_due()
+    scheduler.start(ip)
+
+
+def test_success_reschedules_one_interval_later_on_the_same_grid():
+    clock = FakeClock()
+    scheduler = CollectionScheduler(10, clock=clock)
+    scheduler.add(system("10.0.0.1"))
+    first = scheduler.hosts["10.0.0.1"].due
+    claim(scheduler, clock, "10.0.0.1")
+    clock.now += 2.0
+    scheduler.complete("10.0.0.1", True)
+    assert scheduler.hosts["10.0.0.1"].due == pytest.approx(first + 10)
+
+
+def test_slow_collection_skips_missed_slots():
+    clock = FakeClock()
+    scheduler = CollectionScheduler(10, clock=clock)
+    scheduler.add(system("10.0.0.1"))
+    first = scheduler.hosts["10.0.0.1"].due
+    claim(scheduler, clock, "10.0.0.1")
+    clock.now += 25.0  # Overran two slots
+    scheduler.complete("10.0.0.1", True)
+    assert scheduler.hosts["10.0.0.1"].due == pytest.approx(first + 30)
+
+
+def test_failures_back_off_exponentially_up_to_the_cap():
+    clock = FakeClock()
+    scheduler = CollectionScheduler(10, max_backoff=60, clock=clock)
+    scheduler.add(system("10.0.0.1"))
+    gaps = []
+    for _ in range(4):
+        before = scheduler.hosts["10.0.0.1"].due
+        claim(scheduler, clock, "10.0.0.1")
+        scheduler.complete("10.0.0.1", False)
+        gaps.append(round(scheduler.hosts["10.0.0.1"].due - before))
+    assert gaps == [20, 40, 60, 60]
+
+    claim(scheduler, clock, "10.0.0.1")
+    scheduler.complete("10.0.0.1", True)  # A success resets the backoff
+    assert scheduler.hosts["10.0.0.1"].failures == 0
+
+
+def test_sync_adds_and_removes_hosts():
+    scheduler = CollectionScheduler(10, clock=FakeClock())
+    scheduler.sync([system("10.0.0.1"), system("10.0.0.2")])
+    assert scheduler.sync([system("10.0.0.2"), system("10.0.0.3")]) == (1, 1)
+    assert sorted(scheduler.hosts) == ["10.0.0.2", "10.0.0.3"]
+
+
+def test_report_lateness_and_counts():
+    clock = FakeClock()
+    scheduler = CollectionScheduler(10, clock=clock)
+    scheduler.add(system("10.0.0.1"))
+    clock.now = scheduler.hosts["10.0.0.1"].due
+    scheduler.pop_due()
+    clock.now += 0.25
+    assert scheduler.start("10.0.0.1") == pytest.approx(0.25)
+    scheduler.complete("10.0.0.1", True)
+
+    stats = scheduler.report()
+    assert stats["completed"] == 1 and stats["failed"] == 0 and stats["started"] == 1
+    assert stats["lateness_max"] == pytest.approx(0.25)
+    assert scheduler.report() == {"completed": 0, "failed": 0, "started": 0}
+
+
+def test_percentile_nearest_rank():
+    assert percentile([5, 1, 3, 2, 4], 50) == 3
+    assert percentile(list(range(1, 101)), 95) == 95
+    assert percentile([7], 95) == 7
+
+
+def test_periodic_lane_does_not_burst_after_an_overrun():
+    clock = FakeClock(0.0)
+    lane = PeriodicLane(300, clock=clock)
+    assert lane.is_due()
+    clock.now = 1000.0  # Job ran far past its slot
+    lane.advance()
+    assert lane.due == 1300.0
+    assert not lane.is_due()
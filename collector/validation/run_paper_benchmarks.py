@@ -33,13 +33,18 @@ import time
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 from urllib.error import HTTPError, URLError
 from urllib.request import Request, urlopen
 
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+# Share the scanner's interval-based range handling
+sys.path.append(str(Path(__file__).resolve().parents[2] / "scanner"))
+from ip_ranges import IPRangeSet  # noqa: E402
+
 
 @dataclass
 class HttpSample:
@@ -178,28 +183,22 @@ def load_expected_ips(expected_file: Path, csv_column: str = "ip_address") -> Li
     return sorted(set(normalized))
 
 
-def expand_range(from_ip: str, to_ip: str, max_size: int = 200_000) -> List[str]:
-    start = int(ipaddress.ip_address(from_ip))
-    end = int(ipaddress.ip_address(to_ip))
-    if end < start:
-        return []
-
-    size = end - start + 1
-    if size > max_size:
-        return []
-
-    return [str(ipaddress.ip_address(n)) for n in range(start, end + 1)]
+def expand_range(from_ip: str, to_ip: str, max_size: int = 200_000) -> IPRangeSet:
+    ranges = IPRangeSet.from_range(from_ip, to_ip)
+    if len(ranges) > max_size:
+        return IPRangeSet()
+    return ranges
 
 
-def configured_ip_set_from_config(config: Dict[str, Any]) -> List[str]:
-    expanded: List[str] = []
+def configured_ip_set_from_config(config: Dict[str, Any]) -> IPRangeSet:
+    expanded = IPRangeSet()
     for lab in config.get("labs", []):
         ip_range = lab.get("ip_range", {})
         from_ip = ip_range.get("from")
         to_ip = ip_range.get("to")
         if from_ip and to_ip:
-            expanded.extend(expand_range(from_ip, to_ip))
-    return sorted(set(expanded))
+            expanded.update(expand_range(from_ip, to_ip))
+    return expanded
 
 
 def connect_db(dsn: str):
@@ -452,42 +451,44 @@ def collect_discovery_accuracy(
     discovered_ips = sorted({str(r["ip"]) for r in rows if r.get("ip")})
     discovered_set = set(discovered_ips)
 
-    expected_ips: List[str] = []
+    # Configured ranges stay as intervals; only membership, len() and ordered iteration are used
+    expected: Union[set[str], IPRangeSet]
+    expected_order: Iterable[str]
     method = "configured_ranges"
-    discovered_scope_set: set[str]
-    out_of_scope: List[str]
 
     if expected_hosts_file and expected_hosts_file.exists():
         expected_ips = load_expected_ips(expected_hosts_file, expected_hosts_column)
         method = "inventory_file"
-        expected_set = set(expected_ips)
+        expected = set(expected_ips)
+        expected_order = expected_ips
         discovered_scope_set = discovered_set
-        out_of_scope = sorted(discovered_set.difference(expected_set))
     else:
-        expected_ips = configured_ip_set_from_config(config)
-        expected_set = set(expected_ips)
-        discovered_scope_set = discovered_set.intersection(expected_set)
-        out_of_scope = sorted(discovered_set.difference(expected_set))
-
-    matched = sorted(expected_set.intersection(discovered_scope_set))
-    missing = sorted(expected_set.difference(discovered_set))
-    unexpected = sorted(discovered_scope_set.difference(expected_set))
-
-    if expected_set:
-        accuracy = len(matched) / len(expected_set) * 100.0
+        expected = configured_ip_set_from_config(config)
+        expected_order = expected
+        discovered_scope_set = {ip for ip in discovered_set if ip in expected}
+
+    out_of_scope = sorted(ip for ip in discovered_set if ip not in expected)
+    matched = sorted(ip for ip in discovered_scope_set if ip in expected)
+    unexpected = sorted(ip for ip in discovered_scope_set if ip not in expected)
+    expected_count = len(expected)
+    missing_count = expected_count - len(matched)
+    missing_examples = list(islice((ip for ip in expected_order if ip not in discovered_set), 20))
+
+    if expected_count:
+        accuracy = len(matched) / expected_count * 100.0
     else:
         accuracy = None
 
     return {
         "method": method,
-        "expected_count": len(expected_set),
+        "expected_count": expected_count,
         "discovered_count": len(discovered_scope_set),
         "discovered_total_count": len(discovered_set),
         "matched_count": len(matched),
         "accuracy_percent": accuracy,
-        "missing_count": len(missing),
+        "missing_count": missing_count,
         "unexpected_count": len(unexpected),
-        "missing_examples": missing[:20],
+        "missing_examples": missing_examples,
         "unexpected_examples": unexpected[:20],
         "discovered_out_of_scope_count": len(out_of_scope),
         "discovered_out_of_scope_examples": out_of_scope[:20],
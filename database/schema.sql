@@ -189,6 +189,7 @@ CREATE INDEX idx_systems_ip ON systems USING gist(ip_address inet_ops);
 CREATE INDEX idx_systems_mac ON systems(mac_address);
 CREATE INDEX idx_systems_hostname ON systems(hostname);
 CREATE INDEX idx_systems_status ON systems(status);
+CREATE INDEX idx_systems_status_updated ON systems(status, updated_at DESC);  -- heartbeat: recently offline first
 
 
 -- 5. USAGE METRICS (Time-Series Data)
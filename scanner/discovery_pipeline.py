@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+OptiLab Discovery Pipeline
+Runs sweep -> identify -> upsert as bounded streaming stages so they overlap
+"""
+
+import copy
+import queue
+import time
+from contextlib import nullcontext
+from threading import Lock, Thread
+
+from ping_sweep import LivenessSweeper
+
+IDENTIFY_WORKERS = 10
+UPSERT_WORKERS = 1
+QUEUE_DEPTH = 256
+UPSERT_BATCH_SIZE = 100  # Hosts written per statement
+UPSERT_BATCH_WAIT = 0.5  # Longest a host waits for its batch to fill (seconds)
+
+_STOP = object()
+
+
+class StageStats:
+    """Per-stage counters; throughput is measured from the stage's first to last item"""
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = Lock()
+        self.received = 0
+        self.passed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.first = None
+        self.last = None
+
+    def record(self, outcome, count=1):
+        with self.lock:
+            now = time.monotonic()
+            if self.first is None:
+                self.first = now
+            self.last = now
+            self.received += count
+            setattr(self, outcome, getattr(self, outcome) + count)
+
+    def throughput(self):
+        with self.lock:
+            if self.first is None:
+                return 0.0
+            return self.received / max(self.last - self.first, 1e-3)
+
+    def summary(self):
+        return (
+            f"{self.name}: {self.received} in, {self.passed} out, "
+            f"{self.dropped} dropped, {self.failed} failed, {self.throughput():.1f}/s"
+        )
+
+
+class PipelineStage:
+    """Worker threads fed by a bounded queue; a full queue blocks the stage upstream"""
+
+    def __init__(self, name, handler, workers, queue_depth, downstream=None, contexts=None):
+        self.stats = StageStats(name)
+        self.handler = handler
+        self.inbox = queue.Queue(maxsize=queue_depth)
+        self.downstream = downstream
+        # One context (e.g. a DB connection) per worker, passed to the handler
+        contexts = contexts if contexts is not None else [None] * workers
+        self.threads = [
+            Thread(target=self._work, args=(context,), name=f"{name}-{i}", daemon=True)
+            for i, context in enumerate(contexts)
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, item):
+        self.inbox.put(item)
+
+    def _work(self, context):
+        while True:
+            item = self.inbox.get()
+            if item is _STOP:
+                return
+            try:
+                result = self.handler(context, item)
+            except Exception as e:
+                self.stats.record("failed")
+                print(f"    [PIPE] ✗ {self.stats.name} failed for {item[0] if isinstance(item, tuple) else item}: {e}")
+                continue
+            if result is None:
+                self.stats.record("dropped")
+                continue
+            self.stats.record("passed")
+            if self.downstream is not None:
+                self.downstream.put(result)
+
+    def close(self):
+        """Drain the queue and stop the workers"""
+        for _ in self.threads:
+            self.inbox.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+
+
+class BatchStage(PipelineStage):
+    """Stage whose handler takes a list: up to batch_size items, or whatever arrived
+    within batch_wait of the first one. The handler returns the items that went through."""
+
+    def __init__(self, name, handler, workers, queue_depth, batch_size, batch_wait, contexts=None):
+        super().__init__(name, handler, workers, queue_depth, contexts=contexts)
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+
+    def _next_batch(self):
+        """Returns (batch, stop); blocks for the first item only"""
+        item = self.inbox.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.inbox.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _work(self, context):
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            if not batch:
+                continue
+            try:
+                passed = len(self.handler(context, batch) or ())
+            except Exception as e:
+                self.stats.record("failed", len(batch))
+                print(f"    [PIPE] ✗ {self.stats.name} failed for a batch of {len(batch)}: {e}")
+                continue
+            if passed:
+                self.stats.record("passed", passed)
+            if len(batch) > passed:
+                self.stats.record("dropped", len(batch) - passed)
+
+
+class DiscoveryPipeline:
+    """Liveness sweep feeding SSH identification feeding database upserts"""
+
+    def __init__(self, sweeper, identify_workers=IDENTIFY_WORKERS, identify_queue=QUEUE_DEPTH,
+                 upsert_workers=UPSERT_WORKERS, upsert_queue=QUEUE_DEPTH,
+                 upsert_batch_size=UPSERT_BATCH_SIZE, upsert_batch_wait=UPSERT_BATCH_WAIT, connect=None,
+                 identify_gate=None, release=None):
+        self.sweeper = sweeper
+        self.identify_workers = identify_workers
+        self.identify_queue = identify_queue
+        # Extra upsert workers need their own connections
+        self.upsert_workers = upsert_workers if connect is not None else 1
+        self.upsert_queue = upsert_queue
+        self.upsert_batch_size = upsert_batch_size
+        self.upsert_batch_wait = upsert_batch_wait
+        self.connect = connect
+        # Hands a connect() connection back (default: close it), e.g. to a pool
+        self.release = release or (lambda conn: conn.close())
+        # Optional semaphore shared with other pipelines to cap SSH sessions globally
+        self.identify_gate = identify_gate
+
+    @classmethod
+    def from_config(cls, cfg, connect=None, release=None):
+        pipeline_cfg = cfg.get("discovery_pipeline", {})
+        return cls(
+            LivenessSweeper.from_config(cfg),
+            identify_workers=pipeline_cfg.get("identify_workers", cfg.get("max_workers", IDENTIFY_WORKERS)),
+            identify_queue=pipeline_cfg.get("identify_queue", QUEUE_DEPTH),
+            upsert_workers=pipeline_cfg.get("upsert_workers", UPSERT_WORKERS),
+            upsert_queue=pipeline_cfg.get("upsert_queue", QUEUE_DEPTH),
+            upsert_batch_size=pipeline_cfg.get("upsert_batch_size", UPSERT_BATCH_SIZE),
+            upsert_batch_wait=pipeline_cfg.get("upsert_batch_wait_ms", UPSERT_BATCH_WAIT * 1000) / 1000,
+            connect=connect,
+            release=release,
+        )
+
+    def share(self, identify_workers, probe_concurrency, probe_rate, identify_gate=None):
+        """Copy of this pipeline sized to a slice of a larger budget"""
+        pipeline = copy.copy(self)
+        pipeline.sweeper = copy.copy(self.sweeper)
+        pipeline.identify_workers = identify_workers
+        pipeline.sweeper.concurrency = probe_concurrency
+        pipeline.sweeper.rate = probe_rate
+        pipeline.identify_gate = identify_gate
+        return pipeline
+
+    def run(self, targets, identify, upsert, conn):
+        """Discover `targets`; identify(ip) -> info or None,
+        upsert(conn, [(ip, info), ...]) -> {ip: system_id} for the hosts it wrote
+
+        Returns the StageStats of the sweep, identify and upsert stages.
+        """
+        extra_conns = [self.connect() for _ in range(self.upsert_workers - 1)]
+        upsert_stage = BatchStage(
+            "upsert", upsert, self.upsert_workers, self.upsert_queue,
+            self.upsert_batch_size, self.upsert_batch_wait, contexts=[conn, *extra_conns],
+        )
+        gate = self.identify_gate
+
+        def identify_one(_, ip):
+            with gate if gate is not None else nullcontext():
+                return self._identified(ip, identify(ip))
+
+        identify_stage = PipelineStage(
+            "identify", identify_one,
+            self.identify_workers, self.identify_queue, downstream=upsert_stage,
+        )
+        sweep_stats = StageStats("sweep")
+
+        upsert_stage.start()
+        identify_stage.start()
+        try:
+            for ip in self.sweeper.stream(targets):
+                sweep_stats.record("passed")
+                identify_stage.put(ip)
+        finally:
+            identify_stage.close()
+            upsert_stage.close()
+            for extra in extra_conns:
+                self.release(extra)
+
+        return [sweep_stats, identify_stage.stats, upsert_stage.stats]
+
+    @staticmethod
+    def _identified(ip, info):
+        return (ip, info) if info else None
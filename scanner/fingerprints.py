@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+OptiLab Discovery Fingerprints
+Remembers what each host looked like so unchanged hosts skip the full inventory
+"""
+
+import hashlib
+import json
+import os
+import time
+from threading import Lock
+
+STATE_FILE = os.path.join(os.path.dirname(__file__), ".discovery_state.json")
+DEFAULT_TTL_HOURS = 24  # Re-inventory every host at least this often
+
+# Fields that change on their own and must not make a host look different
+VOLATILE_FIELDS = ("uptime_hours", "logged_users")
+
+
+def inventory_hash(info):
+    """Stable hash of the inventory payload, ignoring volatile fields"""
+    stable = {key: value for key, value in info.items() if key not in VOLATILE_FIELDS}
+    return hashlib.sha256(json.dumps(stable, sort_keys=True).encode()).hexdigest()
+
+
+class FingerprintStore:
+    """Per-IP MAC, hostname, inventory hash and last-verified time, persisted to disk"""
+
+    def __init__(self, state_file=STATE_FILE, ttl_hours=DEFAULT_TTL_HOURS, clock=time.time):
+        self.state_file = state_file
+        self.ttl = ttl_hours * 3600
+        self.clock = clock
+        self.lock = Lock()
+        self.hosts = {}
+        self.dirty = False
+        self.load()
+
+    @classmethod
+    def from_config(cls, cfg):
+        """Store for incremental discovery, or None when it is switched off"""
+        incremental_cfg = cfg.get("incremental_discovery", {})
+        if not incremental_cfg.get("enabled", False):
+            return None
+        return cls(
+            state_file=incremental_cfg.get("state_file", STATE_FILE),
+            ttl_hours=incremental_cfg.get("ttl_hours", DEFAULT_TTL_HOURS),
+        )
+
+    def load(self):
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+            self.hosts = dict(state.get("hosts", {}))
+        except FileNotFoundError:
+            self.hosts = {}
+        except (OSError, ValueError) as e:
+            print(f"[!] Ignoring unreadable discovery state {self.state_file}: {e}")
+            self.hosts = {}
+
+    def save(self):
+        """Persist fingerprints if they changed"""
+        with self.lock:
+            if not self.dirty:
+                return
+            state = {"hosts": dict(self.hosts)}
+            self.dirty = False
+        tmp_path = f"{self.state_file}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(state, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            print(f"[!] Could not write discovery state {self.state_file}: {e}")
+
+    def is_fresh(self, ip):
+        """True if the host was fully verified within the TTL"""
+        with self.lock:
+            entry = self.hosts.get(ip)
+            return entry is not None and self.clock() - entry["verified_at"] < self.ttl
+
+    def identity_matches(self, ip, identity):
+        """Compare a cheap {hostname, mac_address} probe with the stored fingerprint"""
+        with self.lock:
+            entry = self.hosts.get(ip)
+        return (
+            entry is not None
+            and identity.get("hostname") == entry.get("hostname")
+            and identity.get("mac_address") == entry.get("mac_address")
+        )
+
+    def record(self, ip, info):
+        """Store the fingerprint of a payload that was written to the database"""
+        with self.lock:
+            self.hosts[ip] = {
+                "hostname": info.get("hostname"),
+                "mac_address": info.get("mac_address"),
+                "inventory_hash": inventory_hash(info),
+                "verified_at": self.clock(),
+            }
+            self.dirty = True
+
+    def reset(self):
+        """Drop every fingerprint so the next scan fetches and writes all hosts"""
+        with self.lock:
+            self.hosts = {}
+            self.dirty = True
+
+    def forget(self, ip):
+        with self.lock:
+            if self.hosts.pop(ip, None) is not None:
+                self.dirty = True
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+OptiLab Heartbeat
+Probes SSH ports from one event loop, debounces results per host and writes
+only the status changes, in one statement
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from threading import Lock
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+
+from ping_sweep import SSH_PORT, tcp_probe
+
+DEFAULT_TIMEOUT = 1.0  # Same window as the old `nc -w1`
+DEFAULT_CONCURRENCY = 1000  # Sockets open at once
+STATE_FILE = os.path.join(os.path.dirname(__file__), ".heartbeat_state.json")
+FAILURE_THRESHOLD = 3  # Consecutive failed probes before a host is marked offline
+RECOVERY_THRESHOLD = 1  # Good probes before it is marked active again (one sweep)
+STALE_INTERVALS = 3  # Counters older than this many heartbeat intervals start over
+PAGE_SIZE = 1000  # Systems fetched (and probed together) per server-side cursor page
+RECENT_OFFLINE_HOURS = 24  # Offline this recently = probed first, ahead of the full sweep
+SWEEP_STATUSES = ("active", "offline")  # Statuses the heartbeat owns; others belong to scan/admin
+
+RECENT_OFFLINE_SQL = """
+    SELECT system_id, host(ip_address) AS ip_address, hostname, status
+    FROM systems
+    WHERE status = 'offline' AND updated_at >= NOW() - %s * INTERVAL '1 hour'
+    ORDER BY updated_at DESC
+"""
+
+SWEEP_SQL = """
+    SELECT system_id, host(ip_address) AS ip_address, hostname, status
+    FROM systems
+    WHERE status = ANY(%s) AND system_id > %s AND system_id < %s
+    ORDER BY system_id
+    LIMIT %s
+"""
+
+STATUS_UPDATE_SQL = """
+    UPDATE systems AS s
+    SET status = v.status, updated_at = NOW()
+    FROM (VALUES %s) AS v(system_id, status)
+    WHERE s.system_id = v.system_id
+      AND s.status IS DISTINCT FROM v.status
+"""
+
+
+class HeartbeatProber:
+    """Non-blocking connects to every host's SSH port, bounded by a semaphore"""
+
+    def __init__(self, port=SSH_PORT, timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY):
+        self.port = port
+        self.timeout = timeout
+        self.concurrency = concurrency
+
+    @classmethod
+    def from_config(cls, cfg):
+        heartbeat_cfg = cfg.get("heartbeat", {})
+        return cls(
+            port=heartbeat_cfg.get("port", SSH_PORT),
+            timeout=heartbeat_cfg.get("timeout_seconds", DEFAULT_TIMEOUT),
+            concurrency=heartbeat_cfg.get("concurrency", DEFAULT_CONCURRENCY),
+        )
+
+    async def probe_all(self, ips):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def check(ip):
+            async with semaphore:
+                # Like `nc -z`, only an accepted connection counts
+                return ip, await tcp_probe(ip, self.port, self.timeout, refused_is_up=False)
+
+        return dict(await asyncio.gather(*(check(ip) for ip in ips)))
+
+    def probe(self, ips):
+        """{ip: reachable} for every address, in roughly one timeout window"""
+        return asyncio.run(self.probe_all(ips))
+
+
+class HostHealth:
+    """Heartbeat state for one system"""
+
+    __slots__ = ("status", "failures", "successes", "changed_at", "seen_at")
+
+    def __init__(self, status, changed_at, seen_at, failures=0, successes=0):
+        self.status = status
+        self.failures = failures
+        self.successes = successes
+        self.changed_at = changed_at
+        self.seen_at = seen_at
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class HeartbeatTracker:
+    """Consecutive-result counters with separate down/up thresholds (hysteresis)
+
+    A status change is only reported once a streak crosses its threshold, so one
+    lost probe on a lossy network neither flips the host nor costs a write.
+    State is kept on disk between runs because `heartbeat` is normally run by cron.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, recovery_threshold=RECOVERY_THRESHOLD,
+                 interval=300, state_file=STATE_FILE, clock=time.time):
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_threshold = max(1, recovery_threshold)
+        self.interval = interval
+        self.state_file = state_file
+        self.clock = clock
+        self.lock = Lock()
+        self.hosts = {}
+        self.dirty = False
+        if state_file:
+            self.load()
+
+    @classmethod
+    def from_config(cls, cfg, state_file=STATE_FILE):
+        heartbeat_cfg = cfg.get("heartbeat", {})
+        return cls(
+            failure_threshold=cfg.get("failure_threshold", FAILURE_THRESHOLD),
+            recovery_threshold=heartbeat_cfg.get("recovery_threshold", RECOVERY_THRESHOLD),
+            interval=cfg.get("heartbeat_interval_minutes", 5) * 60,
+            state_file=heartbeat_cfg.get("state_file", state_file),
+        )
+
+    def load(self):
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+            self.hosts = {
+                int(system_id): HostHealth(**entry) for system_id, entry in state.get("hosts", {}).items()
+            }
+        except FileNotFoundError:
+            self.hosts = {}
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[!] Ignoring unreadable heartbeat state {self.state_file}: {e}")
+            self.hosts = {}
+
+    def save(self):
+        """Persist counters if they changed"""
+        if not self.state_file:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            state = {"hosts": {str(system_id): health.to_dict() for system_id, health in self.hosts.items()}}
+            self.dirty = False
+        tmp_path = f"{self.state_file}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(state, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            print(f"[!] Could not write heartbeat state {self.state_file}: {e}")
+
+    def observe(self, system_id, db_status, ok):
+        """Record one probe result; returns the new status if the host crossed a threshold"""
+        now = self.clock()
+        with self.lock:
+            self.dirty = True
+            health = self.hosts.get(system_id)
+            if (
+                health is None
+                or health.status != db_status  # Changed elsewhere (scan, admin): follow the database
+                or now - health.seen_at > STALE_INTERVALS * self.interval
+            ):
+                health = HostHealth(db_status, changed_at=now, seen_at=now)
+                self.hosts[system_id] = health
+            health.seen_at = now
+
+            if ok:
+                health.successes += 1
+                health.failures = 0
+                if health.status == 'offline' and health.successes >= self.recovery_threshold:
+                    return self._transition(health, 'active', now)
+            else:
+                health.failures += 1
+                health.successes = 0
+                if health.status == 'active' and health.failures >= self.failure_threshold:
+                    return self._transition(health, 'offline', now)
+            return None
+
+    @staticmethod
+    def _transition(health, status, now):
+        health.status = status
+        health.changed_at = now
+        health.failures = health.successes = 0
+        return status
+
+
+def apply_status_changes(conn, changes):
+    """Write [(system_id, status), ...] as one set-based UPDATE; returns rows changed"""
+    if not changes:
+        return 0
+    cur = conn.cursor()
+    try:
+        execute_values(
+            cur, STATUS_UPDATE_SQL, changes, template="(%s::int, %s::varchar)", page_size=len(changes)
+        )
+        updated = cur.rowcount
+        conn.commit()
+        return updated
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def recently_offline(conn, hours=RECENT_OFFLINE_HOURS):
+    """Systems that went offline within `hours`, most recent first"""
+    cur = conn.cursor()
+    try:
+        cur.execute(RECENT_OFFLINE_SQL, (hours,))
+        return cur.fetchall()
+    finally:
+        cur.close()
+        conn.rollback()
+
+
+def id_shards(conn, shards):
+    """Split [min(system_id), max(system_id)] into `shards` half-open ranges"""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT MIN(system_id) AS lo, MAX(system_id) AS hi FROM systems")
+        row = cur.fetchone()
+    finally:
+        cur.close()
+        conn.rollback()
+    if row["lo"] is None:
+        return []
+    lo, hi = row["lo"], row["hi"] + 1
+    step = -(-(hi - lo) // max(1, shards))
+    return [(start, min(start + step, hi)) for start in range(lo, hi, step)]
+
+
+def iter_pages(conn, statuses, id_range, page_size=PAGE_SIZE):
+    """Pages of systems in id order, each its own keyset query (system_id > last seen)
+
+    No cursor or transaction stays open between pages, so the commits made while
+    a page is processed are unaffected and the server never materializes the sweep.
+    """
+    lo, hi = id_range
+    last = lo - 1
+    while True:
+        cur = conn.cursor()
+        try:
+            cur.execute(SWEEP_SQL, (list(statuses), last, hi, page_size))
+            page = cur.fetchall()
+        finally:
+            cur.close()
+            conn.rollback()
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last = page[-1]["system_id"]
+
+
+def probe_page(prober, page, skip=()):
+    """[(system, reachable)] for one page, leaving out systems already probed"""
+    systems = [system for system in page if system["system_id"] not in skip]
+    reachable = prober.probe([system["ip_address"] for system in systems])
+    return [(system, reachable.get(system["ip_address"], False)) for system in systems]
+
+
+def sweep_shard(dsn, statuses, id_range, prober, page_size=PAGE_SIZE, skip=()):
+    """Worker-process entry: probe one system_id range on its own connection"""
+    conn = psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+    try:
+        results = []
+        for page in iter_pages(conn, statuses, id_range, page_size):
+            results.extend((dict(system), ok) for system, ok in probe_page(prober, page, skip))
+        return results
+    finally:
+        conn.close()
+
+
+def sweep_shards(dsn, statuses, ranges, prober, page_size=PAGE_SIZE, skip=()):
+    """Run sweep_shard for every range in its own process; yields each shard's results"""
+    # Spawned, not forked: the daemon calls this from a thread, and a forked child
+    # could inherit locks other threads held at the time
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(ranges), mp_context=context) as executor:
+        futures = {
+            executor.submit(sweep_shard, dsn, statuses, id_range, prober, page_size, skip): id_range
+            for id_range in ranges
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
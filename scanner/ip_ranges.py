@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+OptiLab IP Range Sets
+Compact sorted integer intervals for scan targets: O(log n) membership, lazy iteration
+"""
+
+import bisect
+import ipaddress
+
+
+def ip_to_int(ip):
+    return int(ipaddress.IPv4Address(ip)) if not isinstance(ip, int) else ip
+
+
+class IPRangeSet:
+    """Set of IPv4 addresses stored as merged, inclusive [start, end] integer intervals"""
+
+    def __init__(self, ranges=()):
+        self.starts = []
+        self.ends = []
+        for start, end in ranges:
+            self.add_range(start, end)
+
+    @classmethod
+    def from_range(cls, from_ip, to_ip):
+        return cls([(from_ip, to_ip)])
+
+    @classmethod
+    def from_network(cls, cidr, hosts_only=True):
+        """Addresses of a CIDR block; like network.hosts(), drops network/broadcast by default"""
+        network = ipaddress.IPv4Network(cidr, strict=False)
+        start = int(network.network_address)
+        end = int(network.broadcast_address)
+        if hosts_only and network.num_addresses > 2:
+            start, end = start + 1, end - 1
+        return cls([(start, end)])
+
+    def add_range(self, from_ip, to_ip):
+        """Add an inclusive range, merging it with any overlapping or adjacent intervals"""
+        start, end = ip_to_int(from_ip), ip_to_int(to_ip)
+        if end < start:
+            return
+        # Intervals that touch [start - 1, end + 1] are folded into the new one
+        lo = bisect.bisect_left(self.ends, start - 1)
+        hi = bisect.bisect_right(self.starts, end + 1)
+        if lo < hi:
+            start = min(start, self.starts[lo])
+            end = max(end, self.ends[hi - 1])
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
+
+    def add(self, ip):
+        self.add_range(ip, ip)
+
+    def update(self, other):
+        for start, end in zip(other.starts, other.ends):
+            self.add_range(start, end)
+
+    def __contains__(self, ip):
+        try:
+            value = ip_to_int(ip)
+        except ValueError:
+            return False
+        i = bisect.bisect_right(self.starts, value) - 1
+        return i >= 0 and value <= self.ends[i]
+
+    def __iter__(self):
+        """Addresses as strings in numeric order, generated on demand"""
+        for start, end in zip(self.starts, self.ends):
+            for value in range(start, end + 1):
+                yield str(ipaddress.IPv4Address(value))
+
+    def __len__(self):
+        return sum(end - start + 1 for start, end in zip(self.starts, self.ends))
+
+    def __bool__(self):
+        return bool(self.starts)
+
+    def ranges(self):
+        """(first, last) address pairs of each merged interval"""
+        return [
+            (ipaddress.IPv4Address(start), ipaddress.IPv4Address(end))
+            for start, end in zip(self.starts, self.ends)
+        ]
+
+    def first(self):
+        return str(ipaddress.IPv4Address(self.starts[0])) if self.starts else None
+
+    def last(self):
+        return str(ipaddress.IPv4Address(self.ends[-1])) if self.ends else None
+
+    def label(self):
+        """Short description for log lines, e.g. "10.0.0.1 - 10.0.0.254" """
+        if not self.starts:
+            return "(empty)"
+        text = ", ".join(
+            str(first) if first == last else f"{first} - {last}" for first, last in self.ranges()[:3]
+        )
+        if len(self.starts) > 3:
+            text += f", ... ({len(self.starts)} ranges)"
+        return text
+
+    def __repr__(self):
+        return f"IPRangeSet({self.label()})"
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+OptiLab Scanner Daemon
+Runs discovery scans and heartbeats on internal timers, keeping database
+connections, SSH sessions and heartbeat state warm between runs
+"""
+
+import json
+import os
+import signal
+import sys
+import time
+from datetime import datetime
+from threading import Event, Lock, Thread
+
+from discovery_pipeline import DiscoveryPipeline, UPSERT_WORKERS
+from fingerprints import FingerprintStore
+from heartbeat import HeartbeatProber, HeartbeatTracker
+from network_monitor import db_connect, get_effective_ssh_config, heartbeat, run_scan, scan_jobs
+
+# Reuse the collector's database pool (health checks, reconnects, waiting checkouts)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "collector"))
+from db_pool import DatabasePool
+
+STATUS_FILE = os.path.join(os.path.dirname(__file__), ".daemon_status.json")
+RESERVED_CONNECTIONS = 2  # The scan job's own connection and the heartbeat's
+TIMING_HISTORY = 20  # Runs kept per job for the averages
+SSH_PERSIST_GRACE = 120  # Keep SSH masters this long past the scan interval
+
+
+class RunTimings:
+    """Durations of the last few runs of one job"""
+
+    def __init__(self, name, history=TIMING_HISTORY):
+        self.name = name
+        self.history = history
+        self.durations = []
+        self.runs = 0
+        self.failures = 0
+        self.last_started = None
+        self.last_error = None
+        self.detail = None
+
+    def record(self, started, duration, error=None, detail=None):
+        self.runs += 1
+        self.last_started = started
+        self.last_error = error
+        self.detail = detail or self.detail
+        if error is not None:
+            self.failures += 1
+        self.durations = (self.durations + [duration])[-self.history:]
+
+    def summary(self):
+        if not self.durations:
+            return f"{self.name}: no runs yet"
+        average = sum(self.durations) / len(self.durations)
+        return (
+            f"{self.name} #{self.runs} took {self.durations[-1]:.1f}s "
+            f"(avg {average:.1f}s, max {max(self.durations):.1f}s over {len(self.durations)} runs)"
+        )
+
+    def to_dict(self):
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_started": self.last_started,
+            "last_seconds": self.durations[-1] if self.durations else None,
+            "avg_seconds": sum(self.durations) / len(self.durations) if self.durations else None,
+            "max_seconds": max(self.durations) if self.durations else None,
+            "last_error": self.last_error,
+            "detail": self.detail,
+        }
+
+
+def pool_size(departments, upsert_workers):
+    """Connections for every department scanning at once (each holds one per upsert
+    worker) plus the reserved ones"""
+    return max(1, departments) * max(1, upsert_workers) + RESERVED_CONNECTIONS
+
+
+def count_departments(cfg):
+    """Departments a scan would cover right now"""
+    conn = db_connect(cfg)
+    try:
+        return len(scan_jobs(conn, cfg))
+    finally:
+        conn.close()
+
+
+class ScannerDaemon:
+    """Scan every scanner_interval_minutes and heartbeat every heartbeat_interval_minutes
+
+    Each job has its own thread so a long scan never delays a heartbeat. Runs are
+    scheduled at a fixed rate; one that overruns its interval is followed immediately
+    by the next, never by a burst of catch-up runs.
+    """
+
+    def __init__(self, cfg, status_file=STATUS_FILE):
+        daemon_cfg = cfg.get("daemon", {})
+        self.cfg = cfg
+        self.status_file = daemon_cfg.get("status_file", status_file)
+        self.stop_event = Event()
+        self.lock = Lock()
+
+        self.ssh_cfg = get_effective_ssh_config(cfg)
+        scan_interval = cfg.get("scanner_interval_minutes", 30) * 60
+        # Masters outlive the gap between scans, so every scan after the first skips the handshakes
+        self.ssh_cfg.setdefault(
+            "control_persist", daemon_cfg.get("ssh_control_persist_seconds", scan_interval + SSH_PERSIST_GRACE)
+        )
+
+        upsert_workers = cfg.get("discovery_pipeline", {}).get("upsert_workers", UPSERT_WORKERS)
+        pool_max = daemon_cfg.get("db_pool_max") or pool_size(count_departments(cfg), upsert_workers)
+        self.db = DatabasePool(cfg["db"]["dsn"], maxconn=pool_max)
+        self.pipeline = DiscoveryPipeline.from_config(cfg, connect=self.db.get, release=self.db.put)
+        # Departments added after startup scan in turns rather than exhausting the pool
+        self.max_parallel = max(1, (pool_max - RESERVED_CONNECTIONS) // self.pipeline.upsert_workers)
+        print(f"[DAEMON] Database pool of {pool_max} connections, "
+              f"up to {self.max_parallel} departments scanned at once")
+        self.fingerprints = FingerprintStore.from_config(cfg)
+        self.prober = HeartbeatProber.from_config(cfg)
+        self.tracker = HeartbeatTracker.from_config(cfg)
+
+        history = daemon_cfg.get("timing_history", TIMING_HISTORY)
+        self.jobs = {
+            "scan": (scan_interval, self.scan, RunTimings("scan", history)),
+            "heartbeat": (cfg.get("heartbeat_interval_minutes", 5) * 60, self.heartbeat,
+                          RunTimings("heartbeat", history)),
+        }
+
+    def scan(self, conn):
+        durations = run_scan(
+            conn, self.cfg, self.ssh_cfg, self.pipeline, self.fingerprints, self.db.get, self.db.put,
+            self.max_parallel,
+        )
+        return {dept_id: round(seconds, 1) for dept_id, seconds in durations.items()}
+
+    def heartbeat(self, conn):
+        heartbeat(conn, self.cfg, self.prober, self.tracker)
+
+    def run_job(self, name):
+        interval, job, timings = self.jobs[name]
+        next_due = time.monotonic()
+        while not self.stop_event.wait(max(0.0, next_due - time.monotonic())):
+            started_at = datetime.now()
+            started = time.monotonic()
+            print(f"[DAEMON] Starting {name} at {started_at}")
+            error = detail = None
+            try:
+                with self.db.connection() as conn:
+                    detail = job(conn)
+            except Exception as e:
+                error = str(e)
+                print(f"[DAEMON] ✗ {name} failed: {e}")
+            duration = time.monotonic() - started
+
+            with self.lock:
+                timings.record(started_at.isoformat(timespec="seconds"), duration, error, detail)
+                print(f"[DAEMON] {timings.summary()}")
+            self.write_status()
+
+            next_due += interval
+            if next_due < time.monotonic():
+                print(f"[DAEMON] ⚠ {name} took longer than its {interval / 60:.0f}m interval")
+                next_due = time.monotonic()
+
+    def write_status(self):
+        """Per-job timings for monitoring; a scan's detail is seconds per dept_id"""
+        with self.lock:
+            status = {"updated_at": datetime.now().isoformat(timespec="seconds"), "jobs": {}}
+            for name, (interval, _, timings) in self.jobs.items():
+                status["jobs"][name] = {"interval_seconds": interval, **timings.to_dict()}
+        tmp_path = f"{self.status_file}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(status, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.status_file)
+        except OSError as e:
+            print(f"[!] Could not write daemon status {self.status_file}: {e}")
+
+    def stop(self, *_):
+        if not self.stop_event.is_set():
+            print("[DAEMON] Stopping after the current runs finish...")
+        self.stop_event.set()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for name, (interval, _, _) in self.jobs.items():
+            print(f"[DAEMON] {name} every {interval / 60:g} minutes")
+
+        threads = [Thread(target=self.run_job, args=(name,), name=f"daemon-{name}") for name in self.jobs]
+        for thread in threads:
+            thread.start()
+        # Joining with a timeout keeps the main thread responsive to signals
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1)
+
+        self.tracker.save()
+        if self.fingerprints is not None:
+            self.fingerprints.save()
+        self.db.close()
+        print("[DAEMON] Stopped.")
@@ -1,13 +1,23 @@
 #!/usr/bin/env python3
 import json
-import ipaddress
 import subprocess
+import tempfile
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from psycopg2.extras import RealDictCursor, execute_values
 from datetime import datetime
 import os
 
+from discovery_pipeline import DiscoveryPipeline
+from fingerprints import FingerprintStore
+from heartbeat import (
+    HeartbeatProber, HeartbeatTracker, apply_status_changes, id_shards, iter_pages, probe_page,
+    recently_offline, sweep_shards, PAGE_SIZE, RECENT_OFFLINE_HOURS, SWEEP_STATUSES,
+)
+from ip_ranges import IPRangeSet
+from ping_sweep import LivenessSweeper
+from scan_coordinator import ScanCoordinator
+
+SSH_CONTROL_DIR = os.path.join(tempfile.gettempdir(), "optilab-scan-ssh")
 CONFIG_PATH = "/home/aayush/Desktop/Projects/optilab-smart-lab-utilization/scanner/config.json"
 
 # ----------------------------------------------------------
@@ -18,21 +28,19 @@ def load_config():
         return json.load(f)
 
 def expand_ip_range(from_ip, to_ip):
-    start = int(ipaddress.IPv4Address(from_ip))
-    end = int(ipaddress.IPv4Address(to_ip))
-    return [str(ipaddress.IPv4Address(i)) for i in range(start, end + 1)]
+    return IPRangeSet.from_range(from_ip, to_ip)
 
 def db_connect(cfg):
     return psycopg2.connect(cfg["db"]["dsn"], cursor_factory=RealDictCursor)
 
 def get_configured_ranges(cfg):
-    ranges = []
+    ranges = IPRangeSet()
     for lab in cfg.get("labs", []):
         ip_range = lab.get("ip_range", {})
         from_ip = ip_range.get("from")
         to_ip = ip_range.get("to")
         if from_ip and to_ip:
-            ranges.extend(expand_ip_range(from_ip, to_ip))
+            ranges.add_range(from_ip, to_ip)
     return ranges
 
 def validate_dept_config(conn, dept):
@@ -84,6 +92,21 @@ def build_ssh_transport_options(ssh_cfg):
     proxy_jump = f"-o ProxyJump={bastion_user}@{bastion_host}:{bastion_port}"
     return proxy_jump, proxy_jump
 
+def build_ssh_multiplex_options(ssh_cfg):
+    """ControlMaster options when ssh_cfg["control_persist"] is set (seconds)
+
+    scp, the inventory run and the cleanup then share one authenticated session per
+    host, and a long-running scanner finds it still open on the next scan.
+    """
+    persist = ssh_cfg.get("control_persist")
+    if not persist:
+        return ""
+    os.makedirs(SSH_CONTROL_DIR, mode=0o700, exist_ok=True)
+    return (
+        f"-oControlMaster=auto -oControlPersist={int(persist)} "
+        f"-oControlPath={os.path.join(SSH_CONTROL_DIR, '%C')}"
+    )
+
 # ----------------------------------------------------------
 # Scanner
 # ----------------------------------------------------------
@@ -92,6 +115,7 @@ def ssh_identify(ip, ssh_cfg):
     script_path = os.path.join(os.path.dirname(__file__), "get_system_info.sh")
     remote_script = "/tmp/get_system_info.sh"
     scp_transport, ssh_transport = build_ssh_transport_options(ssh_cfg)
+    multiplex = build_ssh_multiplex_options(ssh_cfg)
 
     print(f"    [SSH] Attempting connection to {ip}...")
 
@@ -99,7 +123,7 @@ def ssh_identify(ip, ssh_cfg):
     scp_cmd = (
         f"scp -oBatchMode=yes "
         f"-oConnectTimeout={ssh_cfg['timeout']} "
-        f"{scp_transport} "
+        f"{scp_transport} {multiplex} "
         f"-i {ssh_cfg['private_key']} {script_path} {ssh_cfg['user']}@{ip}:{remote_script}"
     )
     scp_result = run_cmd_capture(scp_cmd, timeout=ssh_cfg['timeout'] + 5)
@@ -117,7 +141,7 @@ def ssh_identify(ip, ssh_cfg):
     ssh_cmd = (
         f"ssh -oBatchMode=yes "
         f"-oConnectTimeout={ssh_cfg['timeout']} "
-        f"{ssh_transport} "
+        f"{ssh_transport} {multiplex} "
         f"-i {ssh_cfg['private_key']} {ssh_cfg['user']}@{ip} "
         f"'bash {remote_script} --json'"
     )
@@ -141,7 +165,7 @@ def ssh_identify(ip, ssh_cfg):
     cleanup_cmd = (
         f"ssh -oBatchMode=yes "
         f"-oConnectTimeout={ssh_cfg['timeout']} "
-        f"{ssh_transport} "
+        f"{ssh_transport} {multiplex} "
         f"-i {ssh_cfg['private_key']} {ssh_cfg['user']}@{ip} "
         f"'rm -f {remote_script}'"
     )
@@ -162,47 +186,81 @@ def ssh_identify(ip, ssh_cfg):
         print(f"    [SSH] Raw output: {output[:200]}...")
         return None
 
+# Same sources get_system_info.sh reads its hostname and MAC from
+FINGERPRINT_CMD = "hostname; ip link show | grep -oP '(?<=link/ether\\s)[0-9a-f:]+' | head -1"
+
+def ssh_fingerprint(ip, ssh_cfg):
+    """Cheap identity check: hostname and MAC over one SSH command, no script upload."""
+    _, ssh_transport = build_ssh_transport_options(ssh_cfg)
+    multiplex = build_ssh_multiplex_options(ssh_cfg)
+    ssh_cmd = (
+        f"ssh -oBatchMode=yes "
+        f"-oConnectTimeout={ssh_cfg['timeout']} "
+        f"{ssh_transport} {multiplex} "
+        f"-i {ssh_cfg['private_key']} {ssh_cfg['user']}@{ip} "
+        f"\"{FINGERPRINT_CMD}\""
+    )
+    result = run_cmd_capture(ssh_cmd, timeout=ssh_cfg['timeout'] + 5)
+    if not result or result.returncode != 0:
+        return None
+    lines = result.stdout.strip().splitlines()
+    if not lines:
+        return None
+    return {"hostname": lines[0].strip(), "mac_address": lines[1].strip() if len(lines) > 1 else ""}
+
+SYSTEM_UPSERT_SQL = """
+    INSERT INTO systems (
+        lab_id, dept_id, hostname, ip_address, mac_address,
+        cpu_model, cpu_cores, ram_total_gb, disk_total_gb, gpu_model, gpu_memory,
+        status, notes, updated_at
+    )
+    VALUES %s
+    ON CONFLICT (ip_address) DO UPDATE
+    SET hostname = EXCLUDED.hostname,
+        mac_address = EXCLUDED.mac_address,
+        dept_id = EXCLUDED.dept_id,
+        cpu_model = EXCLUDED.cpu_model,
+        cpu_cores = EXCLUDED.cpu_cores,
+        ram_total_gb = EXCLUDED.ram_total_gb,
+        disk_total_gb = EXCLUDED.disk_total_gb,
+        gpu_model = EXCLUDED.gpu_model,
+        gpu_memory = EXCLUDED.gpu_memory,
+        status = CASE WHEN systems.lab_id IS NULL THEN 'discovered' ELSE systems.status END,
+        updated_at = NOW()
+    RETURNING system_id, host(ip_address) AS ip;
+"""
+SYSTEM_ROW_TEMPLATE = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'discovered', %s, NOW())"
+
+def system_row(ip, data, dept_id):
+    """Row tuple for one discovered system, matching SYSTEM_ROW_TEMPLATE"""
+    return (
+        None, dept_id, data.get("hostname"), ip, data.get("mac_address"),
+        data.get("cpu_model"), data.get("cpu_cores"), data.get("ram_total_gb"),
+        data.get("disk_total_gb"), data.get("gpu_model"), data.get("gpu_memory"),
+        None
+    )
+
 def upsert_system(conn, ip, data, dept_id):
+    """Insert or refresh one discovered system; returns its system_id"""
     print(f"    [DB] Inserting discovered system {ip} into dept {dept_id} (lab unassigned)")
 
     cur = conn.cursor()
     try:
-        cur.execute("""
-            INSERT INTO systems (
-                lab_id, dept_id, hostname, ip_address, mac_address,
-                cpu_model, cpu_cores, ram_total_gb, disk_total_gb, gpu_model, gpu_memory,
-                status, notes, updated_at
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'discovered', %s, NOW())
-            ON CONFLICT (ip_address) DO UPDATE
-            SET hostname = EXCLUDED.hostname,
-                mac_address = EXCLUDED.mac_address,
-                dept_id = EXCLUDED.dept_id,
-                cpu_model = EXCLUDED.cpu_model,
-                cpu_cores = EXCLUDED.cpu_cores,
-                ram_total_gb = EXCLUDED.ram_total_gb,
-                disk_total_gb = EXCLUDED.disk_total_gb,
-                gpu_model = EXCLUDED.gpu_model,
-                gpu_memory = EXCLUDED.gpu_memory,
-                status = CASE WHEN systems.lab_id IS NULL THEN 'discovered' ELSE systems.status END,
-                updated_at = NOW()
-            RETURNING system_id;
-        """, (
-            None, dept_id, data.get("hostname"), ip, data.get("mac_address"),
-            data.get("cpu_model"), data.get("cpu_cores"), data.get("ram_total_gb"),
-            data.get("disk_total_gb"), data.get("gpu_model"), data.get("gpu_memory"),
-            None
-        ))
-
-        result = cur.fetchone()
+        result = execute_values(
+            cur, SYSTEM_UPSERT_SQL, [system_row(ip, data, dept_id)],
+            template=SYSTEM_ROW_TEMPLATE, fetch=True
+        )
+
+        system_id = None
         if result:
-            system_id = result['system_id'] if isinstance(result, dict) else result[0]
+            system_id = result[0]['system_id']
             print(f"    [DB] ✓ System inserted/updated with ID: {system_id}")
         else:
             print(f"    [DB] ✗ No result returned from RETURNING clause for {ip}")
 
         conn.commit()
         print(f"    [DB] ✓ Transaction committed for {ip}")
+        return system_id
 
     except Exception as e:
         conn.rollback()
@@ -211,133 +269,243 @@ def upsert_system(conn, ip, data, dept_id):
     finally:
         cur.close()
 
-def discover_department(dept, ssh_cfg, conn, ip_list=None):
+def upsert_systems(conn, hosts, dept_id):
+    """Upsert a batch of (ip, data) in one statement and commit; returns {ip: system_id}"""
+    # ON CONFLICT can't touch the same row twice in one statement, so keep the last payload per IP
+    latest = dict(hosts)
+    if not latest:
+        return {}
+    print(f"    [DB] Upserting {len(latest)} discovered systems into dept {dept_id} (lab unassigned)")
+
+    cur = conn.cursor()
+    try:
+        result = execute_values(
+            cur, SYSTEM_UPSERT_SQL,
+            [system_row(ip, data, dept_id) for ip, data in latest.items()],
+            template=SYSTEM_ROW_TEMPLATE, page_size=len(latest), fetch=True
+        )
+        conn.commit()
+        system_ids = {row['ip']: row['system_id'] for row in result}
+        print(f"    [DB] ✓ Batch committed: {len(system_ids)} systems")
+        return system_ids
+    except Exception as e:
+        conn.rollback()
+        print(f"    [DB] ✗ Batch upsert failed ({e}), retrying host by host")
+    finally:
+        cur.close()
+
+    # Slow path: one transaction per host so a bad row doesn't sink the batch
+    system_ids = {}
+    for ip, data in latest.items():
+        try:
+            system_id = upsert_system(conn, ip, data, dept_id)
+        except Exception:
+            continue
+        if system_id is not None:
+            system_ids[ip] = system_id
+    return system_ids
+
+SYSTEM_TOUCH_SQL = """
+    UPDATE systems
+    SET status = CASE WHEN lab_id IS NULL THEN 'discovered' ELSE status END,
+        updated_at = NOW()
+    WHERE ip_address = ANY(%s::inet[])
+    RETURNING host(ip_address) AS ip
+"""
+
+def touch_systems(conn, ips):
+    """Mark hosts skipped as unchanged as seen, in one statement; returns the IPs whose
+    row was found, or None if the update failed"""
+    if not ips:
+        return set()
+    cur = conn.cursor()
+    try:
+        cur.execute(SYSTEM_TOUCH_SQL, (list(ips),))
+        touched = {row["ip"] for row in cur.fetchall()}
+        conn.commit()
+        print(f"    [DB] ✓ Refreshed {len(touched)} unchanged systems")
+        return touched
+    except Exception as e:
+        conn.rollback()
+        print(f"    [DB] ✗ Could not refresh unchanged systems: {e}")
+        return None
+    finally:
+        cur.close()
+
+def discover_department(dept, ssh_cfg, conn, ip_list=None, pipeline=None, fingerprints=None):
     # Validate department configuration
     validate_dept_config(conn, dept)
 
     if ip_list is None:
-        # Get all IPs in the subnet
-        network = ipaddress.ip_network(dept["subnet_cidr"])
-        ips = [str(ip) for ip in network.hosts()]
+        # All host addresses in the subnet, kept as one interval rather than a list
+        ips = IPRangeSet.from_network(dept["subnet_cidr"])
         scan_label = dept["subnet_cidr"]
     else:
-        ips = ip_list
-        scan_label = f"{ips[0]} - {ips[-1]}"
+        ips = ip_list if isinstance(ip_list, IPRangeSet) else IPRangeSet((ip, ip) for ip in ip_list)
+        scan_label = ips.label()
     
-    responsive_hosts = []
+    pipeline = pipeline or DiscoveryPipeline(LivenessSweeper())
     print(f"[+] Scanning department {dept['dept_id']} ({dept['dept_name']}) - {scan_label} ({len(ips)} IPs)")
 
-    # Step 1: Fast ping sweep
-    if ip_list is None:
-        cmd = f"nmap -sn {dept['subnet_cidr']} -oG -"
-        nmap_out = run_cmd(cmd)
-        for line in nmap_out.splitlines():
-            if "Up" in line:
-                ip = line.split()[1]
-                if ip in ips:
-                    responsive_hosts.append(ip)
-    else:
-        for cidr in ipaddress.summarize_address_range(ipaddress.IPv4Address(ips[0]), ipaddress.IPv4Address(ips[-1])):
-            cmd = f"nmap -sn {cidr} -oG -"
-            nmap_out = run_cmd(cmd)
-            for line in nmap_out.splitlines():
-                if "Up" in line:
-                    ip = line.split()[1]
-                    if ip in ips:
-                        responsive_hosts.append(ip)
-
-    print(f"    Found {len(responsive_hosts)} responsive hosts")
-
-    # Step 2: SSH validate + upsert
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = {
-            executor.submit(ssh_identify, ip, ssh_cfg): ip
-            for ip in responsive_hosts
-        }
-        for future in as_completed(futures):
-            ip = futures[future]
-            info = future.result()
-            if not info:
+    # Unchanged hosts skip the upsert but still need updated_at refreshed
+    unchanged = []
+
+    def identify(ip):
+        if fingerprints is not None and fingerprints.is_fresh(ip):
+            # Known host inside its TTL: a matching hostname/MAC means nothing to fetch
+            identity = ssh_fingerprint(ip, ssh_cfg)
+            if identity and fingerprints.identity_matches(ip, identity):
+                print(f"    [=] {ip} → {identity['hostname']} (unchanged, skipped)")
+                unchanged.append(ip)
+                return None
+        # New, changed or past its TTL: always upserted, which also restores a deleted
+        # row and applies a department re-mapping
+        return ssh_identify(ip, ssh_cfg)
+
+    def upsert(conn, batch):
+        system_ids = upsert_systems(conn, batch, dept["dept_id"])
+        for ip, info in batch:
+            if ip not in system_ids:
+                continue
+            if fingerprints is not None:
+                fingerprints.record(ip, info)
+            print(f"    [+] {ip} → {info['hostname']} (verified, system {system_ids[ip]})")
+        return system_ids
+
+    # Sweep, SSH validate and batched upserts run as overlapping stages
+    stats = pipeline.run(ips, identify, upsert, conn)
+    touched = touch_systems(conn, unchanged)
+    if touched is not None and len(touched) != len(unchanged):
+        # Rows deleted since the last upsert: drop their fingerprints so the next scan re-inserts them
+        missing = set(unchanged) - touched
+        print(f"    [DB] ⚠ {len(missing)} unchanged hosts have no systems row, re-inventorying next scan")
+        for ip in missing:
+            fingerprints.forget(ip)
+
+    print(f"    Found {stats[0].passed} responsive hosts")
+    for stage in stats:
+        print(f"    [PIPE] {stage.summary()}")
+
+def scan_jobs(conn, cfg):
+    """[(dept, targets)] to scan: configured lab ranges merged per department,
+    otherwise every department's whole subnet"""
+    cur = conn.cursor()
+    try:
+        configured_labs = cfg.get("labs", [])
+        if not configured_labs:
+            cur.execute("SELECT dept_id, dept_name, subnet_cidr FROM departments WHERE subnet_cidr IS NOT NULL")
+            return [(dict(dept), IPRangeSet.from_network(dept["subnet_cidr"])) for dept in cur.fetchall()]
+
+        targets = {}
+        for lab in configured_labs:
+            dept_id = lab.get("dept_id")
+            ip_range = lab.get("ip_range", {})
+            from_ip = ip_range.get("from")
+            to_ip = ip_range.get("to")
+            if not dept_id or not from_ip or not to_ip:
                 continue
-            upsert_system(conn, ip, info, dept["dept_id"])
-            print(f"    [+] {ip} → {info['hostname']} (verified)")
+            targets.setdefault(dept_id, IPRangeSet()).add_range(from_ip, to_ip)
+
+        jobs = []
+        for dept_id, ips in targets.items():
+            cur.execute("SELECT dept_id, dept_name, subnet_cidr FROM departments WHERE dept_id = %s", (dept_id,))
+            dept = cur.fetchone()
+            if dept:
+                jobs.append((dict(dept), ips))
+        return jobs
+    finally:
+        cur.close()
+        conn.rollback()
+
+def run_scan(conn, cfg, ssh_cfg, pipeline, fingerprints=None, connect=None, release=None,
+             max_parallel=None):
+    """One discovery pass over every department; returns per-department durations"""
+    connect = connect or (lambda: db_connect(cfg))
+    coordinator = ScanCoordinator.from_config(cfg, pipeline, connect, release, max_parallel)
+    durations = coordinator.run(
+        scan_jobs(conn, cfg),
+        lambda dept, dept_conn, targets, dept_pipeline: discover_department(
+            dept, ssh_cfg, dept_conn, targets, dept_pipeline, fingerprints
+        ),
+    )
+    if fingerprints is not None:
+        fingerprints.save()
+    return durations
 
 # ----------------------------------------------------------
 # Heartbeat
 # ----------------------------------------------------------
-def heartbeat(conn, cfg):
-    cur = conn.cursor()
-    cur.execute("SELECT system_id, ip_address, hostname, status, notes FROM systems WHERE status='active';")
-    systems = cur.fetchall()
-
-    print(f"[HB] Checking {len(systems)} active systems...")
-    def check(ip):
-        result = subprocess.run(["nc", "-z", "-w1", ip, "22"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        return ip, (result.returncode == 0)
-
-    with ThreadPoolExecutor(max_workers=cfg["max_workers"]) as executor:
-        results = executor.map(lambda s: check(s["ip_address"]), systems)
-
-    for ip, ok in results:
-        if ok:
-            cur.execute("""
-                UPDATE systems 
-                SET status='active', updated_at=NOW()
-                WHERE ip_address=%s;
-            """, (ip,))
-        else:
-            cur.execute("""
-                UPDATE systems 
-                SET status='offline', updated_at=NOW()
-                WHERE ip_address=%s;
-            """, (ip,))
-    conn.commit()
-    print("[HB] Heartbeat complete.")
+def heartbeat(conn, cfg, prober=None, tracker=None):
+    heartbeat_cfg = cfg.get("heartbeat", {})
+    statuses = heartbeat_cfg.get("statuses", list(SWEEP_STATUSES))
+    page_size = heartbeat_cfg.get("page_size", PAGE_SIZE)
+    shards = heartbeat_cfg.get("shards", 1)
+    prober = prober or HeartbeatProber.from_config(cfg)
+    tracker = tracker or HeartbeatTracker.from_config(cfg)
+    totals = {"probed": 0, "up": 0, "written": 0}
+
+    def record(results):
+        # Only streaks that cross failure_threshold (or the recovery threshold) are written
+        changes = []
+        for system, ok in results:
+            totals["probed"] += 1
+            totals["up"] += ok
+            status = tracker.observe(system["system_id"], system["status"], ok)
+            if status is not None:
+                changes.append((system["system_id"], status))
+                print(f"    [HB] {system['hostname']} ({system['ip_address']}) → {status}")
+        totals["written"] += apply_status_changes(conn, changes)
+
+    # Recently offline systems go first so recoveries don't wait for the full sweep
+    recent = recently_offline(conn, heartbeat_cfg.get("recent_offline_hours", RECENT_OFFLINE_HOURS))
+    print(f"[HB] Checking {len(recent)} recently offline systems first...")
+    record(probe_page(prober, recent))
+    skip = {system["system_id"] for system in recent}
+
+    if shards > 1:
+        ranges = id_shards(conn, shards)
+        print(f"[HB] Sweeping {'/'.join(statuses)} systems in {len(ranges)} shards...")
+        for (lo, hi), results in sweep_shards(cfg["db"]["dsn"], statuses, ranges, prober, page_size, skip):
+            print(f"    [HB] Shard {lo}-{hi - 1}: {len(results)} systems")
+            record(results)
+    else:
+        print(f"[HB] Sweeping {'/'.join(statuses)} systems in pages of {page_size}...")
+        for page in iter_pages(conn, statuses, (0, 2 ** 31), page_size):  # All SERIAL ids
+            record(probe_page(prober, page, skip))
+
+    tracker.save()
+    print(
+        f"[HB] Heartbeat complete: {totals['probed']} checked, {totals['up']} up, "
+        f"{totals['written']} status changes written."
+    )
 
 # ----------------------------------------------------------
 # Main entry
 # ----------------------------------------------------------
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) < 2 or sys.argv[1] not in ["scan", "heartbeat"]:
-        print("Usage: python3 network_monitor.py [scan|heartbeat]")
+    if len(sys.argv) < 2 or sys.argv[1] not in ["scan", "heartbeat", "daemon"]:
+        print("Usage: python3 network_monitor.py [scan [--full]|heartbeat|daemon]")
         sys.exit(1)
 
     cfg = load_config()
+    if sys.argv[1] == "daemon":
+        # Long-running: schedules scan and heartbeat itself instead of cron
+        from monitor_daemon import ScannerDaemon
+        ScannerDaemon(cfg).run()
+        sys.exit(0)
+
     conn = db_connect(cfg)
     ssh_cfg = get_effective_ssh_config(cfg)
+    pipeline = DiscoveryPipeline.from_config(cfg, connect=lambda: db_connect(cfg))
+    # --full re-inventories and rewrites every host, then records fresh fingerprints
+    fingerprints = FingerprintStore.from_config(cfg)
+    if fingerprints is not None and "--full" in sys.argv[2:]:
+        fingerprints.reset()
 
     if sys.argv[1] == "scan":
         print(f"[+] Starting discovery scan at {datetime.now()}")
-        configured_labs = cfg.get("labs", [])
-        if configured_labs:
-            cur = conn.cursor()
-            try:
-                for lab in configured_labs:
-                    dept_id = lab.get("dept_id")
-                    ip_range = lab.get("ip_range", {})
-                    from_ip = ip_range.get("from")
-                    to_ip = ip_range.get("to")
-                    if not dept_id or not from_ip or not to_ip:
-                        continue
-
-                    cur.execute("SELECT dept_id, dept_name, subnet_cidr FROM departments WHERE dept_id = %s", (dept_id,))
-                    dept = cur.fetchone()
-                    if not dept:
-                        continue
-
-                        discover_department(dict(dept), ssh_cfg, conn, expand_ip_range(from_ip, to_ip))
-            finally:
-                cur.close()
-        else:
-            # Query departments from database
-            cur = conn.cursor()
-            cur.execute("SELECT dept_id, dept_name, subnet_cidr FROM departments WHERE subnet_cidr IS NOT NULL")
-            departments = cur.fetchall()
-            cur.close()
-
-            for dept in departments:
-                discover_department(dict(dept), ssh_cfg, conn)
+        run_scan(conn, cfg, ssh_cfg, pipeline, fingerprints)
         print("[+] Scan completed.")
     elif sys.argv[1] == "heartbeat":
         heartbeat(conn, cfg)
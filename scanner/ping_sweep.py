@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+OptiLab Liveness Sweep
+Finds responsive hosts with concurrent TCP connects (plus ICMP echo when privileged)
+"""
+
+import asyncio
+import os
+import queue
+import socket
+import struct
+from threading import Event, Thread
+
+SSH_PORT = 22
+DEFAULT_TIMEOUT = 1.0  # Seconds to wait for a connect or echo reply
+DEFAULT_CONCURRENCY = 512  # Probes in flight at once
+DEFAULT_RATE = 2000  # New probes started per second (0 = unlimited)
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+
+def icmp_checksum(data):
+    """RFC 1071 one's-complement checksum"""
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+class RateLimiter:
+    """Spaces probe starts evenly; only used from the sweep's event loop"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class IcmpPinger:
+    """Echo requests over one raw socket; replies are matched back by source address"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.ident = os.getpid() & 0xFFFF
+        self.seq = 0
+        self.waiting = {}
+
+    @classmethod
+    def open(cls):
+        """Returns None when raw sockets aren't permitted (not root / no CAP_NET_RAW)"""
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        except (PermissionError, OSError):
+            return None
+        sock.setblocking(False)
+        pinger = cls(sock)
+        asyncio.get_running_loop().add_reader(sock.fileno(), pinger._on_readable)
+        return pinger
+
+    def _on_readable(self):
+        while True:
+            try:
+                packet, (src, _) = self.sock.recvfrom(1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            header_len = (packet[0] & 0x0F) * 4
+            if len(packet) < header_len + 8:
+                continue
+            icmp_type, _, _, ident, _ = struct.unpack("!BBHHH", packet[header_len:header_len + 8])
+            if icmp_type != ICMP_ECHO_REPLY or ident != self.ident:
+                continue
+            future = self.waiting.pop(src, None)
+            if future is not None and not future.done():
+                future.set_result(True)
+
+    async def ping(self, ip, timeout):
+        self.seq = (self.seq + 1) & 0xFFFF
+        header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, self.ident, self.seq)
+        payload = b"optilab"
+        checksum = icmp_checksum(header + payload)
+        packet = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum, self.ident, self.seq) + payload
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[ip] = future
+        try:
+            self.sock.sendto(packet, (ip, 0))
+            return await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, OSError):
+            return False
+        finally:
+            if self.waiting.get(ip) is future:
+                del self.waiting[ip]
+
+    def close(self):
+        asyncio.get_running_loop().remove_reader(self.sock.fileno())
+        self.sock.close()
+
+
+async def tcp_probe(ip, port, timeout, refused_is_up=True):
+    """A completed handshake means the host is up; by default so does an RST"""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except ConnectionRefusedError:
+        return refused_is_up
+    except (asyncio.TimeoutError, OSError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
+
+class LivenessSweeper:
+    """Probes a whole target range at once and yields responsive hosts as they answer"""
+
+    def __init__(self, port=SSH_PORT, timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY,
+                 rate=DEFAULT_RATE, icmp="auto"):
+        self.port = port
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.rate = rate
+        self.icmp = icmp  # "auto" (use it if privileged), True or False
+
+    @classmethod
+    def from_config(cls, cfg):
+        sweep_cfg = cfg.get("sweep", {})
+        return cls(
+            port=sweep_cfg.get("port", SSH_PORT),
+            timeout=sweep_cfg.get("timeout_seconds", DEFAULT_TIMEOUT),
+            concurrency=sweep_cfg.get("concurrency", DEFAULT_CONCURRENCY),
+            rate=sweep_cfg.get("rate_per_second", DEFAULT_RATE),
+            icmp=sweep_cfg.get("icmp", "auto"),
+        )
+
+    async def probe(self, ip, pinger):
+        """True once either probe gets an answer"""
+        if pinger is None:
+            return await tcp_probe(ip, self.port, self.timeout)
+        tasks = [
+            asyncio.ensure_future(tcp_probe(ip, self.port, self.timeout)),
+            asyncio.ensure_future(pinger.ping(ip, self.timeout)),
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                if await next_done:
+                    return True
+            return False
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def sweep(self, targets, stop_event=None):
+        """Async generator of responsive IPs; targets may be any (lazy) iterable of addresses"""
+        pinger = IcmpPinger.open() if self.icmp else None
+        if self.icmp is True and pinger is None:
+            print("    [SWEEP] ⚠ ICMP needs root or CAP_NET_RAW, using TCP only")
+
+        limiter = RateLimiter(self.rate)
+        found = asyncio.Queue()
+        pending = iter(targets)
+        done = object()
+
+        async def worker():
+            # Workers pull from one shared iterator so huge ranges are never materialized
+            for ip in pending:
+                if stop_event is not None and stop_event.is_set():
+                    break
+                ip = str(ip)
+                await limiter.wait()
+                if await self.probe(ip, pinger):
+                    await found.put(ip)
+            await found.put(done)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(max(1, self.concurrency))]
+        try:
+            remaining = len(workers)
+            while remaining:
+                item = await found.get()
+                if item is done:
+                    remaining -= 1
+                else:
+                    yield item
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if pinger is not None:
+                pinger.close()
+
+    def stream(self, targets):
+        """Blocking iterator over responsive IPs for thread-based callers
+
+        The sweep runs on its own event loop thread; closing the iterator early stops it.
+        """
+        results = queue.Queue()
+        stop_event = Event()
+        finished = object()
+
+        async def produce():
+            async for ip in self.sweep(targets, stop_event):
+                results.put(ip)
+
+        def run():
+            try:
+                asyncio.run(produce())
+            except Exception as e:
+                print(f"    [SWEEP] ✗ Sweep failed: {e}")
+            finally:
+                results.put(finished)
+
+        thread = Thread(target=run, name="liveness-sweep", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = results.get()
+                if item is finished:
+                    return
+                yield item
+        finally:
+            stop_event.set()
+            thread.join()
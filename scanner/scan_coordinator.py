@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+OptiLab Scan Coordinator
+Scans departments concurrently under one global budget of SSH sessions and probes
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from threading import BoundedSemaphore
+
+
+def apportion(total, weights):
+    """Split `total` in proportion to `weights` (largest remainder), at least 1 each"""
+    if not weights:
+        return []
+    if not any(weights):
+        weights = [1] * len(weights)
+    weight_sum = sum(weights)
+    exact = [total * w / weight_sum for w in weights]
+    shares = [max(1, int(x)) for x in exact]
+    leftover = total - sum(shares)
+    # Hand out what rounding left over, biggest fractional part first
+    for i in sorted(range(len(weights)), key=lambda i: exact[i] - int(exact[i]), reverse=True):
+        if leftover <= 0:
+            break
+        shares[i] += 1
+        leftover -= 1
+    return shares
+
+
+class ScanCoordinator:
+    """Runs one discovery pipeline per department under one global budget
+
+    Sweep probes are split in proportion to each department's number of target addresses.
+    SSH identification is not: live hosts, not address space, decide where it is needed, so
+    every department gets up to max_workers identify threads and a shared semaphore hands
+    out the max_workers sessions to whichever departments have hosts waiting.
+    """
+
+    def __init__(self, pipeline, max_workers, connect, release=None, max_parallel=None):
+        self.pipeline = pipeline
+        self.max_workers = max(1, max_workers)
+        self.connect = connect
+        self.release = release or (lambda conn: conn.close())
+        # Departments scanned at once; a bounded connection pool caps it so no
+        # department holds one connection while waiting forever for its upsert extras
+        self.max_parallel = max_parallel
+
+    @classmethod
+    def from_config(cls, cfg, pipeline, connect, release=None, max_parallel=None):
+        return cls(pipeline, cfg.get("max_workers", 10), connect, release, max_parallel)
+
+    def run(self, jobs, discover):
+        """Scan [(dept, targets), ...] concurrently; discover(dept, conn, targets, pipeline)
+
+        Each department gets its own database connection. Returns per-department durations.
+        """
+        if not jobs:
+            return {}
+        weights = [len(targets) for _, targets in jobs]
+        sweeper = self.pipeline.sweeper
+        identify_workers = min(self.pipeline.identify_workers, self.max_workers)
+        probe_shares = apportion(sweeper.concurrency, weights)
+        gate = BoundedSemaphore(self.max_workers)
+
+        print(f"[+] Scanning {len(jobs)} departments with {self.max_workers} SSH workers "
+              f"and {sweeper.concurrency} probes in flight")
+        durations = {}
+        parallel = min(len(jobs), self.max_parallel or len(jobs))
+        with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="dept-scan") as executor:
+            futures = {}
+            for (dept, targets), probe_share in zip(jobs, probe_shares):
+                rate = sweeper.rate * probe_share / sweeper.concurrency if sweeper.rate else 0
+                pipeline = self.pipeline.share(identify_workers, probe_share, rate, gate)
+                futures[executor.submit(self._scan, dept, targets, pipeline, discover)] = dept
+            for future in as_completed(futures):
+                dept = futures[future]
+                try:
+                    durations[dept["dept_id"]] = future.result()
+                except Exception as e:
+                    print(f"[!] Department {dept['dept_id']} ({dept['dept_name']}) scan failed: {e}")
+        return durations
+
+    def _scan(self, dept, targets, pipeline, discover):
+        started = time.monotonic()
+        conn = self.connect()
+        try:
+            discover(dept, conn, targets, pipeline)
+        finally:
+            self.release(conn)
+        elapsed = time.monotonic() - started
+        print(f"[+] Department {dept['dept_id']} ({dept['dept_name']}) done in {elapsed:.1f}s "
+              f"(up to {pipeline.identify_workers} SSH workers, {pipeline.sweeper.concurrency} probes)")
+        return elapsed
@@ -0,0 +1,83 @@
+from fingerprints import FingerprintStore, inventory_hash
+
+INFO = {"hostname": "lab-pc-01", "mac_address": "aa:bb:cc:dd:ee:01", "cpu_cores": 8, "uptime_hours": 5}
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def store(tmp_path, clock=None, ttl_hours=1):
+    return FingerprintStore(str(tmp_path / "state.json"), ttl_hours=ttl_hours, clock=clock or FakeClock())
+
+
+def test_inventory_hash_ignores_volatile_fields_and_key_order():
+    changed_uptime = dict(INFO, uptime_hours=99, logged_users=3)
+    reordered = dict(reversed(list(INFO.items())))
+    assert inventory_hash(changed_uptime) == inventory_hash(INFO)
+    assert inventory_hash(reordered) == inventory_hash(INFO)
+    assert inventory_hash(dict(INFO, cpu_cores=16)) != inventory_hash(INFO)
+
+
+def test_recorded_host_is_fresh_until_the_ttl_passes(tmp_path):
+    clock = FakeClock()
+    fingerprints = store(tmp_path, clock, ttl_hours=1)
+    assert not fingerprints.is_fresh("10.0.0.1")
+    fingerprints.record("10.0.0.1", INFO)
+    assert fingerprints.is_fresh("10.0.0.1")
+    clock.now += 3600
+    assert not fingerprints.is_fresh("10.0.0.1")
+
+
+def test_identity_matches_on_hostname_and_mac(tmp_path):
+    fingerprints = store(tmp_path)
+    fingerprints.record("10.0.0.1", INFO)
+    assert fingerprints.identity_matches("10.0.0.1", {"hostname": "lab-pc-01", "mac_address": "aa:bb:cc:dd:ee:01"})
+    assert not fingerprints.identity_matches("10.0.0.1", {"hostname": "lab-pc-02", "mac_address": "aa:bb:cc:dd:ee:01"})
+    assert not fingerprints.identity_matches("10.0.0.1", {"hostname": "lab-pc-01", "mac_address": "ff:ff:ff:ff:ff:ff"})
+    assert not fingerprints.identity_matches("10.0.0.2", {"hostname": "lab-pc-01", "mac_address": "aa:bb:cc:dd:ee:01"})
+
+
+def test_forget_and_reset(tmp_path):
+    fingerprints = store(tmp_path)
+    fingerprints.record("10.0.0.1", INFO)
+    fingerprints.record("10.0.0.2", INFO)
+    fingerprints.forget("10.0.0.1")
+    assert not fingerprints.is_fresh("10.0.0.1")
+    assert fingerprints.is_fresh("10.0.0.2")
+    fingerprints.reset()
+    assert not fingerprints.is_fresh("10.0.0.2")
+
+
+def test_save_and_load_round_trip(tmp_path):
+    clock = FakeClock()
+    fingerprints = store(tmp_path, clock)
+    fingerprints.record("10.0.0.1", INFO)
+    fingerprints.save()
+
+    reloaded = store(tmp_path, clock)
+    assert reloaded.is_fresh("10.0.0.1")
+    assert reloaded.identity_matches("10.0.0.1", INFO)
+
+
+def test_save_skips_unchanged_state(tmp_path):
+    fingerprints = store(tmp_path)
+    fingerprints.save()
+    assert not (tmp_path / "state.json").exists()
+
+
+def test_unreadable_state_file_starts_empty(tmp_path):
+    (tmp_path / "state.json").write_text("{not json")
+    assert store(tmp_path).hosts == {}
+
+
+def test_from_config_is_off_unless_enabled(tmp_path):
+    assert FingerprintStore.from_config({}) is None
+    cfg = {"incremental_discovery": {"enabled": True, "ttl_hours": 2, "state_file": str(tmp_path / "s.json")}}
+    fingerprints = FingerprintStore.from_config(cfg)
+    assert fingerprints.ttl == 2 * 3600
+    assert fingerprints.hosts == {}
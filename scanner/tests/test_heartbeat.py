@@ -0,0 +1,85 @@
+from heartbeat import HeartbeatTracker
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def tracker(clock=None, **kwargs):
+    kwargs.setdefault("interval", 300)
+    return HeartbeatTracker(state_file=None, clock=clock or FakeClock(), **kwargs)
+
+
+def test_offline_only_after_failure_threshold():
+    hb = tracker(failure_threshold=3)
+    assert hb.observe(1, "active", False) is None
+    assert hb.observe(1, "active", False) is None
+    assert hb.observe(1, "active", False) == "offline"
+
+
+def test_success_resets_the_failure_streak():
+    hb = tracker(failure_threshold=3)
+    hb.observe(1, "active", False)
+    hb.observe(1, "active", False)
+    assert hb.observe(1, "active", True) is None
+    assert hb.observe(1, "active", False) is None
+    assert hb.observe(1, "active", False) is None
+    assert hb.observe(1, "active", False) == "offline"
+
+
+def test_recovers_after_one_good_probe_by_default():
+    hb = tracker()
+    assert hb.observe(1, "offline", True) == "active"
+
+
+def test_recovery_threshold_debounces_recovery():
+    hb = tracker(recovery_threshold=2)
+    assert hb.observe(1, "offline", True) is None
+    assert hb.observe(1, "offline", True) == "active"
+
+
+def test_transition_is_reported_once():
+    hb = tracker(failure_threshold=1)
+    assert hb.observe(1, "active", False) == "offline"
+    # The database now says offline; more failures change nothing
+    assert hb.observe(1, "offline", False) is None
+
+
+def test_status_changed_elsewhere_restarts_the_counters():
+    hb = tracker(failure_threshold=2)
+    hb.observe(1, "active", False)
+    # An admin set it to offline and back; the old streak no longer counts
+    hb.observe(1, "offline", True)
+    assert hb.observe(1, "active", False) is None
+    assert hb.observe(1, "active", False) == "offline"
+
+
+def test_stale_counters_start_over():
+    clock = FakeClock()
+    hb = tracker(clock=clock, failure_threshold=2, interval=300)
+    hb.observe(1, "active", False)
+    clock.now += 3 * 300 + 1  # Not seen for more than STALE_INTERVALS intervals
+    assert hb.observe(1, "active", False) is None
+    assert hb.observe(1, "active", False) == "offline"
+
+
+def test_hosts_are_tracked_independently():
+    hb = tracker(failure_threshold=2)
+    hb.observe(1, "active", False)
+    assert hb.observe(2, "active", False) is None
+    assert hb.observe(1, "active", False) == "offline"
+
+
+def test_state_round_trips_through_the_state_file(tmp_path):
+    path = str(tmp_path / "heartbeat.json")
+    clock = FakeClock()
+    first = HeartbeatTracker(failure_threshold=2, state_file=path, clock=clock)
+    first.observe(1, "active", False)
+    first.save()
+
+    second = HeartbeatTracker(failure_threshold=2, state_file=path, clock=clock)
+    assert second.observe(1, "active", False) == "offline"
@@ -0,0 +1,72 @@
+from ip_ranges import IPRangeSet, ip_to_int
+
+
+def test_from_network_drops_network_and_broadcast():
+    ips = IPRangeSet.from_network("10.0.0.0/24")
+    assert len(ips) == 254
+    assert ips.first() == "10.0.0.1"
+    assert ips.last() == "10.0.0.254"
+    assert "10.0.0.0" not in ips
+    assert "10.0.0.255" not in ips
+
+
+def test_from_network_keeps_tiny_blocks_whole():
+    assert list(IPRangeSet.from_network("10.0.0.4/31")) == ["10.0.0.4", "10.0.0.5"]
+    assert list(IPRangeSet.from_network("10.0.0.9/32")) == ["10.0.0.9"]
+
+
+def test_from_network_without_hosts_only():
+    assert len(IPRangeSet.from_network("10.0.0.0/24", hosts_only=False)) == 256
+
+
+def test_overlapping_and_adjacent_ranges_merge():
+    ips = IPRangeSet()
+    ips.add_range("10.0.0.10", "10.0.0.20")
+    ips.add_range("10.0.0.15", "10.0.0.30")  # Overlapping
+    ips.add_range("10.0.0.31", "10.0.0.40")  # Adjacent
+    ips.add_range("10.0.0.1", "10.0.0.5")    # Separate
+    assert ips.starts == [ip_to_int("10.0.0.1"), ip_to_int("10.0.0.10")]
+    assert ips.ends == [ip_to_int("10.0.0.5"), ip_to_int("10.0.0.40")]
+    assert len(ips) == 5 + 31
+
+
+def test_range_spanning_several_intervals_folds_them_into_one():
+    ips = IPRangeSet([("10.0.0.1", "10.0.0.2"), ("10.0.0.5", "10.0.0.6"), ("10.0.0.9", "10.0.0.9")])
+    ips.add_range("10.0.0.2", "10.0.0.8")
+    assert ips.label() == "10.0.0.1 - 10.0.0.9"
+
+
+def test_reversed_range_is_ignored():
+    ips = IPRangeSet.from_range("10.0.0.9", "10.0.0.1")
+    assert not ips
+    assert len(ips) == 0
+    assert ips.label() == "(empty)"
+
+
+def test_membership():
+    ips = IPRangeSet([("10.0.0.1", "10.0.0.3"), ("10.0.1.1", "10.0.1.1")])
+    assert "10.0.0.2" in ips
+    assert "10.0.1.1" in ips
+    assert "10.0.0.4" not in ips
+    assert "9.255.255.255" not in ips
+    assert "not-an-ip" not in ips
+    assert ip_to_int("10.0.0.3") in ips
+
+
+def test_iteration_is_ordered_strings():
+    ips = IPRangeSet([("10.0.0.254", "10.0.1.1")])
+    assert list(ips) == ["10.0.0.254", "10.0.0.255", "10.0.1.0", "10.0.1.1"]
+
+
+def test_add_and_update():
+    ips = IPRangeSet()
+    ips.add("10.0.0.1")
+    other = IPRangeSet.from_range("10.0.0.2", "10.0.0.3")
+    ips.update(other)
+    assert len(ips.ranges()) == 1
+    assert ips.label() == "10.0.0.1 - 10.0.0.3"
+
+
+def test_label_summarises_many_ranges():
+    ips = IPRangeSet((f"10.0.{i}.1", f"10.0.{i}.1") for i in range(5))
+    assert ips.label() == "10.0.0.1, 10.0.1.1, 10.0.2.1, ... (5 ranges)"
@@ -0,0 +1,66 @@
+from scan_coordinator import ScanCoordinator, apportion
+
+
+def test_shares_are_proportional_and_sum_to_total():
+    assert apportion(10, [1, 1]) == [5, 5]
+    assert apportion(10, [3, 1]) == [8, 2]
+    assert sum(apportion(97, [254, 65534, 1022])) == 97
+
+
+def test_leftover_goes_to_largest_remainders():
+    # Exact shares 3.33, 3.33, 3.33: one extra unit to the first largest remainder
+    assert apportion(10, [1, 1, 1]) == [4, 3, 3]
+    # Exact shares 1.5 and 8.5: tie broken by order
+    assert apportion(10, [3, 17]) == [2, 8]
+
+
+def test_every_share_gets_at_least_one():
+    shares = apportion(10, [1, 1000])
+    assert shares[0] == 1
+    assert shares[1] == 9
+
+
+def test_minimum_can_exceed_total():
+    # More departments than budget: each still gets one, callers cap globally
+    assert apportion(2, [5, 5, 5]) == [1, 1, 1]
+
+
+def test_all_zero_weights_split_evenly():
+    assert apportion(6, [0, 0, 0]) == [2, 2, 2]
+
+
+def test_no_weights():
+    assert apportion(10, []) == []
+
+
+class FakeSweeper:
+    concurrency = 100
+    rate = 0
+
+
+class FakePipeline:
+    """Records the slice of the budget each department is given"""
+
+    def __init__(self, identify_workers):
+        self.sweeper = FakeSweeper()
+        self.identify_workers = identify_workers
+        self.shares = []
+
+    def share(self, identify_workers, probe_concurrency, probe_rate, identify_gate=None):
+        self.shares.append((identify_workers, probe_concurrency, identify_gate))
+        return self
+
+
+def test_identify_workers_are_not_split_by_address_space():
+    pipeline = FakePipeline(identify_workers=10)
+    coordinator = ScanCoordinator(pipeline, max_workers=8, connect=object, release=lambda conn: None)
+    jobs = [({"dept_id": 1, "dept_name": "lab"}, [0] * 254), ({"dept_id": 2, "dept_name": "campus"}, [0] * 65534)]
+    durations = coordinator.run(jobs, lambda dept, conn, targets, pipeline: None)
+
+    assert sorted(durations) == [1, 2]
+    workers = sorted(share[0] for share in pipeline.shares)
+    probes = sorted(share[1] for share in pipeline.shares)
+    assert workers == [8, 8]  # Both may use the whole budget; the shared gate caps the total
+    assert probes == [1, 99]
+    gates = {id(share[2]) for share in pipeline.shares}
+    assert len(gates) == 1